@@ -0,0 +1,128 @@
+"""S3IOBaseHandler の読み書きの速度を moto のモック S3 上で計測する
+
+一時ファイルを経由する以前の実装と比較する。
+実行例: PYTHONPATH=src python benchmark/s3_io_benchmark.py --users 5000
+(TWITTER_API_VERSION などの環境変数は local.env と同様に設定しておく)
+"""
+import json
+import os
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Callable, Dict
+
+import click
+
+os.environ.setdefault("S3_BUCKET_NAME", "syaroho-benchmark")
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "testing")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "testing")
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+import boto3  # noqa: E402
+from moto import mock_aws  # noqa: E402
+
+from syaroho_rating.io_handler import (  # noqa: E402
+    JsonObj,
+    S3IOBaseHandler,
+    json_serial,
+)
+
+
+class TempFileS3IOBaseHandler(S3IOBaseHandler):
+    """一時ファイルを経由して読み書きする以前の実装"""
+
+    temp_dir = Path("temp")
+
+    def save_dict(self, dict_obj: JsonObj, relative_path: str) -> None:
+        self.temp_dir.mkdir(exist_ok=True)
+        temp_path = self.temp_dir / f"{uuid.uuid4()}.json"
+        with temp_path.open("w") as f:
+            json.dump(
+                dict_obj, f, indent=4, ensure_ascii=False, default=json_serial
+            )
+        with temp_path.open("rb") as f:
+            self.s3.upload_fileobj(f, self.s3_bucket_name, relative_path)
+        temp_path.unlink(missing_ok=True)
+        return
+
+    def load_dict(self, relative_path: str) -> Any:
+        self.temp_dir.mkdir(exist_ok=True)
+        temp_path = self.temp_dir / f"{uuid.uuid4()}.json"
+        with temp_path.open("wb") as f:
+            self.s3.download_fileobj(self.s3_bucket_name, relative_path, f)
+        with temp_path.open() as f:
+            dict_obj = json.load(f)
+        temp_path.unlink(missing_ok=True)
+        return dict_obj
+
+
+def make_rating_info(n_users: int, n_attend: int) -> Dict[str, Any]:
+    return {
+        f"user{i}": {
+            "best_time": "00:00:00.123",
+            "best_score": 877,
+            "highest": 1500,
+            "rate": 1400,
+            "inner_rate": 1800,
+            "attend": n_attend,
+            "win": 1,
+            "attend_date": ["2023/01/01"] * n_attend,
+            "record": ["00:00:00.123"] * n_attend,
+            "standing": [1] * n_attend,
+            "perf": [1800] * n_attend,
+            "rate_hist": [1400] * n_attend,
+        }
+        for i in range(n_users)
+    }
+
+
+def measure(func: Callable[[], Any], repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat
+
+
+@click.command()
+@click.option("--users", default=2000, help="rating_info のユーザー数")
+@click.option("--attend", default=100, help="1 ユーザーあたりの参加回数")
+@click.option("--small", default=200, help="小さいオブジェクトの個数")
+@click.option("--repeat", default=3)
+def main(users: int, attend: int, small: int, repeat: int) -> None:
+    rating_info = make_rating_info(users, attend)
+    small_obj = {"data": [{"id": str(i), "text": "しゃろほー"} for i in range(5)]}
+
+    with mock_aws():
+        s3 = boto3.client("s3")
+        s3.create_bucket(Bucket=os.environ["S3_BUCKET_NAME"])
+
+        for name, handler in [
+            ("tempfile", TempFileS3IOBaseHandler()),
+            ("streaming", S3IOBaseHandler()),
+        ]:
+            path = f"benchmark/{name}/rating_info.json"
+            t_save = measure(
+                lambda: handler.save_dict(rating_info, path), repeat
+            )
+            t_load = measure(lambda: handler.load_dict(path), repeat)
+
+            def save_small() -> None:
+                for i in range(small):
+                    handler.save_dict(small_obj, f"benchmark/{name}/{i}.json")
+
+            def load_small() -> None:
+                for i in range(small):
+                    handler.load_dict(f"benchmark/{name}/{i}.json")
+
+            t_save_small = measure(save_small, repeat)
+            t_load_small = measure(load_small, repeat)
+            print(
+                f"{name:>9}: rating_info save {t_save * 1000:8.1f} ms, "
+                f"load {t_load * 1000:8.1f} ms / "
+                f"{small} small objects save {t_save_small * 1000:8.1f} ms, "
+                f"load {t_load_small * 1000:8.1f} ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
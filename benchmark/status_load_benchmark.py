@@ -0,0 +1,166 @@
+"""保存した statuses_v2 のファイルから Tweet を作る速度を計測する
+
+tweepy.Tweet / tweepy.User を経由する以前の実装と、dict から直接作る
+Tweet.from_dicts_v2 を比較する。
+実行例: PYTHONPATH=src python benchmark/status_load_benchmark.py --tweets 500
+(TWITTER_API_VERSION などの環境変数は local.env と同様に設定しておく)
+"""
+import random
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+import click
+import pendulum
+import tweepy
+
+from syaroho_rating.io_handler import LocalIOBaseHandler
+from syaroho_rating.model import Tweet
+from syaroho_rating.utils import datetime_to_tweetid
+
+
+def make_user(i: int) -> Dict[str, Any]:
+    return {
+        "id": str(100000 + i),
+        "name": f"しゃろほー太郎{i}",
+        "username": f"user{i}",
+        "created_at": "2015-04-01T12:34:56.000Z",
+        "description": "毎日しゃろほーしています https://t.co/xxxxxxxxxx",
+        "entities": {
+            "description": {
+                "urls": [
+                    {
+                        "start": 13,
+                        "end": 36,
+                        "url": "https://t.co/xxxxxxxxxx",
+                        "expanded_url": "https://example.com",
+                        "display_url": "example.com",
+                    }
+                ]
+            }
+        },
+        "location": "東京",
+        "pinned_tweet_id": "1600000000000000000",
+        "profile_image_url": "https://pbs.twimg.com/profile_images/x.jpg",
+        "protected": False,
+        "public_metrics": {
+            "followers_count": 100,
+            "following_count": 100,
+            "tweet_count": 10000,
+            "listed_count": 3,
+        },
+        "url": "",
+        "verified": False,
+    }
+
+
+def make_tweet(
+    date: pendulum.DateTime, rng: random.Random, n_users: int
+) -> Dict[str, Any]:
+    posted_at = date.add(microseconds=rng.randint(-60000, 60000) * 1000)
+    tweet_id = str(int(datetime_to_tweetid(posted_at)) + rng.randint(0, 4095))
+    author_id = str(100000 + rng.randrange(n_users))
+    return {
+        "id": tweet_id,
+        "text": rng.choice(["しゃろほー"] * 9 + ["しゃろほー!"]),
+        "author_id": author_id,
+        "conversation_id": tweet_id,
+        "created_at": posted_at.in_timezone("UTC").format(
+            "YYYY-MM-DDTHH:mm:ss.SSS[Z]"
+        ),
+        "edit_history_tweet_ids": [tweet_id],
+        "edit_controls": {
+            "edits_remaining": 5,
+            "is_edit_eligible": True,
+            "editable_until": "2023-01-01T00:30:00.000Z",
+        },
+        "entities": {"annotations": [], "mentions": []},
+        "lang": "ja",
+        "possibly_sensitive": False,
+        "public_metrics": {
+            "retweet_count": 0,
+            "reply_count": 0,
+            "like_count": 3,
+            "quote_count": 0,
+            "impression_count": 50,
+        },
+        "reply_settings": "everyone",
+        "source": "Twitter for iPhone",
+    }
+
+
+def make_statuses(n_tweets: int, n_users: int) -> Dict[str, Any]:
+    rng = random.Random(0)
+    date = pendulum.datetime(2023, 1, 1, tz="Asia/Tokyo")
+    tweets = [make_tweet(date, rng, n_users) for _ in range(n_tweets)]
+    author_ids = sorted({t["author_id"] for t in tweets})
+    return {
+        "data": tweets,
+        "includes": {
+            "users": [make_user(int(i) - 100000) for i in author_ids],
+            "media": [
+                {
+                    "media_key": f"3_{i}",
+                    "type": "photo",
+                    "url": "https://pbs.twimg.com/media/x.jpg",
+                    "width": 1200,
+                    "height": 675,
+                }
+                for i in range(n_tweets // 20)
+            ],
+        },
+        "meta": {"result_count": n_tweets},
+    }
+
+
+def load_with_tweepy(statuses_dict: Dict[str, Any]) -> List[Tweet]:
+    """以前の実装"""
+    data_objs = [tweepy.Tweet(t) for t in statuses_dict["data"]]
+    users_objs = [tweepy.User(u) for u in statuses_dict["includes"]["users"]]
+    return Tweet.from_responses_v2(data_objs, users_objs)
+
+
+def load_direct(statuses_dict: Dict[str, Any]) -> List[Tweet]:
+    return Tweet.from_dicts_v2(
+        statuses_dict["data"], statuses_dict["includes"]["users"]
+    )
+
+
+def measure(func: Callable[[], Any], repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat
+
+
+@click.command()
+@click.option("--tweets", default=500, help="1 日分のツイート数")
+@click.option("--users", default=400, help="ユーザー数")
+@click.option("--repeat", default=20)
+def main(tweets: int, users: int, repeat: int) -> None:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        handler = LocalIOBaseHandler(Path(tmp_dir))
+        path = "statuses_v2/20230101_1.json"
+        handler.save_dict(make_statuses(tweets, users), path)
+
+        # tweepy.Tweet は渡した dict の一部を書き換えるため、毎回読み込み直す
+        assert load_with_tweepy(handler.load_dict(path)) == load_direct(
+            handler.load_dict(path)
+        )
+
+        t_parse = measure(lambda: handler.load_dict(path), repeat)
+        print(f"{'parse':>6}: {t_parse * 1000:7.2f} ms")
+        for name, loader in [
+            ("tweepy", load_with_tweepy),
+            ("direct", load_direct),
+        ]:
+            t_load = measure(lambda: loader(handler.load_dict(path)), repeat)
+            print(
+                f"{name:>6}: {t_load * 1000:7.2f} ms "
+                f"(build {tweets} tweets {(t_load - t_parse) * 1000:7.2f} ms)"
+            )
+
+
+if __name__ == "__main__":
+    main()
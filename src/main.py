@@ -1,13 +1,18 @@
 import time
 from datetime import timedelta
+from typing import Optional
 
 import click
+import pandas as pd
 import pendulum
 
 from syaroho_rating.consts import (
     DEBUG,
     DO_POST,
     DO_RETWEET,
+    PRE_RESULT_LIVE,
+    PRE_RESULT_POLL_INTERVAL,
+    PRE_RESULT_UPDATE_INTERVAL,
     SLACK_NOTIFY,
     TWITTER_API_VERSION,
     TZ,
@@ -66,7 +71,15 @@ def run() -> None:
 
         # pre observe
         print(">>>>> pre observe")
-        dq_statuses = syaroho.run_dq(do_post=DO_POST)
+        if PRE_RESULT_LIVE:
+            # 00:02 までリストを繰り返し取得して速報を更新する
+            dq_statuses = syaroho.run_dq_live(
+                do_post=DO_POST,
+                poll_interval=PRE_RESULT_POLL_INTERVAL,
+                update_interval=PRE_RESULT_UPDATE_INTERVAL,
+            )
+        else:
+            dq_statuses = syaroho.run_dq(do_post=DO_POST)
 
         # wait until 00:02:00 JST
         if not DEBUG:
@@ -107,6 +120,8 @@ def run() -> None:
 @click.option("--fetch-tweet", is_flag=True, type=bool)
 @click.option("--post", is_flag=True, type=bool)
 @click.option("--retweet", is_flag=True, type=bool)
+@click.option("--replay", is_flag=True, type=bool)
+@click.option("--checkpoint-interval", type=int, default=30)
 def backfill(
     start: str,
     end: str,
@@ -114,6 +129,8 @@ def backfill(
     fetch_tweet: bool,
     post: bool,
     retweet: bool,
+    replay: bool,
+    checkpoint_interval: int,
 ) -> None:
     start_date = parse_date_string(start)
     end_date = parse_date_string(end)
@@ -122,7 +139,18 @@ def backfill(
     io_handler = get_io_handler(TWITTER_API_VERSION)
     syaroho = Syaroho(twitter, io_handler)
 
-    syaroho.backfill(start_date, end_date, post, retweet, fetch_tweet, eg_start)
+    if replay:
+        if post or retweet:
+            raise click.UsageError(
+                "--replay cannot be used with --post/--retweet"
+            )
+        syaroho.replay(
+            start_date, end_date, fetch_tweet, eg_start, checkpoint_interval
+        )
+    else:
+        syaroho.backfill(
+            start_date, end_date, post, retweet, fetch_tweet, eg_start
+        )
     return
 
 
@@ -139,17 +167,112 @@ def fetch_tweet(date: str, save: bool) -> None:
     syaroho.fetch_and_save_tweet(date_parsed, save)
 
 
+@cli.command()
+@click.argument("start", type=str)
+@click.argument("end", type=str)
+@click.option("--save", is_flag=True, type=bool)
+def migrate_rating_info(start: str, end: str, save: bool) -> None:
+    """rating_info に inner_rate と aperf の加重和を追加"""
+    from syaroho_rating.rating import migrate_accumulators
+
+    start_date = parse_date_string(start)
+    end_date = parse_date_string(end)
+    io_handler = get_io_handler(TWITTER_API_VERSION)
+
+    for date in pendulum.period(start_date, end_date).range("days"):
+        try:
+            rating_infos = io_handler.get_rating_info(date)
+        except FileNotFoundError:
+            print(f"No rating info found for {date}. Skip.")
+            continue
+
+        # 加重和から計算し直した inner_rate と rate が保存済みの値と一致するか確認
+        mismatched = migrate_accumulators(rating_infos)
+        if len(mismatched):
+            raise RuntimeError(
+                f"inner_rate or rate mismatch for {date}: {', '.join(mismatched)}"
+            )
+        print(f"Migrated {len(rating_infos)} users for {date}.")
+        if save:
+            io_handler.save_rating_info(rating_infos, date)
+    io_handler.flush()
+    return
+
+
+@cli.command()
+@click.argument("date", type=str)
+@click.option("--top", type=int, default=None)
+@click.option("--user", type=str, default=None)
+@click.option("--save", is_flag=True, type=bool)
+def leaderboard(
+    date: str, top: Optional[int], user: Optional[str], save: bool
+) -> None:
+    """ある日時点のレーティングランキングを表示"""
+    from syaroho_rating.leaderboard import LeaderboardIndex
+
+    date_parsed = parse_date_string(date)
+    io_handler = get_io_handler(TWITTER_API_VERSION)
+    index = LeaderboardIndex(io_handler, save_missing=save)
+
+    if user is not None:
+        rank = index.rank_of(date_parsed, user)
+        io_handler.flush()
+        if rank is None:
+            print(f"{user} has no rating on {date}.")
+        else:
+            print(f"{user}: {rank}")
+        return
+
+    if top is None:
+        df = index.as_of(date_parsed)
+    else:
+        df = index.top_k(date_parsed, top)
+    io_handler.flush()
+    with pd.option_context("display.max_rows", None):
+        print(df)
+    return
+
+
+@cli.command()
+@click.argument("start", type=str)
+@click.argument("end", type=str)
+@click.option("--out", type=str, default="data/archive")
+@click.option(
+    "--format",
+    "fmt",
+    type=click.Choice(["parquet", "arrow"]),
+    default="parquet",
+)
+def export(start: str, end: str, out: str, fmt: str) -> None:
+    """過去のツイートとレーティング履歴を Parquet / Arrow 形式で書き出す"""
+    from pathlib import Path
+
+    from syaroho_rating.archive import export_history
+
+    start_date = parse_date_string(start)
+    end_date = parse_date_string(end)
+    io_handler = get_io_handler(TWITTER_API_VERSION)
+
+    n_rows = export_history(io_handler, start_date, end_date, Path(out), fmt)
+    for name, n in n_rows.items():
+        print(f"Exported {n} rows to {out}/{name}")
+    return
+
+
 @cli.command(hidden=True)
 def test_reply() -> None:
     today = get_today()
     twitter = get_twitter(TWITTER_API_VERSION)
     io_handler = get_io_handler(TWITTER_API_VERSION)
     syaroho = Syaroho(twitter, io_handler)
-    rating_infos = io_handler.get_rating_info(today)
 
-    from syaroho_rating.rating import summarize_rating_info
+    from syaroho_rating.io_handler import UserHistoryMapping
+    from syaroho_rating.leaderboard import LeaderboardIndex
 
-    summary_df = summarize_rating_info(rating_infos)
+    # 返信するユーザーの情報だけをユーザーごとの履歴から読み込む
+    # (履歴に無いユーザーはその日の rating_info から読み込む)
+    rating_infos = UserHistoryMapping(io_handler, date=today)
+    summary_df = LeaderboardIndex(io_handler).as_of(today)
     print(summary_df)
 
     # reply to mentions(10分間実行)
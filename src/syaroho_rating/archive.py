@@ -0,0 +1,295 @@
+import datetime as dt
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+import pendulum
+
+from syaroho_rating.io_handler import IOHandler
+from syaroho_rating.model import Tweet
+
+# 保存形式と pyarrow.dataset での形式名
+FORMATS = {"parquet": "parquet", "arrow": "ipc"}
+STATUS_KINDS = ("statuses", "statuses_dq")
+
+
+def _pyarrow() -> Any:
+    # pyarrow は書き出しや読み込みをする時だけ必要なので、ここで import する
+    try:
+        import pyarrow
+        import pyarrow.dataset
+        import pyarrow.fs
+    except ImportError as e:
+        raise RuntimeError("pyarrow is required to use the archive") from e
+    return pyarrow
+
+
+def _to_date(date_str: str) -> dt.date:
+    return dt.datetime.strptime(date_str, "%Y/%m/%d").date()
+
+
+def participation_table(rating_infos: Dict[str, Any]) -> Any:
+    """rating_info の参加履歴を 1 回の参加が 1 行のテーブルにする"""
+    pa = _pyarrow()
+    columns: Dict[str, List[Any]] = {
+        "user_name": [],
+        "attend_date": [],
+        "record": [],
+        "standing": [],
+        "perf": [],
+        "rate": [],
+    }
+    for name, info in rating_infos.items():
+        n_hist = len(info["attend_date"])
+        columns["user_name"] += [name] * n_hist
+        columns["attend_date"] += [_to_date(d) for d in info["attend_date"]]
+        columns["record"] += info["record"]
+        columns["standing"] += info["standing"]
+        columns["perf"] += info["perf"]
+        columns["rate"] += info["rate_hist"]
+    columns["year"] = [d.year for d in columns["attend_date"]]
+    schema = pa.schema(
+        [
+            ("user_name", pa.string()),
+            ("attend_date", pa.date32()),
+            ("record", pa.string()),
+            ("standing", pa.int32()),
+            ("perf", pa.int32()),
+            ("rate", pa.int32()),
+            ("year", pa.int16()),
+        ]
+    )
+    return pa.table(columns, schema=schema)
+
+
+def status_table(tweets_by_date: Iterable[Any]) -> Any:
+    """(日付, その日のツイート) の列からツイートのテーブルを作る"""
+    pa = _pyarrow()
+    rows = [
+        {
+            "date": date,
+            "tweet_id": int(t.id),
+            "posted_ms": t.timestamp_ms,
+            "user_id": str(t.author.id),
+            "username": t.author.username,
+            "text": t.text,
+            "source": t.source,
+            "year": date.year,
+        }
+        for date, tweets in tweets_by_date
+        for t in tweets
+    ]
+    schema = pa.schema(
+        [
+            ("date", pa.date32()),
+            ("tweet_id", pa.int64()),
+            ("posted_ms", pa.int64()),
+            ("user_id", pa.string()),
+            ("username", pa.string()),
+            ("text", pa.string()),
+            ("source", pa.string()),
+            ("year", pa.int16()),
+        ]
+    )
+    return pa.Table.from_pylist(rows, schema=schema)
+
+
+def _load_tweets(io: IOHandler, kind: str, date: dt.date) -> List[Tweet]:
+    try:
+        if kind == "statuses":
+            return io.get_statuses(date)
+        return io.get_statuses_dq(date)
+    except FileNotFoundError:
+        return []
+
+
+def _year_partitioning() -> Any:
+    pa = _pyarrow()
+    return pa.dataset.partitioning(
+        pa.schema([("year", pa.int16())]), flavor="hive"
+    )
+
+
+def _keep_existing(
+    table: Any,
+    path: Path,
+    fmt: str,
+    date_column: str,
+    start: Optional[dt.date],
+    end: Optional[dt.date],
+) -> Any:
+    """table と同じ年の既存のデータのうち、期間外の行を table に加える"""
+    pa = _pyarrow()
+    if not path.exists() or table.num_rows == 0:
+        return table
+    field = pa.dataset.field
+    years = sorted(set(table["year"].to_pylist()))
+    in_range = None
+    if start is not None:
+        in_range = field(date_column) >= start
+    if end is not None:
+        cond = field(date_column) <= end
+        in_range = cond if in_range is None else in_range & cond
+    if in_range is None:
+        return table
+
+    existing = pa.dataset.dataset(
+        str(path), format=FORMATS[fmt], partitioning=_year_partitioning()
+    ).to_table(filter=field("year").isin(years) & ~in_range)
+    existing = existing.select(table.schema.names).cast(table.schema)
+    return pa.concat_tables([existing, table])
+
+
+def write_dataset(
+    table: Any,
+    path: Path,
+    fmt: str,
+    date_column: Optional[str] = None,
+    start: Optional[dt.date] = None,
+    end: Optional[dt.date] = None,
+) -> None:
+    """年ごとに分割して保存する
+
+    書き出す年の既存のデータは置き換える。date_column を指定した場合は、
+    その列の日付が start から end (None の場合は制限なし) の行だけを置き換え、
+    同じ年の期間外の行は残す。
+    """
+    pa = _pyarrow()
+    if date_column is not None:
+        table = _keep_existing(table, path, fmt, date_column, start, end)
+    pa.dataset.write_dataset(
+        table,
+        str(path),
+        format=FORMATS[fmt],
+        partitioning=["year"],
+        partitioning_flavor="hive",
+        existing_data_behavior="delete_matching",
+    )
+    return
+
+
+def export_history(
+    io: IOHandler,
+    start_date: pendulum.DateTime,
+    end_date: pendulum.DateTime,
+    out_dir: Path,
+    fmt: str = "parquet",
+) -> Dict[str, int]:
+    """期間内のツイートと、終了日時点の rating_info の参加履歴を書き出す
+
+    既に書き出したデータのうち期間外のものは残す。書き出した各データセットの
+    行数を返す。
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unexpected format: {fmt}")
+    dates = [
+        d.date() for d in pendulum.period(start_date, end_date).range("days")
+    ]
+    n_rows = {}
+    for kind in STATUS_KINDS:
+        table = status_table((d, _load_tweets(io, kind, d)) for d in dates)
+        write_dataset(table, out_dir / kind, fmt, "date", dates[0], dates[-1])
+        n_rows[kind] = table.num_rows
+
+    # 終了日までの参加履歴は全て含まれるので、終了日より後の行だけを残す
+    table = participation_table(io.get_rating_info(end_date))
+    write_dataset(
+        table, out_dir / "participation", fmt, "attend_date", None, dates[-1]
+    )
+    n_rows["participation"] = table.num_rows
+    return n_rows
+
+
+class HistoryArchive(object):
+    """export_history で書き出したデータセットを読み込む
+
+    ファイルはメモリマップして読み込み、必要な列と行だけを取り出す。
+    """
+
+    def __init__(self, root: Path, fmt: str = "parquet"):
+        pa = _pyarrow()
+        self.root = root
+        self.fmt = fmt
+        self._filesystem = pa.fs.LocalFileSystem(use_mmap=True)
+
+    def _dataset(self, name: str) -> Any:
+        pa = _pyarrow()
+        path = self.root / name
+        if not path.exists():
+            raise FileNotFoundError(path)
+        return pa.dataset.dataset(
+            str(path),
+            format=FORMATS[self.fmt],
+            partitioning="hive",
+            filesystem=self._filesystem,
+        )
+
+    def _read(
+        self,
+        name: str,
+        date_column: str,
+        columns: Optional[List[str]],
+        start: Optional[dt.date],
+        end: Optional[dt.date],
+        extra_filter: Any = None,
+    ) -> Any:
+        pa = _pyarrow()
+        field = pa.dataset.field
+        expr = extra_filter
+        conditions = []
+        if start is not None:
+            conditions += [
+                field("year") >= start.year,
+                field(date_column) >= start,
+            ]
+        if end is not None:
+            conditions += [field("year") <= end.year, field(date_column) <= end]
+        for cond in conditions:
+            expr = cond if expr is None else expr & cond
+        return self._dataset(name).to_table(columns=columns, filter=expr)
+
+    def participations(
+        self,
+        columns: Optional[List[str]] = None,
+        user_names: Optional[List[str]] = None,
+        start: Optional[dt.date] = None,
+        end: Optional[dt.date] = None,
+    ) -> Any:
+        pa = _pyarrow()
+        expr = None
+        if user_names is not None:
+            expr = pa.dataset.field("user_name").isin(user_names)
+        return self._read(
+            "participation", "attend_date", columns, start, end, expr
+        )
+
+    def statuses(
+        self,
+        kind: str = "statuses",
+        columns: Optional[List[str]] = None,
+        start: Optional[dt.date] = None,
+        end: Optional[dt.date] = None,
+    ) -> Any:
+        if kind not in STATUS_KINDS:
+            raise ValueError(f"Unexpected kind: {kind}")
+        return self._read(kind, "date", columns, start, end)
+
+    def rating_history(
+        self, user_names: Optional[List[str]] = None
+    ) -> Dict[str, Dict[str, List[Any]]]:
+        """GraphMaker に渡せる形式 (attend_date, rate_hist) のユーザーごとの履歴"""
+        table = self.participations(
+            columns=["user_name", "attend_date", "rate"], user_names=user_names
+        ).sort_by([("user_name", "ascending"), ("attend_date", "ascending")])
+
+        history: Dict[str, Dict[str, List[Any]]] = {}
+        for name, date, rate in zip(
+            table["user_name"].to_pylist(),
+            table["attend_date"].to_pylist(),
+            table["rate"].to_pylist(),
+        ):
+            user = history.setdefault(
+                name, {"attend_date": [], "rate_hist": []}
+            )
+            user["attend_date"].append(date.strftime("%Y/%m/%d"))
+            user["rate_hist"].append(rate)
+        return history
@@ -0,0 +1,107 @@
+import datetime as dt
+import gzip
+from typing import Any, Callable, List
+
+import orjson
+
+# 圧縮方式とファイル名の末尾
+COMPRESSION_SUFFIXES = {"gzip": ".gz", "zstd": ".zst"}
+
+
+def json_serial(obj: Any) -> str:
+    """JSON serializer for objects not serializable by default json code"""
+
+    if isinstance(obj, dt.datetime):
+        return obj.strftime("%Y-%m-%dT%H:%M:%S.%f%z")
+    raise TypeError("Type %s not serializable" % type(obj))
+
+
+def _compression_of(relative_path: str) -> str:
+    for compression, suffix in COMPRESSION_SUFFIXES.items():
+        if relative_path.endswith(suffix):
+            return compression
+    return "none"
+
+
+def storage_path(relative_path: str, compression: str) -> str:
+    """保存先のパス (圧縮する場合は末尾に .gz などを付ける)"""
+    if compression == "none" or _compression_of(relative_path) != "none":
+        return relative_path
+    if compression not in COMPRESSION_SUFFIXES:
+        raise ValueError(f"Unexpected compression: {compression}")
+    return relative_path + COMPRESSION_SUFFIXES[compression]
+
+
+def read_paths(relative_path: str, compression: str) -> List[str]:
+    """読み込む時に探すパスの候補
+
+    設定と異なる圧縮方式で以前に保存したファイルも読めるように、設定した
+    圧縮方式のパスの次に、元のパスと他の圧縮方式のパスも候補に含める。
+    末尾が .gz などのパスはそのファイルだけを探す。
+    """
+    if _compression_of(relative_path) != "none":
+        return [relative_path]
+    paths = [storage_path(relative_path, compression), relative_path]
+    paths += [
+        relative_path + suffix for suffix in COMPRESSION_SUFFIXES.values()
+    ]
+    return list(dict.fromkeys(paths))
+
+
+def _zstd() -> Any:
+    try:
+        import zstandard
+    except ImportError as e:
+        raise RuntimeError(
+            "zstandard is required to read or write .zst files"
+        ) from e
+    return zstandard
+
+
+def dumps(obj: Any, relative_path: str) -> bytes:
+    """オブジェクトを JSON にして、パスの末尾に応じて圧縮する"""
+    data = orjson.dumps(
+        obj,
+        default=json_serial,
+        option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME,
+    )
+    compression = _compression_of(relative_path)
+    if compression == "gzip":
+        return gzip.compress(data, compresslevel=6)
+    if compression == "zstd":
+        return _zstd().ZstdCompressor(level=3).compress(data)
+    return data
+
+
+def loads(data: bytes, relative_path: str) -> Any:
+    """パスの末尾に応じて展開し、JSON を読み込む (インデント付きの JSON も読める)"""
+    compression = _compression_of(relative_path)
+    if compression == "gzip":
+        data = gzip.decompress(data)
+    elif compression == "zstd":
+        data = _zstd().ZstdDecompressor().decompress(data)
+    return orjson.loads(data)
+
+
+def save_with_codec(
+    save_bytes: Callable[[bytes, str], None],
+    obj: Any,
+    relative_path: str,
+    compression: str,
+) -> None:
+    path = storage_path(relative_path, compression)
+    save_bytes(dumps(obj, path), path)
+    return
+
+
+def load_with_codec(
+    load_bytes: Callable[[str], bytes], relative_path: str, compression: str
+) -> Any:
+    """候補のパスを順に探して読み込む"""
+    paths = read_paths(relative_path, compression)
+    for path in paths[:-1]:
+        try:
+            return loads(load_bytes(path), path)
+        except FileNotFoundError:
+            continue
+    return loads(load_bytes(paths[-1]), paths[-1])
@@ -26,11 +26,40 @@ SYAROHO_LIST_ID = os.environ.get("SYAROHO_LIST_ID")
 # APIv1C
 TWITTER_PASSWORD = os.environ.get("TWITTER_PASSWORD")
 TWITTER_COOKIE_PATH = "data/cookie.pkl"
+# 結果のツイートを区切って並列に検索する時のスレッド数とリクエスト数の上限
+SEARCH_MAX_WORKERS = int(os.environ.get("SEARCH_MAX_WORKERS", "4"))
+SEARCH_MAX_REQUESTS = int(os.environ.get("SEARCH_MAX_REQUESTS", "50"))
 
 # data storage configs
 STORAGE = os.environ["STORAGE"]
 # s3 configs
 S3_BUCKET_NAME = os.environ.get("S3_BUCKET_NAME")
+# rating_info の保存方式 ("snapshot", "delta" or "sharded")
+RATING_INFO_STORAGE = os.environ.get("RATING_INFO_STORAGE", "snapshot")
+RATING_INFO_SNAPSHOT_INTERVAL = int(
+    os.environ.get("RATING_INFO_SNAPSHOT_INTERVAL", "30")
+)
+RATING_INFO_SHARDS = int(os.environ.get("RATING_INFO_SHARDS", "16"))
+# S3 に複数のファイルを並列に読み書きする時のスレッド数
+S3_MAX_WORKERS = int(os.environ.get("S3_MAX_WORKERS", "8"))
+# STORAGE が sqlite の時の保存先
+SQLITE_PATH = os.environ.get("SQLITE_PATH", "data/syaroho.sqlite3")
+# True の場合、保存をバックグラウンドで行う (未完了の保存は journal に残す)
+WRITE_BEHIND = (
+    True if os.environ.get("WRITE_BEHIND", "False") == "True" else False
+)
+WRITE_BEHIND_JOURNAL_DIR = os.environ.get("WRITE_BEHIND_JOURNAL_DIR", "journal")
+# 保存するファイルの圧縮方式 ("none", "gzip" or "zstd")
+STORAGE_COMPRESSION = os.environ.get("STORAGE_COMPRESSION", "none")
+# S3 から読み込んだファイルのローカルキャッシュ (空の場合は使わない)
+S3_CACHE_DIR = os.environ.get("S3_CACHE_DIR", "")
+S3_CACHE_MAX_MB = int(os.environ.get("S3_CACHE_MAX_MB", "1024"))
+# ユーザーごとの参加履歴のインデックスの分割数
+USER_HISTORY_SHARDS = 64
+# ツイートの保存先ディレクトリに日付ごとのファイル一覧 (manifest.json) を保存するか
+STATUSES_MANIFEST = (
+    True if os.environ.get("STATUSES_MANIFEST", "False") == "True" else False
+)
 
 # slack configs
 SLACK_NOTIFY = True if os.environ["SLACK_NOTIFY"] == "True" else False
@@ -40,6 +69,18 @@ SLACK_WEBHOOK_URL = os.environ.get("SLACK_WEBHOOK_URL")
 DO_RETWEET = True if os.environ["DO_RETWEET"] == "True" else False
 DO_POST = True if os.environ["DO_POST"] == "True" else False
 DEBUG = True if os.environ["DEBUG"] == "True" else False
+# True の場合、00:00:05 から 00:02 までリストを繰り返し取得して速報を更新する
+PRE_RESULT_LIVE = (
+    True if os.environ.get("PRE_RESULT_LIVE", "False") == "True" else False
+)
+# リストを取得する間隔 (秒)
+PRE_RESULT_POLL_INTERVAL = float(
+    os.environ.get("PRE_RESULT_POLL_INTERVAL", "5")
+)
+# 上位が変わった場合に速報を投稿し直す間隔 (秒、0 の場合は最初の 1 回のみ)
+PRE_RESULT_UPDATE_INTERVAL = float(
+    os.environ.get("PRE_RESULT_UPDATE_INTERVAL", "30")
+)
 
 REPLY_WAIT_TIME = 5  # minutes
 reply_patience = 900  # 投稿からこの秒数以上経過したツイートには返信しない
@@ -1,11 +1,17 @@
 import datetime as dt
+import hashlib
 import json
-import uuid
+import queue
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Any, Dict, List, Protocol, Union
+from typing import Any, Dict, Iterator, List, Optional, Protocol, Tuple, Union
 
 import boto3
-import tweepy
 from botocore.exceptions import ClientError
 from tenacity import (
     retry,
@@ -14,25 +20,92 @@ from tenacity import (
     wait_exponential,
 )
 
-from syaroho_rating.consts import S3_BUCKET_NAME, STORAGE
+from syaroho_rating.codec import (
+    json_serial,
+    load_with_codec,
+    save_with_codec,
+    storage_path,
+)
+from syaroho_rating.consts import (
+    RATING_INFO_SHARDS,
+    RATING_INFO_SNAPSHOT_INTERVAL,
+    RATING_INFO_STORAGE,
+    S3_BUCKET_NAME,
+    S3_CACHE_DIR,
+    S3_CACHE_MAX_MB,
+    S3_MAX_WORKERS,
+    SQLITE_PATH,
+    STATUSES_MANIFEST,
+    STORAGE,
+    STORAGE_COMPRESSION,
+    USER_HISTORY_SHARDS,
+    WRITE_BEHIND,
+    WRITE_BEHIND_JOURNAL_DIR,
+)
 from syaroho_rating.model import Tweet, User
+from syaroho_rating.rating import HISTORY_KEYS
+from syaroho_rating.status_stream import (
+    iter_syaroho_tweets_v1,
+    iter_syaroho_tweets_v2,
+)
 
 
 def get_io_handler(twitter_api_version: str) -> "IOHandler":
     base_handler: IOBaseHandler
     if STORAGE == "s3":
-        base_handler = S3IOBaseHandler()
+        base_handler = S3IOBaseHandler(compression=STORAGE_COMPRESSION)
+        if S3_CACHE_DIR:
+            base_handler = CachedIOBaseHandler(
+                base_handler,
+                cache_dir=Path(S3_CACHE_DIR),
+                max_bytes=S3_CACHE_MAX_MB * 1024 * 1024,
+            )
     elif STORAGE == "local":
-        base_handler = LocalIOBaseHandler()
+        base_handler = LocalIOBaseHandler(compression=STORAGE_COMPRESSION)
+    elif STORAGE == "sqlite":
+        from syaroho_rating.sqlite_handler import (
+            SQLiteIOBaseHandler,
+            SQLiteRatingInfoStore,
+        )
+
+        sqlite_handler = SQLiteIOBaseHandler(
+            Path(SQLITE_PATH), compression=STORAGE_COMPRESSION
+        )
+        base_handler = sqlite_handler
     else:
         raise RuntimeError(f"Unexpected STORAGE variable: {STORAGE}")
+    if WRITE_BEHIND:
+        base_handler = WriteBehindIOBaseHandler(
+            base_handler, journal_dir=Path(WRITE_BEHIND_JOURNAL_DIR)
+        )
+
+    rating_info_store: RatingInfoStore
+    if STORAGE == "sqlite":
+        # SQLite の場合は rating_info もテーブルに保存する。ローカルのファイルへの
+        # 1 回のトランザクションで済むため、WRITE_BEHIND の場合も rating_info
+        # だけはその場で保存する
+        rating_info_store = SQLiteRatingInfoStore(sqlite_handler)
+    elif RATING_INFO_STORAGE == "snapshot":
+        rating_info_store = SnapshotRatingInfoStore(base_handler)
+    elif RATING_INFO_STORAGE == "delta":
+        rating_info_store = DeltaRatingInfoStore(
+            base_handler, snapshot_interval=RATING_INFO_SNAPSHOT_INTERVAL
+        )
+    elif RATING_INFO_STORAGE == "sharded":
+        rating_info_store = ShardedRatingInfoStore(
+            base_handler, n_shards=RATING_INFO_SHARDS
+        )
+    else:
+        raise RuntimeError(
+            f"Unexpected RATING_INFO_STORAGE variable: {RATING_INFO_STORAGE}"
+        )
 
     if twitter_api_version == "1":
-        return IOHandlerV1(base_handler)
+        return IOHandlerV1(base_handler, rating_info_store)
     if twitter_api_version == "2":
-        return IOHandlerV2(base_handler)
+        return IOHandlerV2(base_handler, rating_info_store)
     if twitter_api_version == "1C":
-        return IOHandlerV1(base_handler)
+        return IOHandlerV1(base_handler, rating_info_store)
     else:
         raise RuntimeError(f"Unexpected version: {twitter_api_version}")
 
@@ -41,52 +114,73 @@ JsonObj = Union[List[Dict[str, Any]], Dict[str, Any]]
 
 
 class IOBaseHandler(Protocol):
+    # 圧縮方式 (none, gzip or zstd)。他の handler を包む場合はその値を引き継ぐ
+    compression: str
+
     def save_dict(self, dict_obj: JsonObj, relative_path: str) -> None:
         ...
 
     def load_dict(self, relative_path: str) -> Any:
         ...
 
-    def list_path(self, relative_path: str) -> List[Any]:
+    def save_bytes(self, data: bytes, relative_path: str) -> None:
         ...
 
-    def delete(self, relative_path: str) -> None:
+    def load_bytes(self, relative_path: str) -> bytes:
+        ...
+
+    def save_dicts(self, dict_objs: Mapping[str, JsonObj]) -> None:
+        """相対パスをキーとした複数のオブジェクトを保存する"""
         ...
 
+    def load_dicts(self, relative_paths: List[str]) -> Dict[str, Any]:
+        """複数のファイルを読み込み、相対パスをキーとした dict で返す"""
+        ...
 
-def json_serial(obj):
-    """JSON serializer for objects not serializable by default json code"""
+    def list_path(self, relative_path: str) -> List[Any]:
+        ...
 
-    if isinstance(obj, dt.datetime):
-        return obj.strftime("%Y-%m-%dT%H:%M:%S.%f%z")
-    raise TypeError("Type %s not serializable" % type(obj))
+    def delete(self, relative_path: str) -> None:
+        ...
 
+    def flush(self) -> None:
+        """保存を後回しにしているファイルを全て書き込む"""
+        ...
 
-class S3IOBaseHandler(IOBaseHandler):
-    temp_dir = Path("temp")
 
-    def __init__(self) -> None:
+class S3IOBaseHandler(IOBaseHandler):
+    def __init__(
+        self,
+        max_workers: int = S3_MAX_WORKERS,
+        compression: str = STORAGE_COMPRESSION,
+    ) -> None:
         super().__init__()
         self.s3 = boto3.client("s3")
-        self.temp_dir.mkdir(exist_ok=True)
 
         if S3_BUCKET_NAME is None:
             raise ValueError("Please S3_BUCKET_NAME")
         self.s3_bucket_name = S3_BUCKET_NAME
+        self.max_workers = max_workers
+        self.compression = compression
+
+    def save_dict(self, dict_obj: JsonObj, relative_path: str) -> None:
+        save_with_codec(
+            self.save_bytes, dict_obj, relative_path, self.compression
+        )
+        return
+
+    def load_dict(self, relative_path: str) -> Any:
+        return load_with_codec(self.load_bytes, relative_path, self.compression)
 
     @retry(
         wait=wait_exponential(multiplier=1, min=1, max=10),
         stop=stop_after_attempt(3),
     )
-    def save_dict(self, dict_obj: JsonObj, relative_path: str) -> None:
-        temp_path = self.temp_dir / f"{uuid.uuid4()}.json"
-        with temp_path.open("w") as f:
-            json.dump(
-                dict_obj, f, indent=4, ensure_ascii=False, default=json_serial
-            )
-        with temp_path.open("rb") as f:
-            self.s3.upload_fileobj(f, self.s3_bucket_name, relative_path)
-        temp_path.unlink(missing_ok=True)
+    def save_bytes(self, data: bytes, relative_path: str) -> None:
+        # 一時ファイルを経由せずメモリ上のデータをそのままアップロードする
+        self.s3.put_object(
+            Bucket=self.s3_bucket_name, Key=relative_path, Body=data
+        )
         return
 
     @retry(
@@ -94,21 +188,68 @@ class S3IOBaseHandler(IOBaseHandler):
         stop=stop_after_attempt(3),
         retry=retry_if_not_exception_type(FileNotFoundError),
     )
-    def load_dict(self, relative_path: str) -> Any:
-        temp_path = self.temp_dir / f"{uuid.uuid4()}.json"
-        with temp_path.open("wb") as f:
-            try:
-                self.s3.download_fileobj(self.s3_bucket_name, relative_path, f)
-            except ClientError as e:
-                raise FileNotFoundError(e)
-        with temp_path.open() as f:
-            dict_obj = json.load(f)
-        temp_path.unlink(missing_ok=True)
-        return dict_obj
+    def load_bytes(self, relative_path: str) -> bytes:
+        """ファイルの中身を一度に読み込む
+
+        保存しているのは 1 日分のツイートやレーティングなどの JSON で、大きくても
+        数十 MB 程度に収まる。呼び出し元は展開や JSON の読み込みのために中身全体を
+        bytes で必要とするので、分割して読んでも最大のメモリ使用量は変わらない。
+        そのため Body を分割せずに read() する。
+        """
+        try:
+            res = self.s3.get_object(
+                Bucket=self.s3_bucket_name, Key=relative_path
+            )
+        except ClientError as e:
+            raise FileNotFoundError(e)
+        return res["Body"].read()
+
+    @retry(
+        wait=wait_exponential(multiplier=1, min=1, max=10),
+        stop=stop_after_attempt(3),
+        retry=retry_if_not_exception_type(FileNotFoundError),
+    )
+    def load_bytes_if_modified(
+        self, relative_path: str, etag: Optional[str]
+    ) -> Tuple[Optional[bytes], Optional[str]]:
+        """ETag が etag と異なる場合のみ中身を取得し、(中身, ETag) を返す
+
+        変更されていない場合は中身の代わりに None を返す。中身は load_bytes と
+        同じく一度に読み込む。
+        """
+        kwargs = {"Bucket": self.s3_bucket_name, "Key": relative_path}
+        if etag is not None:
+            kwargs["IfNoneMatch"] = etag
+        try:
+            res = self.s3.get_object(**kwargs)
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ("304", "NotModified"):
+                return None, etag
+            raise FileNotFoundError(e)
+        return res["Body"].read(), res["ETag"]
+
+    def save_dicts(self, dict_objs: Mapping[str, JsonObj]) -> None:
+        # boto3 の client はスレッドセーフなので使い回す
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [
+                executor.submit(self.save_dict, dict_obj, relative_path)
+                for relative_path, dict_obj in dict_objs.items()
+            ]
+            for future in futures:
+                future.result()
+        return
+
+    def load_dicts(self, relative_paths: List[str]) -> Dict[str, Any]:
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            dict_objs = executor.map(self.load_dict, relative_paths)
+            return dict(zip(relative_paths, dict_objs))
 
     def delete(self, relative_path: str) -> None:
         raise NotImplementedError
 
+    def flush(self) -> None:
+        return
+
     @retry(
         wait=wait_exponential(multiplier=1, min=1, max=10),
         stop=stop_after_attempt(3),
@@ -126,43 +267,918 @@ class S3IOBaseHandler(IOBaseHandler):
         return obj_list
 
 
+class CachedIOBaseHandler(IOBaseHandler):
+    """S3IOBaseHandler から読み込んだファイルをローカルディスクに保存しておく
+
+    キャッシュがある場合も ETag で S3 上のファイルが変更されていないかを
+    確認し、変更されていた場合のみダウンロードし直す。キャッシュの合計サイズが
+    max_bytes を超えた場合は、最後に参照されたのが古いものから削除する。
+    index.json はファイルを追加/削除した時に保存し、参照した順番の変更は
+    flush の時にまとめて保存する。
+    """
+
+    def __init__(
+        self,
+        base_handler: S3IOBaseHandler,
+        cache_dir: Path = Path("cache"),
+        max_bytes: int = 1024 * 1024 * 1024,
+    ) -> None:
+        self.base_handler = base_handler
+        self.compression = base_handler.compression
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+        self.hits = 0  # キャッシュが最新だった回数
+        self.misses = 0  # S3 からダウンロードした回数
+        self._lock = threading.Lock()
+        # 相対パス -> {"etag", "size"} (最後に参照されたものが末尾)
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        # 参照した順番が index.json と異なるかどうか
+        self._order_changed = False
+        try:
+            with self._index_path.open() as f:
+                self._entries.update(json.load(f))
+        except FileNotFoundError:
+            pass
+
+    @property
+    def _index_path(self) -> Path:
+        return self.cache_dir / "index.json"
+
+    def _cache_path(self, relative_path: str) -> Path:
+        key = hashlib.sha1(relative_path.encode("utf-8")).hexdigest()
+        return self.cache_dir / f"{key}.json"
+
+    def _save_index(self) -> None:
+        with self._index_path.open("w") as f:
+            json.dump(self._entries, f)
+        self._order_changed = False
+        return
+
+    def _evict(self) -> None:
+        total = sum(e["size"] for e in self._entries.values())
+        while total > self.max_bytes and self._entries:
+            relative_path, entry = self._entries.popitem(last=False)
+            self._cache_path(relative_path).unlink(missing_ok=True)
+            total -= entry["size"]
+        return
+
+    def _remove(self, relative_path: str) -> None:
+        with self._lock:
+            if self._entries.pop(relative_path, None) is not None:
+                self._cache_path(relative_path).unlink(missing_ok=True)
+                self._save_index()
+        return
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(self._entries),
+            "bytes": sum(e["size"] for e in self._entries.values()),
+        }
+
+    def _read_cache(self, relative_path: str) -> Optional[bytes]:
+        with self._lock:
+            cache_path = self._cache_path(relative_path)
+            if relative_path not in self._entries:
+                return None
+            if not cache_path.exists():
+                del self._entries[relative_path]
+                self._save_index()
+                return None
+            self.hits += 1
+            self._entries.move_to_end(relative_path)
+            self._order_changed = True
+            return cache_path.read_bytes()
+
+    def _write_cache(self, relative_path: str, body: bytes, etag: str) -> None:
+        with self._lock:
+            self.misses += 1
+            self._cache_path(relative_path).write_bytes(body)
+            self._entries[relative_path] = {"etag": etag, "size": len(body)}
+            self._entries.move_to_end(relative_path)
+            self._evict()
+            self._save_index()
+        return
+
+    def load_bytes(self, relative_path: str) -> bytes:
+        with self._lock:
+            entry = self._entries.get(relative_path)
+        etag = entry["etag"] if entry is not None else None
+
+        try:
+            body, new_etag = self.base_handler.load_bytes_if_modified(
+                relative_path, etag
+            )
+            if body is None:
+                body = self._read_cache(relative_path)
+            if body is None:
+                # キャッシュのファイルが削除されていた
+                etag = None
+                body, new_etag = self.base_handler.load_bytes_if_modified(
+                    relative_path, None
+                )
+        except FileNotFoundError:
+            self._remove(relative_path)
+            raise
+
+        if new_etag != etag:
+            self._write_cache(relative_path, body, new_etag)
+        return body
+
+    def load_dict(self, relative_path: str) -> Any:
+        return load_with_codec(self.load_bytes, relative_path, self.compression)
+
+    def load_dicts(self, relative_paths: List[str]) -> Dict[str, Any]:
+        with ThreadPoolExecutor(
+            max_workers=self.base_handler.max_workers
+        ) as executor:
+            dict_objs = executor.map(self.load_dict, relative_paths)
+            return dict(zip(relative_paths, dict_objs))
+
+    def save_bytes(self, data: bytes, relative_path: str) -> None:
+        self._remove(relative_path)
+        self.base_handler.save_bytes(data, relative_path)
+        return
+
+    def save_dict(self, dict_obj: JsonObj, relative_path: str) -> None:
+        save_with_codec(
+            self.save_bytes, dict_obj, relative_path, self.compression
+        )
+        return
+
+    def save_dicts(self, dict_objs: Mapping[str, JsonObj]) -> None:
+        for relative_path in dict_objs:
+            self._remove(storage_path(relative_path, self.compression))
+        self.base_handler.save_dicts(dict_objs)
+        return
+
+    def list_path(self, relative_path: str) -> List[Any]:
+        return self.base_handler.list_path(relative_path)
+
+    def delete(self, relative_path: str) -> None:
+        self._remove(relative_path)
+        self.base_handler.delete(relative_path)
+        return
+
+    def flush(self) -> None:
+        with self._lock:
+            if self._order_changed:
+                self._save_index()
+        self.base_handler.flush()
+        return
+
+
 class LocalIOBaseHandler(IOBaseHandler):
-    def __init__(self, base_path: Path = Path("data")):
+    def __init__(
+        self,
+        base_path: Path = Path("data"),
+        compression: str = STORAGE_COMPRESSION,
+    ):
         super().__init__()
         self.base_path = base_path
         self.base_path.mkdir(exist_ok=True)
+        self.compression = compression
 
     def save_dict(self, dict_obj: JsonObj, relative_path: str) -> None:
+        save_with_codec(
+            self.save_bytes, dict_obj, relative_path, self.compression
+        )
+        return
+
+    def load_dict(self, relative_path: str) -> Any:
+        return load_with_codec(self.load_bytes, relative_path, self.compression)
+
+    def save_bytes(self, data: bytes, relative_path: str) -> None:
         file_path = self.base_path / relative_path
         file_path.parent.mkdir(parents=True, exist_ok=True)
-        with file_path.open("w") as f:
-            json.dump(
-                dict_obj, f, indent=4, ensure_ascii=False, default=json_serial
-            )
+        file_path.write_bytes(data)
         return
 
-    def load_dict(self, relative_path: str) -> Any:
+    def load_bytes(self, relative_path: str) -> bytes:
         file_path = self.base_path / relative_path
-        with file_path.open() as f:
-            dict_obj = json.load(f)
-        return dict_obj
+        return file_path.read_bytes()
+
+    def save_dicts(self, dict_objs: Mapping[str, JsonObj]) -> None:
+        for relative_path, dict_obj in dict_objs.items():
+            self.save_dict(dict_obj, relative_path)
+        return
+
+    def load_dicts(self, relative_paths: List[str]) -> Dict[str, Any]:
+        return {p: self.load_dict(p) for p in relative_paths}
 
     def delete(self, relative_path: str) -> None:
         pass
 
+    def flush(self) -> None:
+        return
+
     def list_path(self, relative_path: str) -> List[Any]:
-        """base path からの相対パスのリストを返す"""
+        """base path からの相対パスのリストを返す
+
+        S3 と同じく、ディレクトリでない場合はファイル名の prefix として扱う。
+        """
         dir_path = self.base_path / relative_path
-        obj_list = [
-            str(p.relative_to(self.base_path)) for p in dir_path.iterdir()
-        ]
+        if dir_path.is_dir():
+            paths = list(dir_path.iterdir())
+        else:
+            prefix = dir_path.name
+            paths = [
+                p
+                for p in dir_path.parent.iterdir()
+                if p.name.startswith(prefix)
+            ]
+        obj_list = [str(p.relative_to(self.base_path)) for p in paths]
         return obj_list
 
 
+class WriteBehindIOBaseHandler(IOBaseHandler):
+    """保存をバックグラウンドのスレッドで行い、呼び出し元をすぐに返す
+
+    保存するデータは先にローカルの journal_dir に書いておき、保存が完了したら
+    削除する。同じパスの保存が後で成功した場合は、それより前に失敗した分の
+    journal とエラーも削除する。プロセスが途中で終了した場合は、次に作成した
+    時に journal に残っているデータのうちパスごとに最新のものを保存し直す
+    (失敗しても作成は続け、journal を残して flush で再度保存する)。
+    保存待ちのファイルを読み込んだ場合は、保存待ちのデータを返す。flush で
+    全ての保存の完了を待ち、失敗したものはもう一度だけ保存し直してから、
+    それでも失敗したものがあれば例外を送出する。
+    """
+
+    def __init__(
+        self, base_handler: IOBaseHandler, journal_dir: Path = Path("journal")
+    ) -> None:
+        self.base_handler = base_handler
+        self.compression = base_handler.compression
+        self.journal_dir = journal_dir
+        self.journal_dir.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._seq = 0
+        # 保存待ちのデータ (保存先のパス -> (通し番号, データ))
+        self._pending: Dict[str, Tuple[int, bytes]] = {}
+        # 保存に失敗したパスとその例外
+        self._errors: Dict[str, Exception] = {}
+        # 保存に失敗して残っている journal (保存先のパス -> journal のリスト)
+        self._failed_entries: Dict[str, List[Path]] = {}
+        self._queue: "queue.Queue[Tuple[int, str, Path]]" = queue.Queue()
+
+        self._replay_journal()
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+
+    @staticmethod
+    def _read_entry(entry: Path) -> Tuple[str, bytes]:
+        relative_path, data = entry.read_bytes().split(b"\n", 1)
+        return relative_path.decode("utf-8"), data
+
+    def _replay_journal(self) -> None:
+        # 古いものから順に並べ、パスごとに最新の journal だけを保存し直す
+        entries: Dict[str, List[Path]] = {}
+        for entry in sorted(self.journal_dir.glob("*.entry")):
+            try:
+                with entry.open("rb") as f:
+                    relative_path = f.readline().rstrip(b"\n").decode("utf-8")
+            except (OSError, UnicodeDecodeError) as e:
+                print(f"Could not read journal entry {entry}: {e!r}")
+                continue
+            entries.setdefault(relative_path, []).append(entry)
+        for relative_path, path_entries in entries.items():
+            print(f"Recovering unsaved file {relative_path}...")
+            try:
+                _, data = self._read_entry(path_entries[-1])
+            except (OSError, ValueError) as e:
+                # 読めない journal は残しておく
+                print(f"Could not read journal entry {path_entries[-1]}: {e!r}")
+                continue
+            try:
+                self.base_handler.save_bytes(data, relative_path)
+            except Exception as e:
+                # journal を残し、flush で保存し直す
+                print(f"Failed to recover {relative_path}: {e!r}")
+                with self._lock:
+                    self._seq += 1
+                    self._pending[relative_path] = (self._seq, data)
+                    self._errors[relative_path] = e
+                    self._failed_entries[relative_path] = path_entries
+                continue
+            for entry in path_entries:
+                entry.unlink()
+        return
+
+    def _run(self) -> None:
+        while True:
+            seq, relative_path, entry = self._queue.get()
+            try:
+                with self._lock:
+                    data = self._pending[relative_path][1]
+                self.base_handler.save_bytes(data, relative_path)
+                entry.unlink(missing_ok=True)
+                # 前に失敗した同じパスの journal とエラーは不要になる
+                with self._lock:
+                    failed = self._failed_entries.pop(relative_path, [])
+                    self._errors.pop(relative_path, None)
+                for old_entry in failed:
+                    old_entry.unlink(missing_ok=True)
+            except Exception as e:
+                # journal は残しておき、flush か次回作成した時に保存し直す
+                with self._lock:
+                    self._errors[relative_path] = e
+                    failed = self._failed_entries.setdefault(relative_path, [])
+                    if entry not in failed:
+                        failed.append(entry)
+            finally:
+                with self._lock:
+                    if self._pending[relative_path][0] == seq:
+                        del self._pending[relative_path]
+                self._queue.task_done()
+
+    def save_bytes(self, data: bytes, relative_path: str) -> None:
+        with self._lock:
+            self._seq += 1
+            seq = self._seq
+            # 前回の実行で残った journal より後に並ぶように時刻を付ける
+            entry = self.journal_dir / f"{time.time_ns()}_{seq:08d}.entry"
+            temp = entry.with_suffix(".tmp")
+            temp.write_bytes(relative_path.encode("utf-8") + b"\n" + data)
+            temp.replace(entry)
+            self._pending[relative_path] = (seq, data)
+        self._queue.put((seq, relative_path, entry))
+        return
+
+    def load_bytes(self, relative_path: str) -> bytes:
+        with self._lock:
+            pending = self._pending.get(relative_path)
+        if pending is not None:
+            return pending[1]
+        return self.base_handler.load_bytes(relative_path)
+
+    def save_dict(self, dict_obj: JsonObj, relative_path: str) -> None:
+        save_with_codec(
+            self.save_bytes, dict_obj, relative_path, self.compression
+        )
+        return
+
+    def load_dict(self, relative_path: str) -> Any:
+        return load_with_codec(self.load_bytes, relative_path, self.compression)
+
+    def save_dicts(self, dict_objs: Mapping[str, JsonObj]) -> None:
+        for relative_path, dict_obj in dict_objs.items():
+            self.save_dict(dict_obj, relative_path)
+        return
+
+    def load_dicts(self, relative_paths: List[str]) -> Dict[str, Any]:
+        with self._lock:
+            pending = [
+                p
+                for p in relative_paths
+                if storage_path(p, self.compression) in self._pending
+            ]
+        dict_objs = {p: self.load_dict(p) for p in pending}
+        dict_objs.update(
+            self.base_handler.load_dicts(
+                [p for p in relative_paths if p not in dict_objs]
+            )
+        )
+        return {p: dict_objs[p] for p in relative_paths}
+
+    def list_path(self, relative_path: str) -> List[Any]:
+        obj_list = self.base_handler.list_path(relative_path)
+        with self._lock:
+            pending = [
+                p
+                for p in self._pending
+                if p.startswith(relative_path) and p not in obj_list
+            ]
+        return obj_list + pending
+
+    def delete(self, relative_path: str) -> None:
+        self.flush()
+        self.base_handler.delete(relative_path)
+        return
+
+    def _retry_failed(self) -> None:
+        """保存に失敗したパスごとに、最新の journal をもう一度保存する"""
+        with self._lock:
+            retries = []
+            for relative_path in self._errors:
+                entry = self._failed_entries[relative_path][-1]
+                pending = self._pending.get(relative_path)
+                if pending is None:
+                    self._seq += 1
+                    pending = (self._seq, self._read_entry(entry)[1])
+                    self._pending[relative_path] = pending
+                retries.append((pending[0], relative_path, entry))
+        for retry in retries:
+            print(f"Retrying to save {retry[1]}...")
+            self._queue.put(retry)
+        return
+
+    def flush(self) -> None:
+        self._queue.join()
+        self._retry_failed()
+        self._queue.join()
+        self.base_handler.flush()
+        with self._lock:
+            errors = list(self._errors.items())
+        if len(errors):
+            paths = ", ".join(p for p, _ in errors)
+            raise RuntimeError(
+                f"Failed to save {len(errors)} files: {paths}"
+            ) from errors[0][1]
+        return
+
+
+def count_entries_on(user_info: Dict[str, Any], date_str: str) -> int:
+    """その日に追加された履歴の数 (同じ日に複数回記録されることもある)"""
+    attend_dates = user_info["attend_date"]
+    n = 0
+    while n < len(attend_dates) and attend_dates[-1 - n] == date_str:
+        n += 1
+    return n
+
+
+def shard_of(user_name: str, n_shards: int) -> int:
+    """ユーザー名から shard 番号を決める (実行ごとに変わらないハッシュを使う)"""
+    return zlib.crc32(user_name.encode("utf-8")) % n_shards
+
+
+class RatingInfoStore(Protocol):
+    def get(self, date: dt.date) -> Dict[str, Any]:
+        ...
+
+    def get_users(self, date: dt.date, user_names: List[str]) -> Dict[str, Any]:
+        """rating_info のうち user_names のユーザーの分だけを返す"""
+        ...
+
+    def save(self, rating_info: Dict, date: dt.date) -> None:
+        ...
+
+
+class SnapshotRatingInfoStore(RatingInfoStore):
+    """日毎に rating_info 全体を保存する"""
+
+    dirname = "rating_info"
+
+    def __init__(self, base_handler: IOBaseHandler) -> None:
+        self.base_handler = base_handler
+
+    def get(self, date: dt.date) -> Dict[str, Any]:
+        date_str = date.strftime("%Y%m%d")  # like 20200101
+        filename = f"{date_str}.json"
+        rating_info = self.base_handler.load_dict(f"{self.dirname}/{filename}")
+        return rating_info
+
+    def get_users(self, date: dt.date, user_names: List[str]) -> Dict[str, Any]:
+        rating_info = self.get(date)
+        return {n: rating_info[n] for n in user_names if n in rating_info}
+
+    def save(self, rating_info: Dict, date: dt.date) -> None:
+        date_str = date.strftime("%Y%m%d")  # like 20200101
+        filename = f"{date_str}.json"
+        self.base_handler.save_dict(rating_info, f"{self.dirname}/{filename}")
+        return
+
+
+class DeltaRatingInfoStore(RatingInfoStore):
+    """その日の参加者の変更分だけを保存し、定期的に全体を保存する
+
+    rating_info_delta/YYYYMMDD.json には、その日の参加者の更新後のスカラー値と
+    追加された履歴を保存する。スナップショットを保存した日は、代わりに
+    スナップショットを参照する目印を保存する。ある日の rating_info は、
+    直近のスナップショットにその後の変更分を順に適用して復元する。
+    """
+
+    snapshot_dirname = "rating_info"
+    delta_dirname = "rating_info_delta"
+
+    def __init__(
+        self, base_handler: IOBaseHandler, snapshot_interval: int = 30
+    ) -> None:
+        self.base_handler = base_handler
+        self.snapshot_interval = snapshot_interval
+        self.snapshot_store = SnapshotRatingInfoStore(base_handler)
+
+        # 最後に読み込み/保存した日付と、その状態の元になったスナップショットの日付
+        self._last_date: Optional[dt.date] = None
+        self._base_date: Optional[dt.date] = None
+
+    def _delta_path(self, date: dt.date) -> str:
+        date_str = date.strftime("%Y%m%d")  # like 20200101
+        return f"{self.delta_dirname}/{date_str}.json"
+
+    def _load_delta(self, date: dt.date) -> Optional[Dict[str, Any]]:
+        try:
+            return self.base_handler.load_dict(self._delta_path(date))
+        except FileNotFoundError:
+            return None
+
+    def get(self, date: dt.date) -> Dict[str, Any]:
+        # スナップショットまで遡って変更分を集める
+        deltas = []
+        base_date = date
+        while True:
+            delta = self._load_delta(base_date)
+            if delta is None or delta["snapshot"]:
+                break
+            deltas.append(delta)
+            base_date = base_date - dt.timedelta(days=1)
+
+        try:
+            rating_info = self.snapshot_store.get(base_date)
+        except FileNotFoundError as e:
+            raise FileNotFoundError(
+                f"No rating info snapshot found for {base_date}"
+            ) from e
+        for delta in deltas[::-1]:
+            self.apply_delta(rating_info, delta)
+
+        self._last_date = date
+        self._base_date = base_date
+        return rating_info
+
+    def get_users(self, date: dt.date, user_names: List[str]) -> Dict[str, Any]:
+        rating_info = self.get(date)
+        return {n: rating_info[n] for n in user_names if n in rating_info}
+
+    def save(self, rating_info: Dict, date: dt.date) -> None:
+        # 直前に扱った前日の状態から計算した場合のみ変更分として保存できる
+        follows_last = self._last_date == date - dt.timedelta(days=1)
+        if (
+            not follows_last
+            or self._base_date is None
+            or (date - self._base_date).days >= self.snapshot_interval
+        ):
+            self.snapshot_store.save(rating_info, date)
+            delta = {"date": date.strftime("%Y/%m/%d"), "snapshot": True}
+            self._base_date = date
+        else:
+            delta = self.make_delta(rating_info, date)
+        self.base_handler.save_dict(delta, self._delta_path(date))
+        self._last_date = date
+        return
+
+    @staticmethod
+    def make_delta(rating_info: Dict, date: dt.date) -> Dict[str, Any]:
+        date_str = date.strftime("%Y/%m/%d")
+        users: Dict[str, Any] = {}
+        for name, info in rating_info.items():
+            n_today = count_entries_on(info, date_str)
+            if n_today == 0:
+                continue
+
+            if n_today == len(info["attend_date"]):
+                # 初参加のユーザーは全体を保存する
+                users[name] = {"new": info}
+            else:
+                users[name] = {
+                    "scalars": {
+                        k: v for k, v in info.items() if k not in HISTORY_KEYS
+                    },
+                    "history": {k: info[k][-n_today:] for k in HISTORY_KEYS},
+                }
+        return {"date": date_str, "snapshot": False, "users": users}
+
+    @staticmethod
+    def apply_delta(rating_info: Dict, delta: Dict[str, Any]) -> None:
+        for name, change in delta["users"].items():
+            if "new" in change:
+                rating_info[name] = change["new"]
+                continue
+            info = rating_info[name]
+            info.update(change["scalars"])
+            for k in HISTORY_KEYS:
+                info[k] += change["history"][k]
+        return
+
+
+class ShardedRatingInfoStore(RatingInfoStore):
+    """rating_info をユーザー名のハッシュで分割して保存する
+
+    rating_info_shards/YYYYMMDD/NNN.json に各 shard を保存し、全ての shard を
+    保存し終えてから manifest.json を保存する。manifest.json が無い日付は
+    保存が完了していないものとして扱う。manifest.json が無い日付は、
+    分割して保存する前の rating_info/YYYYMMDD.json があればそれを読み込む。
+    一部のユーザーだけが必要な場合は、そのユーザーを含む shard だけを読み込む。
+    """
+
+    dirname = "rating_info_shards"
+
+    def __init__(self, base_handler: IOBaseHandler, n_shards: int = 16) -> None:
+        self.base_handler = base_handler
+        self.n_shards = n_shards
+        self.snapshot_store = SnapshotRatingInfoStore(base_handler)
+
+    def _date_dir(self, date: dt.date) -> str:
+        date_str = date.strftime("%Y%m%d")  # like 20200101
+        return f"{self.dirname}/{date_str}"
+
+    def _shard_path(self, date: dt.date, shard: int) -> str:
+        return f"{self._date_dir(date)}/{shard:03d}.json"
+
+    def _load_shards(self, date: dt.date, shards: List[int]) -> Dict[str, Any]:
+        paths = [self._shard_path(date, shard) for shard in shards]
+        rating_info: Dict[str, Any] = {}
+        for users in self.base_handler.load_dicts(paths).values():
+            rating_info.update(users)
+        return rating_info
+
+    def _load_manifest(self, date: dt.date) -> Dict[str, Any]:
+        return self.base_handler.load_dict(
+            f"{self._date_dir(date)}/manifest.json"
+        )
+
+    def get(self, date: dt.date) -> Dict[str, Any]:
+        try:
+            manifest = self._load_manifest(date)
+        except FileNotFoundError:
+            # 保存方式を切り替える前の日付
+            return self.snapshot_store.get(date)
+        return self._load_shards(date, list(range(manifest["n_shards"])))
+
+    def get_users(self, date: dt.date, user_names: List[str]) -> Dict[str, Any]:
+        try:
+            n_shards = self._load_manifest(date)["n_shards"]
+        except FileNotFoundError:
+            return self.snapshot_store.get_users(date, user_names)
+        shards = sorted({shard_of(name, n_shards) for name in user_names})
+        rating_info = self._load_shards(date, shards)
+        return {n: rating_info[n] for n in user_names if n in rating_info}
+
+    def save(self, rating_info: Dict, date: dt.date) -> None:
+        shards: Dict[str, Dict[str, Any]] = {
+            self._shard_path(date, shard): {} for shard in range(self.n_shards)
+        }
+        for name, info in rating_info.items():
+            shard = shard_of(name, self.n_shards)
+            shards[self._shard_path(date, shard)][name] = info
+        self.base_handler.save_dicts(shards)
+
+        manifest = {
+            "date": date.strftime("%Y%m%d"),
+            "n_shards": self.n_shards,
+            "n_users": len(rating_info),
+        }
+        self.base_handler.save_dict(
+            manifest, f"{self._date_dir(date)}/manifest.json"
+        )
+        return
+
+
+class UserHistoryIndex(object):
+    """ユーザーごとの最新の参加履歴を username のハッシュで分割して保存する
+
+    user_history/NN.json に、その shard に属するユーザーのグラフと返信に必要な
+    情報を保存する。前日に続けて保存する場合は、その日の参加者を含む shard
+    だけを書き直す (参加していないユーザーの情報は変わらないため)。
+    保存済みの日付より前の日付 (backfill のやり直しなど) では更新しない。
+    1 ユーザー分の情報は shard 1 つを読むだけで取得できる。
+    """
+
+    dirname = "user_history"
+    keys = (
+        "best_time",
+        "highest",
+        "rate",
+        "attend",
+        "win",
+        "attend_date",
+        "rate_hist",
+    )
+
+    def __init__(self, base_handler: IOBaseHandler, n_shards: int = 64):
+        self.base_handler = base_handler
+        self.n_shards = n_shards
+        self._manifest: Optional[Dict[str, Any]] = None
+
+    def _shard_path(self, shard: int) -> str:
+        return f"{self.dirname}/{shard:03d}.json"
+
+    def _load_manifest(self) -> Dict[str, Any]:
+        if self._manifest is None:
+            try:
+                self._manifest = self.base_handler.load_dict(
+                    f"{self.dirname}/manifest.json"
+                )
+            except FileNotFoundError:
+                self._manifest = {"date": None, "n_shards": self.n_shards}
+        return self._manifest
+
+    def save(self, rating_info: Dict, date: dt.date) -> None:
+        manifest = self._load_manifest()
+        if manifest["date"] is not None and (
+            manifest["date"] > date.strftime("%Y%m%d")
+        ):
+            print(
+                f"User history index is already saved for {manifest['date']}."
+                f" Skip updating it with {date}."
+            )
+            return
+
+        prev_date_str = (date - dt.timedelta(days=1)).strftime("%Y%m%d")
+        n_shards = self.n_shards
+        if manifest["date"] == prev_date_str and (
+            manifest["n_shards"] == n_shards
+        ):
+            date_str = date.strftime("%Y/%m/%d")
+            target_shards = {
+                shard_of(name, n_shards)
+                for name, info in rating_info.items()
+                if count_entries_on(info, date_str) > 0
+            }
+        else:
+            target_shards = set(range(n_shards))
+
+        shards: Dict[str, Dict[str, Any]] = {
+            self._shard_path(i): {} for i in target_shards
+        }
+        for name, info in rating_info.items():
+            shard_path = self._shard_path(shard_of(name, n_shards))
+            if shard_path in shards:
+                shards[shard_path][name] = {k: info[k] for k in self.keys}
+        self.base_handler.save_dicts(shards)
+
+        self._manifest = {"date": date.strftime("%Y%m%d"), "n_shards": n_shards}
+        self.base_handler.save_dict(
+            self._manifest, f"{self.dirname}/manifest.json"
+        )
+        return
+
+    def get(self, user_name: str) -> Dict[str, Any]:
+        manifest = self._load_manifest()
+        shard = shard_of(user_name, manifest["n_shards"])
+        try:
+            users = self.base_handler.load_dict(self._shard_path(shard))
+        except FileNotFoundError:
+            users = {}
+        if user_name not in users:
+            raise KeyError(user_name)
+        return users[user_name]
+
+
+class UserHistoryMapping(Mapping):
+    """rating_info の dict の代わりに GraphMaker や返信処理に渡すための Mapping
+
+    参照されたユーザーの情報だけを UserHistoryIndex から読み込む。インデックスに
+    無いユーザー (インデックスを作る前など) は、date を指定した場合はその日の
+    rating_info からそのユーザーの分だけを読み込む。
+    """
+
+    def __init__(self, io_handler: "IOHandler", date: Optional[dt.date] = None):
+        self.io = io_handler
+        self.date = date
+        self._cache: Dict[str, Dict[str, Any]] = {}
+
+    def __getitem__(self, user_name: str) -> Dict[str, Any]:
+        if user_name not in self._cache:
+            try:
+                self._cache[user_name] = self.io.get_user_history(user_name)
+            except KeyError:
+                if self.date is None:
+                    raise
+                users = self.io.get_rating_info_of_users(self.date, [user_name])
+                if user_name not in users:
+                    raise
+                self._cache[user_name] = users[user_name]
+        return self._cache[user_name]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._cache)
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+
+def _dedupe_by_id(objs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """id (メディアの場合は media_key) が重複するものは最初に出てきたものだけを残す"""
+    seen = set()
+    deduped = []
+    for obj in objs:
+        obj_id = obj.get("id_str", obj.get("id", obj.get("media_key")))
+        if obj_id is not None:
+            if str(obj_id) in seen:
+                continue
+            seen.add(str(obj_id))
+        deduped.append(obj)
+    return deduped
+
+
+def merge_statuses_v1(statuses_dicts: List[Dict[str, Any]]) -> List[Dict]:
+    """同じ日付の複数のファイルに保存した v1 のツイートを統合する"""
+    results: List[Dict[str, Any]] = []
+    for statuses_dict in statuses_dicts:
+        results += statuses_dict["results"]
+    return _dedupe_by_id(results)
+
+
+def merge_statuses_v2(statuses_dicts: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """同じ日付の複数のファイルに保存した v2 のツイートとユーザーなどを統合する"""
+    data: List[Dict[str, Any]] = []
+    includes: Dict[str, List[Dict[str, Any]]] = {"users": []}
+    for statuses_dict in statuses_dicts:
+        data += statuses_dict.get("data", [])
+        for key, objs in statuses_dict.get("includes", {}).items():
+            includes.setdefault(key, []).extend(objs)
+    return {
+        "data": _dedupe_by_id(data),
+        "includes": {
+            key: _dedupe_by_id(objs) for key, objs in includes.items()
+        },
+    }
+
+
+class StatusFileIndex(object):
+    """ツイートの保存先ディレクトリから、ある日付のファイルの一覧を引く
+
+    use_manifest が True の場合、ディレクトリ内の manifest.json に日付ごとの
+    ファイル一覧を保存し、ファイル一覧を取得する時はそれを参照する。
+    manifest に無い日付は、日付を prefix にしてファイルを検索する。
+    ファイル名は圧縮した場合の末尾 (.gz など) を付けた実際の保存先で扱う。
+    """
+
+    def __init__(
+        self, base_handler: IOBaseHandler, dirname: str, use_manifest: bool
+    ) -> None:
+        self.base_handler = base_handler
+        self.dirname = dirname
+        self.use_manifest = use_manifest
+        self.compression = base_handler.compression
+        self._manifest: Optional[Dict[str, List[str]]] = None
+
+    @property
+    def manifest_path(self) -> str:
+        return f"{self.dirname}/manifest.json"
+
+    def _load_manifest(self) -> Dict[str, List[str]]:
+        if self._manifest is None:
+            try:
+                self._manifest = self.base_handler.load_dict(self.manifest_path)
+            except FileNotFoundError:
+                self._manifest = {}
+        return self._manifest
+
+    def files_of(self, date: dt.date) -> List[str]:
+        date_str = date.strftime("%Y%m%d")  # like 20200101
+        if self.use_manifest:
+            manifest = self._load_manifest()
+            if date_str in manifest:
+                return manifest[date_str]
+
+        prefix = f"{self.dirname}/{date_str}"
+        file_list = [
+            str(f_path)
+            for f_path in self.base_handler.list_path(prefix)
+            if prefix in str(f_path)
+        ]
+        # 圧縮する前に保存したファイルと、同じファイルを圧縮して保存し直した
+        # ものが両方ある場合は、圧縮したものだけを使う
+        return sorted(
+            f_path
+            for f_path in file_list
+            if f_path == storage_path(f_path, self.compression)
+            or storage_path(f_path, self.compression) not in file_list
+        )
+
+    def add(self, date: dt.date, relative_path: str) -> None:
+        if not self.use_manifest:
+            return
+        date_str = date.strftime("%Y%m%d")  # like 20200101
+        saved_path = storage_path(relative_path, self.compression)
+        manifest = self._load_manifest()
+        if date_str not in manifest:
+            # manifest を作る前に保存されたファイルも含める
+            self._manifest = None
+            manifest = self._load_manifest()
+            manifest[date_str] = self.files_of(date)
+        # 圧縮の有無だけが異なるパスは同じファイルとして扱う
+        file_list = [
+            saved_path
+            if storage_path(f_path, self.compression) == saved_path
+            else f_path
+            for f_path in manifest[date_str]
+        ]
+        if saved_path not in file_list:
+            file_list.append(saved_path)
+        manifest[date_str] = list(dict.fromkeys(file_list))
+        self.base_handler.save_dict(manifest, self.manifest_path)
+        return
+
+
 class IOHandler(Protocol):
+    base_handler: IOBaseHandler
+
     def get_statuses(self, date: dt.date) -> List[Tweet]:
         ...
 
+    def iter_syaroho_statuses(self, date: dt.date) -> Iterator[Tweet]:
+        """保存したツイートのうち、本文が "しゃろほー" のものだけを返す"""
+        ...
+
+    def iter_syaroho_statuses_dq(self, date: dt.date) -> Iterator[Tweet]:
+        ...
+
     def save_statuses(self, statuses: JsonObj, date: dt.date) -> None:
         ...
 
@@ -181,30 +1197,72 @@ class IOHandler(Protocol):
     def get_rating_info(self, date: dt.date) -> Dict[str, Any]:
         ...
 
+    def get_rating_info_of_users(
+        self, date: dt.date, user_names: List[str]
+    ) -> Dict[str, Any]:
+        """ある日の rating_info のうち user_names のユーザーの分だけを読み込む"""
+        ...
+
     def save_rating_info(self, rating_info: Dict, date: dt.date) -> None:
         ...
 
+    def save_user_history(self, rating_info: Dict, date: dt.date) -> None:
+        """ユーザーごとの参加履歴のインデックスを更新する"""
+        ...
+
+    def get_user_history(self, user_name: str) -> Dict[str, Any]:
+        ...
+
+    def flush(self) -> None:
+        """保存が全て完了するまで待つ"""
+        ...
+
+    def get_leaderboard(self, date: dt.date) -> List[Dict[str, Any]]:
+        dirname = "leaderboard"
+        date_str = date.strftime("%Y%m%d")  # like 20200101
+        filename = f"{date_str}.json"
+        return self.base_handler.load_dict(f"{dirname}/{filename}")
+
+    def save_leaderboard(
+        self, leaderboard: List[Dict[str, Any]], date: dt.date
+    ) -> None:
+        dirname = "leaderboard"
+        date_str = date.strftime("%Y%m%d")  # like 20200101
+        filename = f"{date_str}.json"
+        self.base_handler.save_dict(leaderboard, f"{dirname}/{filename}")
+        return
+
 
 class IOHandlerV1(IOHandler):
-    def __init__(self, base_handler: IOBaseHandler) -> None:
+    def __init__(
+        self,
+        base_handler: IOBaseHandler,
+        rating_info_store: Optional[RatingInfoStore] = None,
+    ) -> None:
         self.base_handler = base_handler
+        if rating_info_store is None:
+            rating_info_store = SnapshotRatingInfoStore(base_handler)
+        self.rating_info_store = rating_info_store
+        self.user_history_index = UserHistoryIndex(
+            base_handler, n_shards=USER_HISTORY_SHARDS
+        )
+        self.status_files = StatusFileIndex(
+            base_handler, "statuses", use_manifest=STATUSES_MANIFEST
+        )
 
     def get_statuses(self, date: dt.date) -> List[Tweet]:
-        dirname = "statuses"
-        date_str = date.strftime("%Y%m%d")  # like 20200101
-
         # 同じ日付のファイルが複数ある場合は統合する
-        file_list = self.base_handler.list_path(dirname)
-        target_files = [
-            f_path for f_path in file_list if f"{dirname}/{date_str}" in f_path
-        ]
-        results = []
-        for f_path in target_files:
-            statuses_dict = self.base_handler.load_dict(f_path)
-            results += statuses_dict["results"]
+        target_files = self.status_files.files_of(date)
+        statuses_dicts = self.base_handler.load_dicts(target_files)
+        results = merge_statuses_v1([statuses_dicts[f] for f in target_files])
         tweets = Tweet.from_responses_v1(results)
         return tweets
 
+    def iter_syaroho_statuses(self, date: dt.date) -> Iterator[Tweet]:
+        target_files = self.status_files.files_of(date)
+        statuses_dicts = self.base_handler.load_dicts(target_files)
+        return iter_syaroho_tweets_v1(statuses_dicts[f] for f in target_files)
+
     def save_statuses(self, statuses: JsonObj, date: dt.date) -> None:
         dirname = "statuses"
         date_str = date.strftime("%Y%m%d")  # like 20200101
@@ -214,6 +1272,7 @@ class IOHandlerV1(IOHandler):
 
         filename = f"{date_str}_1.json"
         self.base_handler.save_dict(statuses_dict, f"{dirname}/{filename}")
+        self.status_files.add(date, f"{dirname}/{filename}")
         return
 
     def get_statuses_dq(self, date: dt.date) -> List[Tweet]:
@@ -225,6 +1284,14 @@ class IOHandlerV1(IOHandler):
         tweets = Tweet.from_responses_v1(raw_statuses)
         return tweets
 
+    def iter_syaroho_statuses_dq(self, date: dt.date) -> Iterator[Tweet]:
+        dirname = "statuses_dq"
+        date_str = date.strftime("%Y%m%d")  # like 20200101
+
+        filename = f"{date_str}.json"
+        raw_statuses = self.base_handler.load_dict(f"{dirname}/{filename}")
+        return iter_syaroho_tweets_v1([{"results": raw_statuses}])
+
     def save_statuses_dq(self, statuses: JsonObj, date: dt.date) -> None:
         dirname = "statuses_dq"
         date_str = date.strftime("%Y%m%d")  # like 20200101
@@ -250,46 +1317,63 @@ class IOHandlerV1(IOHandler):
         return
 
     def get_rating_info(self, date: dt.date) -> Dict[str, Any]:
-        dirname = "rating_info"
-        date_str = date.strftime("%Y%m%d")  # like 20200101
-        filename = f"{date_str}.json"
-        rating_info = self.base_handler.load_dict(f"{dirname}/{filename}")
-        return rating_info
+        return self.rating_info_store.get(date)
+
+    def get_rating_info_of_users(
+        self, date: dt.date, user_names: List[str]
+    ) -> Dict[str, Any]:
+        return self.rating_info_store.get_users(date, user_names)
 
     def save_rating_info(self, rating_info: Dict, date: dt.date) -> None:
-        dirname = "rating_info"
-        date_str = date.strftime("%Y%m%d")  # like 20200101
-        filename = f"{date_str}.json"
-        self.base_handler.save_dict(rating_info, f"{dirname}/{filename}")
+        self.rating_info_store.save(rating_info, date)
+        return
+
+    def save_user_history(self, rating_info: Dict, date: dt.date) -> None:
+        self.user_history_index.save(rating_info, date)
+        return
+
+    def get_user_history(self, user_name: str) -> Dict[str, Any]:
+        return self.user_history_index.get(user_name)
+
+    def flush(self) -> None:
+        self.base_handler.flush()
         return
 
 
 class IOHandlerV2(IOHandler):
-    def __init__(self, base_handler: IOBaseHandler) -> None:
+    def __init__(
+        self,
+        base_handler: IOBaseHandler,
+        rating_info_store: Optional[RatingInfoStore] = None,
+    ) -> None:
         self.base_handler = base_handler
+        if rating_info_store is None:
+            rating_info_store = SnapshotRatingInfoStore(base_handler)
+        self.rating_info_store = rating_info_store
+        self.user_history_index = UserHistoryIndex(
+            base_handler, n_shards=USER_HISTORY_SHARDS
+        )
+        self.status_files = StatusFileIndex(
+            base_handler, "statuses_v2", use_manifest=STATUSES_MANIFEST
+        )
 
     def get_statuses(self, date: dt.date) -> List[Tweet]:
-        dirname = "statuses_v2"
-        date_str = date.strftime("%Y%m%d")  # like 20200101
-
         # 同じ日付のファイルが複数ある場合は統合する
-        file_list = self.base_handler.list_path(dirname)
-        target_files = [
-            f_path for f_path in file_list if f"{dirname}/{date_str}" in f_path
-        ]
-        data = []
-        users = []
-        for f_path in target_files:
-            statuses_dict = self.base_handler.load_dict(f_path)
-            data += statuses_dict["data"]
-            users += statuses_dict["includes"].get("users", [])
-        data_objs = [tweepy.Tweet(t) for t in statuses_dict["data"]]
-        users_objs = [
-            tweepy.User(u) for u in statuses_dict["includes"].get("users", [])
-        ]
-        tweets = Tweet.from_responses_v2(data_objs, users_objs)
+        target_files = self.status_files.files_of(date)
+        statuses_dicts = self.base_handler.load_dicts(target_files)
+        statuses_dict = merge_statuses_v2(
+            [statuses_dicts[f] for f in target_files]
+        )
+        tweets = Tweet.from_dicts_v2(
+            statuses_dict["data"], statuses_dict["includes"]["users"]
+        )
         return tweets
 
+    def iter_syaroho_statuses(self, date: dt.date) -> Iterator[Tweet]:
+        target_files = self.status_files.files_of(date)
+        statuses_dicts = self.base_handler.load_dicts(target_files)
+        return iter_syaroho_tweets_v2(statuses_dicts[f] for f in target_files)
+
     def save_statuses(self, all_info_dict: JsonObj, date: dt.date) -> None:
         dirname = "statuses_v2"
         date_str = date.strftime("%Y%m%d")  # like 20200101
@@ -298,6 +1382,7 @@ class IOHandlerV2(IOHandler):
 
         filename = f"{date_str}_1.json"
         self.base_handler.save_dict(all_info_dict, f"{dirname}/{filename}")
+        self.status_files.add(date, f"{dirname}/{filename}")
         return
 
     def get_statuses_dq(self, date: dt.date) -> List[Tweet]:
@@ -306,13 +1391,19 @@ class IOHandlerV2(IOHandler):
 
         filename = f"{date_str}.json"
         statuses_dict = self.base_handler.load_dict(f"{dirname}/{filename}")
-        data_objs = [tweepy.Tweet(t) for t in statuses_dict["data"]]
-        users_objs = [
-            tweepy.User(u) for u in statuses_dict["includes"].get("users", [])
-        ]
-        tweets = Tweet.from_responses_v2(data_objs, users_objs)
+        tweets = Tweet.from_dicts_v2(
+            statuses_dict["data"], statuses_dict["includes"].get("users", [])
+        )
         return tweets
 
+    def iter_syaroho_statuses_dq(self, date: dt.date) -> Iterator[Tweet]:
+        dirname = "statuses_dq_v2"
+        date_str = date.strftime("%Y%m%d")  # like 20200101
+
+        filename = f"{date_str}.json"
+        statuses_dict = self.base_handler.load_dict(f"{dirname}/{filename}")
+        return iter_syaroho_tweets_v2([statuses_dict])
+
     def save_statuses_dq(self, all_info_dict: JsonObj, date: dt.date) -> None:
         dirname = "statuses_dq_v2"
         date_str = date.strftime("%Y%m%d")  # like 20200101
@@ -327,8 +1418,7 @@ class IOHandlerV2(IOHandler):
         dirname = "member_v2"
         filename = "member.json"
         members_dict = self.base_handler.load_dict(f"{dirname}/{filename}")
-        user_objs = [tweepy.User(u) for u in members_dict["data"]]
-        return User.from_responses_v2(user_objs)
+        return User.from_dicts_v2(members_dict["data"])
 
     def save_members(self, members: JsonObj) -> None:
         dirname = "member_v2"
@@ -338,15 +1428,24 @@ class IOHandlerV2(IOHandler):
         return
 
     def get_rating_info(self, date: dt.date) -> Dict[str, Any]:
-        dirname = "rating_info"
-        date_str = date.strftime("%Y%m%d")  # like 20200101
-        filename = f"{date_str}.json"
-        rating_info = self.base_handler.load_dict(f"{dirname}/{filename}")
-        return rating_info
+        return self.rating_info_store.get(date)
+
+    def get_rating_info_of_users(
+        self, date: dt.date, user_names: List[str]
+    ) -> Dict[str, Any]:
+        return self.rating_info_store.get_users(date, user_names)
 
     def save_rating_info(self, rating_info: Dict, date: dt.date) -> None:
-        dirname = "rating_info"
-        date_str = date.strftime("%Y%m%d")  # like 20200101
-        filename = f"{date_str}.json"
-        self.base_handler.save_dict(rating_info, f"{dirname}/{filename}")
+        self.rating_info_store.save(rating_info, date)
+        return
+
+    def save_user_history(self, rating_info: Dict, date: dt.date) -> None:
+        self.user_history_index.save(rating_info, date)
+        return
+
+    def get_user_history(self, user_name: str) -> Dict[str, Any]:
+        return self.user_history_index.get(user_name)
+
+    def flush(self) -> None:
+        self.base_handler.flush()
         return
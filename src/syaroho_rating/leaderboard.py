@@ -0,0 +1,81 @@
+import datetime as dt
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+
+from syaroho_rating.io_handler import IOHandler
+
+COLUMNS = ["User", "Rating", "Match", "Win", "Best"]
+
+
+def build_leaderboard(rating_infos: Dict) -> List[Dict[str, Any]]:
+    """rating_info からレーティング順のランキングを作る
+
+    順位は summarize_rating_info と同じく、同じレーティングは同順位になる。
+    """
+    rows = sorted(
+        (
+            {
+                "User": name,
+                "Rating": info["rate"],
+                "Match": info["attend"],
+                "Win": info["win"],
+                "Best": info["best_time"],
+            }
+            for name, info in rating_infos.items()
+        ),
+        key=lambda row: (-row["Rating"], row["User"]),
+    )
+    for i, row in enumerate(rows):
+        if i > 0 and row["Rating"] == rows[i - 1]["Rating"]:
+            row["Rank"] = rows[i - 1]["Rank"]
+        else:
+            row["Rank"] = i + 1
+    return rows
+
+
+def leaderboard_to_df(rows: List[Dict[str, Any]]) -> pd.DataFrame:
+    """summarize_rating_info と同じ形式の DataFrame に変換する"""
+    df = pd.DataFrame(rows, columns=["Rank"] + COLUMNS)
+    return df.set_index("Rank")
+
+
+class LeaderboardIndex(object):
+    """日付ごとに保存したランキングから過去のある日時点の順位を引く
+
+    ランキングが保存されていない日は rating_info から作る。作ったランキングは
+    save_missing が True の場合のみ保存する。
+    """
+
+    def __init__(self, io_handler: IOHandler, save_missing: bool = False):
+        self.io = io_handler
+        self.save_missing = save_missing
+        self._rows: Dict[dt.date, List[Dict[str, Any]]] = {}
+        self._positions: Dict[dt.date, Dict[str, int]] = {}
+
+    def _load(self, date: dt.date) -> List[Dict[str, Any]]:
+        key = dt.date(date.year, date.month, date.day)
+        if key not in self._rows:
+            try:
+                rows = self.io.get_leaderboard(date)
+            except FileNotFoundError:
+                rows = build_leaderboard(self.io.get_rating_info(date))
+                if self.save_missing:
+                    self.io.save_leaderboard(rows, date)
+            self._rows[key] = rows
+            self._positions[key] = {r["User"]: i for i, r in enumerate(rows)}
+        return self._rows[key]
+
+    def as_of(self, date: dt.date) -> pd.DataFrame:
+        return leaderboard_to_df(self._load(date))
+
+    def top_k(self, date: dt.date, k: int) -> pd.DataFrame:
+        return leaderboard_to_df(self._load(date)[:k])
+
+    def rank_of(self, date: dt.date, user_name: str) -> Optional[int]:
+        rows = self._load(date)
+        key = dt.date(date.year, date.month, date.day)
+        pos = self._positions[key].get(user_name)
+        if pos is None:
+            return None
+        return rows[pos]["Rank"]
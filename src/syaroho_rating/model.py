@@ -1,21 +1,33 @@
+import sys
 from dataclasses import dataclass
-from datetime import datetime
-from typing import Any, Dict, Iterable, List
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Optional, Union
 
+import pendulum
 import tweepy
 
-from syaroho_rating.utils import clean_html_tag, tweetid_to_datetime
+from syaroho_rating.utils import clean_html_tag, ms_to_datetime, tweetid_to_ms
 
 
 @dataclass(frozen=True)
 class User:
-    id: str
+    """Twitter のユーザー
+
+    1 日に数千件のツイートを扱うため __slots__ を使い、同じユーザーの
+    username は sys.intern で 1 つの文字列を共有する。
+    """
+
+    __slots__ = ("id", "name", "username", "protected")
+
+    id: Union[int, str]
     name: str
     """the name defined in user profile"""
     username: str
     """the name followed after @"""
     protected: bool
 
+    def __post_init__(self) -> None:
+        object.__setattr__(self, "username", sys.intern(self.username))
+
     @staticmethod
     def from_responses_v1(
         raw_response: Iterable[Dict[str, Any]]
@@ -39,14 +51,73 @@ class User:
             for u in users
         ]
 
+    @staticmethod
+    def from_dict_v2(user: Dict[str, Any]) -> "User":
+        """保存した v2 のユーザーの dict から直接作る (tweepy.User と同じ値になる)"""
+        return User(
+            id=int(user["id"]),
+            name=user["name"],
+            username=user["username"],
+            protected=user.get("protected"),
+        )
 
-@dataclass(frozen=True)
+    @staticmethod
+    def from_dicts_v2(users: Iterable[Dict[str, Any]]) -> List["User"]:
+        return [User.from_dict_v2(u) for u in users]
+
+
+@dataclass(frozen=True, init=False)
 class Tweet:
+    """ツイート
+
+    投稿時刻は id から求めた UNIX 時間のミリ秒 (timestamp_ms) で持ち、
+    pendulum.DateTime (created_at_ms) は参照された時に作る。
+    引数は全てキーワードで渡す。
+    """
+
+    __slots__ = (
+        "text",
+        "source",
+        "id",
+        "author",
+        "timestamp_ms",
+        "_created_at",
+    )
+
     text: str
     source: str
-    created_at_ms: datetime
-    id: str
+    id: Union[int, str]
     author: User
+    timestamp_ms: int
+    if TYPE_CHECKING:
+        # フィールドにはせず、比較や repr の対象にしない
+        _created_at: Optional[pendulum.DateTime]
+
+    def __init__(
+        self,
+        *,
+        text: str,
+        source: str,
+        id: Union[int, str],
+        author: User,
+        timestamp_ms: Optional[int] = None,
+    ) -> None:
+        if timestamp_ms is None:
+            timestamp_ms = tweetid_to_ms(id)
+        object.__setattr__(self, "text", text)
+        object.__setattr__(self, "source", source)
+        object.__setattr__(self, "id", id)
+        object.__setattr__(self, "author", author)
+        object.__setattr__(self, "timestamp_ms", timestamp_ms)
+        object.__setattr__(self, "_created_at", None)
+
+    @property
+    def created_at_ms(self) -> pendulum.DateTime:
+        """投稿日時 (Asia/Tokyo)"""
+        if self._created_at is None:
+            created_at = ms_to_datetime(self.timestamp_ms)
+            object.__setattr__(self, "_created_at", created_at)
+        return self._created_at
 
     @staticmethod
     def from_responses_v1(
@@ -57,7 +128,6 @@ class Tweet:
                 text=t["text"],
                 # s["source"] is like "<a href="url_to_client">client_name</a>"
                 source=clean_html_tag(t["source"]),
-                created_at_ms=tweetid_to_datetime(t["id"]),
                 id=t["id"],
                 author=User(
                     id=t["user"]["id"],
@@ -80,9 +150,33 @@ class Tweet:
             Tweet(
                 text=t.text,
                 source=t.source,
-                created_at_ms=tweetid_to_datetime(t.id),
                 id=t.id,
                 author=users_dict[t.author_id],
             )
             for t in tweets
         ]
+
+    @staticmethod
+    def from_dict_v2(tweet: Dict[str, Any], author: User) -> "Tweet":
+        """保存した v2 のツイートの dict から直接作る (tweepy.Tweet と同じ値になる)"""
+        return Tweet(
+            text=tweet["text"],
+            source=tweet.get("source"),
+            id=int(tweet["id"]),
+            author=author,
+        )
+
+    @staticmethod
+    def from_dicts_v2(
+        tweets: Iterable[Dict[str, Any]], users: Iterable[Dict[str, Any]]
+    ) -> List["Tweet"]:
+        """from_responses_v2 と同じ結果を tweepy のオブジェクトを作らずに返す
+
+        tweepy.Tweet や tweepy.User は日時や entities なども全て変換するため、
+        保存したファイルを読み込む時はこちらを使う。
+        """
+        users_dict = {int(u["id"]): User.from_dict_v2(u) for u in users}
+        return [
+            Tweet.from_dict_v2(t, users_dict[int(t["author_id"])])
+            for t in tweets
+        ]
@@ -0,0 +1,73 @@
+import heapq
+from typing import Any, Dict, Iterable, List, Set, Tuple
+
+import numpy as np
+import pendulum
+
+from syaroho_rating.model import Tweet
+from syaroho_rating.tweet_batch import TweetBatch, calc_scores, format_times
+
+# (スコア, -受け取った順番, 投稿時刻のミリ秒, ユーザー名)
+Entry = Tuple[float, int, int, str]
+
+
+class PreResult(object):
+    """速報の上位 k 件を保持する
+
+    ツイートはページごとなど少しずつ add に渡す。スコアの低いものから
+    取り除く大きさ k のヒープだけを持ち、全員を並べ替えることはしない。
+    同じスコアの場合は先に受け取ったものを上位にする。
+    同じ id のツイートは 1 度だけ数える。
+    participants には "しゃろほー" を投稿したユーザー名を集める。
+    """
+
+    def __init__(self, date: pendulum.DateTime, k: int = 5) -> None:
+        self.date = date
+        self.k = k
+        self._heap: List[Entry] = []
+        self._seen_ids: Set[int] = set()
+        self.participants: Set[str] = set()
+        self._n_added = 0
+
+    def add(self, tweets: Iterable[Tweet]) -> None:
+        batch = TweetBatch.from_tweets(tweets)
+        scores = calc_scores(batch.offsets_ms(self.date))
+        for i in np.flatnonzero(batch.valid).tolist():
+            tweet_id = int(batch.ids[i])
+            if tweet_id in self._seen_ids:
+                continue
+            self._seen_ids.add(tweet_id)
+            self._n_added += 1
+            username = batch.username_of(i)
+            self.participants.add(username)
+            entry = (
+                float(scores[i]),
+                -self._n_added,
+                int(batch.posted_ms[i]),
+                username,
+            )
+            if len(self._heap) < self.k:
+                heapq.heappush(self._heap, entry)
+            elif entry > self._heap[0]:
+                heapq.heapreplace(self._heap, entry)
+        return
+
+    def __len__(self) -> int:
+        """これまでに受け取った "しゃろほー" のツイートの数"""
+        return self._n_added
+
+    def top(self) -> List[Dict[str, Any]]:
+        """スコアの高い順の上位 k 件 (time は投稿時刻の SS.fff)"""
+        entries = sorted(self._heap, reverse=True)
+        times = format_times(
+            np.array([e[2] for e in entries], dtype=np.int64), self.date
+        )
+        return [
+            {
+                "screen_name": username,
+                # HH:MM:SS.fff の秒以下
+                "time": time[-6:],
+                "score": score,
+            }
+            for (score, _, _, username), time in zip(entries, times)
+        ]
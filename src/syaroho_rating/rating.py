@@ -1,13 +1,182 @@
-import copy
 import math
-from typing import Dict, List, Tuple
+from typing import Any, Dict, List, Tuple
 
 import numpy as np
 import pandas as pd
 import pendulum
 
 from syaroho_rating.model import Tweet
-from syaroho_rating.utils import clean_html_tag, timedelta_to_ms
+from syaroho_rating.tweet_batch import TweetBatch, calc_scores
+
+# 過去のパフォーマンスの重みの減衰率 (直近が 0.9, その前が 0.9^2, ...)
+DECAY = 0.9
+ACCUMULATOR_KEYS = ("inner_rate_numer", "aperf_numer", "decay_denom")
+# rating_info のうち参加するごとに追加されていく履歴
+HISTORY_KEYS = ("attend_date", "record", "standing", "perf", "rate_hist")
+
+
+def init_accumulators() -> Dict[str, float]:
+    return {key: 0.0 for key in ACCUMULATOR_KEYS}
+
+
+def has_accumulators(user_info: Dict[str, Any]) -> bool:
+    return all(key in user_info for key in ACCUMULATOR_KEYS)
+
+
+def update_accumulators(user_info: Dict[str, Any], perf: int) -> None:
+    """新しいパフォーマンスを inner_rate と aperf の加重和に加える
+
+    既存の項の重みを 0.9 倍して新しい項を重み 0.9 で足すので、
+    全履歴を 0.9^j で重み付けし直すのと同じ値になる。
+    """
+    user_info["inner_rate_numer"] = DECAY * (
+        user_info["inner_rate_numer"] + 2.0 ** (perf / 800.0)
+    )
+    user_info["aperf_numer"] = DECAY * (user_info["aperf_numer"] + perf)
+    user_info["decay_denom"] = DECAY * (user_info["decay_denom"] + 1.0)
+    return
+
+
+def derive_accumulators(perf_hist: List[int]) -> Dict[str, float]:
+    """パフォーマンスの履歴から加重和を計算する"""
+    accumulators: Dict[str, Any] = init_accumulators()
+    for perf in perf_hist:
+        update_accumulators(accumulators, perf)
+    return accumulators
+
+
+def calc_rate(inner_rate: float, attend: int) -> float:
+    """参加回数による初心者補正をした rate (丸める前の値)"""
+    penalty = (
+        1200.0
+        * (((1.0 - 0.81**attend) ** 0.5) / (1.0 - 0.9**attend) - 1.0)
+        / (19.0**0.5 - 1.0)
+    )
+    new_rate = inner_rate - penalty
+    new_rate = (
+        (400.0) / (math.exp((400.0 - new_rate) / 400.0))
+        if new_rate <= 400
+        else new_rate
+    )
+    return new_rate
+
+
+def migrate_accumulators(rating_infos: Dict) -> List[str]:
+    """加重和を持たない rating_info に履歴から計算した加重和を追加する
+
+    加重和から計算した inner_rate と rate が保存済みの値と一致しなかった
+    ユーザー名のリストを返す。
+    """
+    mismatched = []
+    for name, user_info in rating_infos.items():
+        user_info.update(derive_accumulators(user_info["perf"]))
+        if len(user_info["perf"]) == 0:
+            continue
+        inner_rate = 800.0 * math.log2(
+            user_info["inner_rate_numer"] / user_info["decay_denom"]
+        )
+        rate = calc_rate(inner_rate, len(user_info["perf"]))
+        if int(inner_rate + 0.5) != user_info["inner_rate"] or (
+            int(rate + 0.5) != user_info["rate"]
+        ):
+            mismatched.append(name)
+    return mismatched
+
+
+def calc_ranks(scores: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """スコアの降順で順位を付ける
+
+    自分より高いスコアの人数を数える通常の順位 (同点は同順位) と、
+    同点の人数の半分を加えたパフォーマンス計算用の順位を返す。
+    """
+    n = len(scores)
+    sorted_scores = np.sort(scores)
+    left = np.searchsorted(sorted_scores, scores, side="left")
+    right = np.searchsorted(sorted_scores, scores, side="right")
+    n_greater = n - right
+    n_equal = right - left  # 自分自身を含む
+    ranks_normal = 1 + n_greater
+    ranks = 0.5 + n_greater + 0.5 * n_equal
+    return ranks_normal, ranks
+
+
+def _rank_est_exact(x_mid: float, aperfs: List[float]) -> float:
+    rank_est = 0.0
+    for aperf in aperfs:
+        rank_est += 1.0 / (1.0 + 6.0 ** ((x_mid - aperf) / 400.0))
+    return rank_est
+
+
+def calc_perf_reference(
+    aperfs: List[float], ranks: List[float], exag: float
+) -> List[int]:
+    """参加者ごとに二分探索でパフォーマンスを求める (参照実装)"""
+    perfs = []
+    for i in range(len(aperfs)):
+        x_max = 10000.0
+        x_min = -10000.0
+        x_mid = (x_max + x_min) / 2.0
+        x_delta = x_max - x_min
+
+        # 二分探査
+        while x_delta >= 0.01:
+            rank_est = _rank_est_exact(x_mid, aperfs)
+
+            # 期待順位と実際の順位との比較
+            if rank_est >= ranks[i] - 0.5:
+                x_min = x_mid
+            else:
+                x_max = x_mid
+
+            x_delta = x_max - x_min
+            x_mid = (x_max + x_min) / 2.0
+
+        perfs.append(int((x_mid - 1600.0) * exag + 1600.0 + 0.5))
+    return perfs
+
+
+def calc_perf(
+    aperfs: np.ndarray, ranks: np.ndarray, exag: float, chunk_size: int = 512
+) -> np.ndarray:
+    """全参加者のパフォーマンスを一括の二分探索で求める
+
+    calc_perf_reference と同じ整数値を返す。numpy の累乗は Python の ``**``
+    と最下位ビットが異なることがあるため、期待順位がしきい値に近く比較結果が
+    変わりうる参加者だけ参照実装と同じ計算で判定し直す。
+    """
+    n = len(aperfs)
+    x_max = np.full(n, 10000.0)
+    x_min = np.full(n, -10000.0)
+    x_mid = (x_max + x_min) / 2.0
+    x_delta = x_max - x_min
+    threshold = ranks - 0.5
+    # 期待順位の丸め誤差の上限 (n 項の総和の誤差評価に余裕を持たせたもの)
+    tolerance = 4.0 * np.finfo(np.float64).eps * max(n, 1) ** 2
+    aperf_list = aperfs.tolist()
+
+    # 二分探査 (全員同じ回数だけ反復する)
+    while np.any(x_delta >= 0.01):
+        active = x_delta >= 0.01
+        rank_est = np.empty(n)
+        for c in range(0, n, chunk_size):
+            diff = x_mid[c : c + chunk_size, None] - aperfs[None, :]
+            with np.errstate(over="ignore"):
+                terms = 1.0 / (1.0 + 6.0 ** (diff / 400.0))
+            rank_est[c : c + chunk_size] = np.sum(terms, axis=1)
+
+        # 丸め誤差で比較結果が変わりうるものは厳密に計算し直す
+        for i in np.flatnonzero(np.abs(rank_est - threshold) <= tolerance):
+            rank_est[i] = _rank_est_exact(float(x_mid[i]), aperf_list)
+
+        # 期待順位と実際の順位との比較
+        go_up = rank_est >= threshold
+        x_min = np.where(active & go_up, x_mid, x_min)
+        x_max = np.where(active & ~go_up, x_mid, x_max)
+
+        x_delta = x_max - x_min
+        x_mid = (x_max + x_min) / 2.0
+
+    return ((x_mid - 1600.0) * exag + 1600.0 + 0.5).astype(np.int64)
 
 
 def calc_rating_for_date(
@@ -19,148 +188,94 @@ def calc_rating_for_date(
 ) -> Tuple[List, Dict]:
     # ある日の参加者リストの作成
     daily_infos = []
-    player_list = []
-
-    ymd = date.strftime("%Y%m%d")
-
-    for s in statuses:
-        user_name = s.author.username
-        if s.text == "しゃろほー":
-            rawtime = s.created_at_ms
-            time = rawtime.strftime("%H:%M:%S.%f")[:-3]
-
-            record = timedelta_to_ms(rawtime - date)
-            bouns = 1000 if record >= 0 else 0
-            score = bouns - abs(record)
-            daily_infos.append(
-                {
-                    "screen_name": ("" + user_name),
-                    "rank_normal": 1,
-                    "rank": 0.5,
-                    "perf": -1,
-                    "time": time,
-                    "score": score,
-                    "id": s.id,
-                }
-            )
-            player_list.append(user_name)
-
-            if not user_name in rating_infos:
-                rating_infos[user_name] = {
-                    "best_time": "None",
-                    "best_score": -1000000,
-                    "highest": 0,
-                    "rate": 0,
-                    "inner_rate": 1600,
-                    "attend": 0,
-                    "win": 0,
-                    "attend_date": [],
-                    "record": [],
-                    "standing": [],
-                    "perf": [],
-                    "rate_hist": [],
-                }
-
-            # ベストスコア、ベストタイムの更新
-            if score >= rating_infos[user_name]["best_score"]:
-                rating_infos[user_name]["best_score"] = score
-                rating_infos[user_name]["best_time"] = time
+    player_list = set()
+
+    def add_participant(
+        batch: TweetBatch, i: int, time: str, score: float
+    ) -> None:
+        user_name = batch.username_of(i)
+        daily_infos.append(
+            {
+                "screen_name": ("" + user_name),
+                "rank_normal": 1,
+                "rank": 0.5,
+                "perf": -1,
+                "time": time,
+                "score": score,
+                "id": int(batch.ids[i]),
+            }
+        )
+        player_list.add(user_name)
+
+        if not user_name in rating_infos:
+            rating_infos[user_name] = {
+                "best_time": "None",
+                "best_score": -1000000,
+                "highest": 0,
+                "rate": 0,
+                "inner_rate": 1600,
+                "attend": 0,
+                "win": 0,
+                "attend_date": [],
+                "record": [],
+                "standing": [],
+                "perf": [],
+                "rate_hist": [],
+                **init_accumulators(),
+            }
+
+        # ベストスコア、ベストタイムの更新
+        if score >= rating_infos[user_name]["best_score"]:
+            rating_infos[user_name]["best_score"] = score
+            rating_infos[user_name]["best_time"] = time
+
+    # 記録とスコアはまとめて計算し、時刻の文字列は参加者の分だけ作る
+    batch = TweetBatch.from_tweets(statuses)
+    scores = calc_scores(batch.offsets_ms(date))
+    rows = np.flatnonzero(batch.valid)
+    for i, time in zip(rows.tolist(), batch.format_times(rows, date)):
+        add_participant(batch, i, time, float(scores[i]))
 
     # ツイ消しを見た場合
-    for s in dq_statuses:
-        user_name = s.author.username
-        if s.text == "しゃろほー":
-            rawtime = s.created_at_ms
-            time = rawtime.strftime("%H:%M:%S.%f")[:-3]
-
-            record = timedelta_to_ms(rawtime - date)
-
-            if (not (user_name in player_list)) and (abs(record) <= 60000):
-                player_list.append(user_name)
-                bouns = 1000 if record >= 0 else 0
-                score = bouns - abs(record)
-                daily_infos.append(
-                    {
-                        "screen_name": ("" + user_name),
-                        "rank_normal": 1,
-                        "rank": 0.5,
-                        "perf": -1,
-                        "time": time,
-                        "score": score,
-                        "id": s.id,
-                    }
-                )
-
-                if not user_name in rating_infos:
-                    rating_infos[user_name] = {
-                        "best_time": "None",
-                        "best_score": -1000000,
-                        "highest": 0,
-                        "rate": 0,
-                        "inner_rate": 1600,
-                        "attend": 0,
-                        "win": 0,
-                        "attend_date": [],
-                        "record": [],
-                        "standing": [],
-                        "perf": [],
-                        "rate_hist": [],
-                    }
-
-                # ベストスコア、ベストタイムの更新
-                if score >= rating_infos[user_name]["best_score"]:
-                    rating_infos[user_name]["best_score"] = score
-                    rating_infos[user_name]["best_time"] = time
+    dq_batch = TweetBatch.from_tweets(dq_statuses)
+    dq_offsets = dq_batch.offsets_ms(date)
+    dq_scores = calc_scores(dq_offsets)
+    rows = np.flatnonzero(dq_batch.valid & (np.abs(dq_offsets) <= 60000))
+    for i, time in zip(rows.tolist(), dq_batch.format_times(rows, date)):
+        if not (dq_batch.username_of(i) in player_list):
+            add_participant(dq_batch, i, time, float(dq_scores[i]))
 
     for i in range(len(daily_infos)):
         # inner_rateの読み込み
         daily_infos[i]["inner_rate"] = rating_infos[
             daily_infos[i]["screen_name"]
         ]["inner_rate"]
-        attend_time = len(rating_infos[daily_infos[i]["screen_name"]]["perf"])
-        if attend_time == 0:
+        user_info = rating_infos[daily_infos[i]["screen_name"]]
+        if not has_accumulators(user_info):
+            user_info.update(derive_accumulators(user_info["perf"]))
+        if len(user_info["perf"]) == 0:
             daily_infos[i]["aperf"] = 1600
         else:
-            weight = np.ones(attend_time) * 0.9
-            weight = weight ** np.arange(attend_time, 0, -1)
-            perf_hist = np.array(
-                rating_infos[daily_infos[i]["screen_name"]]["perf"]
+            daily_infos[i]["aperf"] = (
+                user_info["aperf_numer"] / user_info["decay_denom"]
             )
-            daily_infos[i]["aperf"] = perf_hist @ weight / sum(weight)
 
-        # 順位付け
-        for j in range(len(daily_infos)):
-            if daily_infos[i]["score"] < daily_infos[j]["score"]:
-                daily_infos[i]["rank"] += 1.0
-                daily_infos[i]["rank_normal"] += 1
-            elif daily_infos[i]["score"] == daily_infos[j]["score"]:
-                daily_infos[i]["rank"] += 0.5
+    # 順位付け
+    ranks_normal, ranks = calc_ranks(
+        np.array([d["score"] for d in daily_infos], dtype=np.float64)
+    )
+    for i in range(len(daily_infos)):
+        daily_infos[i]["rank_normal"] = int(ranks_normal[i])
+        daily_infos[i]["rank"] = float(ranks[i])
 
     # パフォーマンスの計算
+    perfs = calc_perf(
+        np.array([d["aperf"] for d in daily_infos], dtype=np.float64),
+        np.array([d["rank"] for d in daily_infos], dtype=np.float64),
+        exag,
+    )
     for i in range(len(daily_infos)):
-        x_max = 10000.0
-        x_min = -10000.0
-        x_mid = (x_max + x_min) / 2.0
-        x_delta = x_max - x_min
-
-        # 二分探査
-        while x_delta >= 0.01:
-            rank_est = 0
-            for j in range(len(daily_infos)):
-                rank_est += 1.0 / (
-                    1.0 + 6.0 ** ((x_mid - daily_infos[j]["aperf"]) / 400.0)
-                )
-
-            # 期待順位と実際の順位との比較
-            if rank_est >= daily_infos[i]["rank"] - 0.5:
-                x_min = x_mid
-            else:
-                x_max = x_mid
-
-            x_delta = x_max - x_min
-            x_mid = (x_max + x_min) / 2.0
-
-        daily_infos[i]["perf"] = int((x_mid - 1600.0) * exag + 1600.0 + 0.5)
+        daily_infos[i]["perf"] = int(perfs[i])
 
         # 優勝回数の更新
         if daily_infos[i]["rank_normal"] == 1:
@@ -181,21 +296,17 @@ def calc_rating_for_date(
         rating_infos[daily_infos[i]["screen_name"]]["perf"].append(
             daily_infos[i]["perf"]
         )
+        update_accumulators(
+            rating_infos[daily_infos[i]["screen_name"]], int(perfs[i])
+        )
         rating_infos[daily_infos[i]["screen_name"]]["attend"] += 1
 
     for i in range(len(daily_infos)):
         # inner_rateを更新
-        perf_lists = copy.deepcopy(
-            rating_infos[daily_infos[i]["screen_name"]]["perf"]
+        user_info = rating_infos[daily_infos[i]["screen_name"]]
+        new_inner_rate = 800.0 * math.log2(
+            user_info["inner_rate_numer"] / user_info["decay_denom"]
         )
-        numer = 0.0
-        denom = 0.0
-
-        for p, j in zip(perf_lists[::-1], range(1, len(perf_lists) + 1)):
-            numer += 2.0 ** (p / 800.0) * 0.9**j
-            denom += 0.9**j
-
-        new_inner_rate = 800.0 * math.log2(numer / denom)
         rating_infos[daily_infos[i]["screen_name"]]["inner_rate"] = int(
             new_inner_rate + 0.5
         )
@@ -204,18 +315,7 @@ def calc_rating_for_date(
         daily_infos[i]["new_inner_rate"] = int(new_inner_rate + 0.5)
 
         # 参加回数＋初心者補正したrateを更新
-        att = len(perf_lists)
-        penalty = (
-            1200.0
-            * (((1.0 - 0.81**att) ** 0.5) / (1.0 - 0.9**att) - 1.0)
-            / (19.0**0.5 - 1.0)
-        )
-        new_rate = new_inner_rate - penalty
-        new_rate = (
-            (400.0) / (math.exp((400.0 - new_rate) / 400.0))
-            if new_rate <= 400
-            else new_rate
-        )
+        new_rate = calc_rate(new_inner_rate, len(user_info["perf"]))
 
         # リストのrateを更新
         delta = (
@@ -0,0 +1,342 @@
+import re
+from typing import Any, Dict, Iterable, List, Sequence
+
+import numpy as np
+
+from syaroho_rating.rating import ACCUMULATOR_KEYS, HISTORY_KEYS
+
+SCALAR_INT_KEYS = ("highest", "rate", "inner_rate", "attend", "win")
+KNOWN_KEYS = (
+    ("best_time", "best_score")
+    + SCALAR_INT_KEYS
+    + HISTORY_KEYS
+    + ACCUMULATOR_KEYS
+)
+
+DATE_PATTERN = re.compile(r"^(\d{4})/(\d{2})/(\d{2})$")
+RECORD_PATTERN = re.compile(r"^(\d{2}):(\d{2}):(\d{2})\.(\d{3})$")
+
+
+def _date_to_int(date_str: str) -> int:
+    """YYYY/MM/DD 形式の日付を YYYYMMDD の整数に変換する"""
+    m = DATE_PATTERN.match(date_str)
+    if m is None:
+        raise ValueError(f"Unexpected attend_date format: {date_str}")
+    return int(m.group(1) + m.group(2) + m.group(3))
+
+
+def _int_to_date(value: int) -> str:
+    return f"{value // 10000:04d}/{value // 100 % 100:02d}/{value % 100:02d}"
+
+
+def _record_to_ms(record: str) -> int:
+    """HH:MM:SS.fff 形式の記録を 0時からのミリ秒に変換する"""
+    m = RECORD_PATTERN.match(record)
+    if m is None:
+        raise ValueError(f"Unexpected record format: {record}")
+    h, mi, s, ms = (int(g) for g in m.groups())
+    return ((h * 60 + mi) * 60 + s) * 1000 + ms
+
+
+def _ms_to_record(value: int) -> str:
+    s, ms = divmod(value, 1000)
+    mi, s = divmod(s, 60)
+    h, mi = divmod(mi, 60)
+    return f"{h:02d}:{mi:02d}:{s:02d}.{ms:03d}"
+
+
+class AppendOnlyArray(object):
+    """容量を倍々に確保して末尾に追加していく 1 次元配列"""
+
+    def __init__(self, dtype: Any, capacity: int = 1024):
+        self._data = np.empty(max(capacity, 1), dtype=dtype)
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def values(self) -> np.ndarray:
+        return self._data[: self._size]
+
+    def extend(self, values: Iterable[Any]) -> None:
+        arr = np.asarray(values, dtype=self._data.dtype)
+        new_size = self._size + len(arr)
+        if new_size > len(self._data):
+            capacity = len(self._data)
+            while capacity < new_size:
+                capacity *= 2
+            data = np.empty(capacity, dtype=self._data.dtype)
+            data[: self._size] = self.values
+            self._data = data
+        self._data[self._size : new_size] = arr
+        self._size = new_size
+        return
+
+
+class RatingState(object):
+    """rating_info を列ごとの numpy 配列で保持する
+
+    スカラー値はユーザーごとの列 (index はユーザー名から引く)、
+    参加履歴は全ユーザー分を追記順に並べた配列で持つ。
+    to_dict / from_dict で従来の rating_info の dict と相互に変換できる。
+    subset / merge で一部のユーザーだけを dict にして更新し、書き戻せる。
+    """
+
+    def __init__(self) -> None:
+        self.names: List[str] = []
+        self.index: Dict[str, int] = {}
+
+        self.rate = np.zeros(0, dtype=np.int64)
+        self.inner_rate = np.zeros(0, dtype=np.int64)
+        self.highest = np.zeros(0, dtype=np.int64)
+        self.attend = np.zeros(0, dtype=np.int64)
+        self.win = np.zeros(0, dtype=np.int64)
+        self.best_score = np.zeros(0, dtype=np.float64)
+        self.best_time: List[str] = []
+        self.inner_rate_numer = np.zeros(0, dtype=np.float64)
+        self.aperf_numer = np.zeros(0, dtype=np.float64)
+        self.decay_denom = np.zeros(0, dtype=np.float64)
+
+        # 元の dict を復元するための情報
+        self._best_score_is_int = np.zeros(0, dtype=bool)
+        self._has_accumulators = np.zeros(0, dtype=bool)
+        self._extras: List[Dict[str, Any]] = []
+
+        # 参加履歴 (1 行が 1 回の参加)
+        self.hist_user = AppendOnlyArray(np.int32)
+        self.hist_date = AppendOnlyArray(np.int32)  # YYYYMMDD
+        self.hist_record = AppendOnlyArray(np.int32)  # 0時からのミリ秒
+        self.hist_standing = AppendOnlyArray(np.int32)
+        self.hist_perf = AppendOnlyArray(np.int32)
+        self.hist_rate = AppendOnlyArray(np.int32)
+        # ユーザーごとの履歴の数
+        self.hist_count = np.zeros(0, dtype=np.int64)
+        # 先頭の _sorted_size 行をユーザー順・追記順に並べた index
+        self._sorted_order = np.zeros(0, dtype=np.int64)
+        self._sorted_users = np.zeros(0, dtype=np.int32)
+        self._sorted_size = 0
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __contains__(self, name: object) -> bool:
+        return name in self.index
+
+    def add_users(self, names: Sequence[str]) -> np.ndarray:
+        """未登録のユーザーを初期値で追加し、全員の index を返す"""
+        new_names = []
+        for name in names:
+            if name not in self.index and name not in new_names:
+                new_names.append(name)
+        n_new = len(new_names)
+        if n_new:
+            for name in new_names:
+                self.index[name] = len(self.names)
+                self.names.append(name)
+                self.best_time.append("None")
+                self._extras.append({})
+            self.rate = np.append(self.rate, np.zeros(n_new, np.int64))
+            self.inner_rate = np.append(
+                self.inner_rate, np.full(n_new, 1600, np.int64)
+            )
+            self.highest = np.append(self.highest, np.zeros(n_new, np.int64))
+            self.attend = np.append(self.attend, np.zeros(n_new, np.int64))
+            self.win = np.append(self.win, np.zeros(n_new, np.int64))
+            self.best_score = np.append(
+                self.best_score, np.full(n_new, -1000000.0)
+            )
+            self.inner_rate_numer = np.append(
+                self.inner_rate_numer, np.zeros(n_new)
+            )
+            self.aperf_numer = np.append(self.aperf_numer, np.zeros(n_new))
+            self.decay_denom = np.append(self.decay_denom, np.zeros(n_new))
+            self._best_score_is_int = np.append(
+                self._best_score_is_int, np.ones(n_new, dtype=bool)
+            )
+            self._has_accumulators = np.append(
+                self._has_accumulators, np.ones(n_new, dtype=bool)
+            )
+            self.hist_count = np.append(
+                self.hist_count, np.zeros(n_new, np.int64)
+            )
+        return np.array([self.index[name] for name in names], dtype=np.int64)
+
+    def append_results(
+        self,
+        users: np.ndarray,
+        date_str: str,
+        records: Sequence[str],
+        standings: Sequence[int],
+        perfs: Sequence[int],
+        rates: Sequence[int],
+    ) -> None:
+        """ある日の参加者の履歴をまとめて追加する"""
+        self._extend_history(
+            users,
+            np.full(len(users), _date_to_int(date_str)),
+            [_record_to_ms(r) for r in records],
+            standings,
+            perfs,
+            rates,
+        )
+        return
+
+    def _extend_history(
+        self,
+        users: Iterable[int],
+        dates: Iterable[int],
+        records: Iterable[int],
+        standings: Iterable[int],
+        perfs: Iterable[int],
+        rates: Iterable[int],
+    ) -> None:
+        self.hist_user.extend(users)
+        self.hist_date.extend(dates)
+        self.hist_record.extend(records)
+        self.hist_standing.extend(standings)
+        self.hist_perf.extend(perfs)
+        self.hist_rate.extend(rates)
+        np.add.at(self.hist_count, np.asarray(users, dtype=np.int64), 1)
+        return
+
+    def _sort_history(self, force: bool = False) -> None:
+        """ユーザーごとに履歴を引くための index を作り直す
+
+        追記された行が少ないうちは作り直さず、user_rows で末尾を探す。
+        """
+        n_tail = len(self.hist_user) - self._sorted_size
+        if n_tail == 0 or (
+            not force and n_tail < max(1024, self._sorted_size // 8)
+        ):
+            return
+        users = self.hist_user.values
+        self._sorted_order = np.argsort(users, kind="stable")
+        self._sorted_users = users[self._sorted_order]
+        self._sorted_size = len(users)
+        return
+
+    def user_rows(self, idx: int) -> np.ndarray:
+        """idx 番目のユーザーの履歴の行 (追記順)"""
+        self._sort_history()
+        lo, hi = np.searchsorted(self._sorted_users, [idx, idx + 1])
+        tail = self.hist_user.values[self._sorted_size :]
+        tail_rows = np.flatnonzero(tail == idx) + self._sorted_size
+        return np.concatenate([self._sorted_order[lo:hi], tail_rows])
+
+    def user_history(self, name: str) -> Dict[str, List[Any]]:
+        """1 ユーザー分の参加履歴を rating_info と同じ形式で返す"""
+        return self._history_dict(self.user_rows(self.index[name]))
+
+    def _history_dict(self, rows: np.ndarray) -> Dict[str, List[Any]]:
+        return {
+            "attend_date": [
+                _int_to_date(d) for d in self.hist_date.values[rows].tolist()
+            ],
+            "record": [
+                _ms_to_record(r) for r in self.hist_record.values[rows].tolist()
+            ],
+            "standing": self.hist_standing.values[rows].tolist(),
+            "perf": self.hist_perf.values[rows].tolist(),
+            "rate_hist": self.hist_rate.values[rows].tolist(),
+        }
+
+    def _user_dict(self, i: int, rows: np.ndarray) -> Dict[str, Any]:
+        best_score: Any = float(self.best_score[i])
+        if self._best_score_is_int[i]:
+            best_score = int(best_score)
+        info: Dict[str, Any] = {
+            "best_time": self.best_time[i],
+            "best_score": best_score,
+            "highest": int(self.highest[i]),
+            "rate": int(self.rate[i]),
+            "inner_rate": int(self.inner_rate[i]),
+            "attend": int(self.attend[i]),
+            "win": int(self.win[i]),
+        }
+        info.update(self._history_dict(rows))
+        if self._has_accumulators[i]:
+            for key in ACCUMULATOR_KEYS:
+                info[key] = float(getattr(self, key)[i])
+        info.update(self._extras[i])
+        return info
+
+    def _set_scalars(self, i: int, info: Dict[str, Any]) -> None:
+        for key in SCALAR_INT_KEYS:
+            value = info[key]
+            if type(value) is not int:
+                raise ValueError(f"Unexpected non-integer value in {key}")
+            getattr(self, key)[i] = value
+        self.best_score[i] = info["best_score"]
+        self._best_score_is_int[i] = type(info["best_score"]) is int
+        self.best_time[i] = info["best_time"]
+        self._has_accumulators[i] = all(key in info for key in ACCUMULATOR_KEYS)
+        for key in ACCUMULATOR_KEYS:
+            getattr(self, key)[i] = info.get(key, 0.0)
+        self._extras[i] = {k: v for k, v in info.items() if k not in KNOWN_KEYS}
+        return
+
+    @classmethod
+    def from_dict(
+        cls, rating_infos: Dict[str, Dict[str, Any]]
+    ) -> "RatingState":
+        state = cls()
+        state.merge(rating_infos)
+        return state
+
+    def merge(self, rating_infos: Dict[str, Dict[str, Any]]) -> None:
+        """rating_info の dict の値で上書きする
+
+        履歴は保持している数より後の分だけを追加する (subset で取り出した
+        dict に履歴を追加したものを書き戻すことを想定している)。
+        """
+        names = list(rating_infos.keys())
+        users = self.add_users(names)
+        hist_users: List[int] = []
+        hist_values: Dict[str, List[Any]] = {key: [] for key in HISTORY_KEYS}
+        for name, i in zip(names, users.tolist()):
+            info = rating_infos[name]
+            self._set_scalars(i, info)
+
+            n_hist = len(info["attend_date"])
+            if any(len(info[key]) != n_hist for key in HISTORY_KEYS):
+                raise ValueError(
+                    f"History lengths of user {name} are inconsistent"
+                )
+            n_old = int(self.hist_count[i])
+            if n_hist < n_old:
+                raise ValueError(
+                    f"History of user {name} is shorter than saved"
+                )
+            hist_users.extend([i] * (n_hist - n_old))
+            for key in HISTORY_KEYS:
+                hist_values[key].extend(info[key][n_old:])
+        self._extend_history(
+            hist_users,
+            [_date_to_int(d) for d in hist_values["attend_date"]],
+            [_record_to_ms(r) for r in hist_values["record"]],
+            hist_values["standing"],
+            hist_values["perf"],
+            hist_values["rate_hist"],
+        )
+        return
+
+    def subset(self, names: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """登録済みのユーザーのうち names に含まれる分だけを dict にする"""
+        return {
+            name: self._user_dict(
+                self.index[name], self.user_rows(self.index[name])
+            )
+            for name in names
+            if name in self.index
+        }
+
+    def to_dict(self) -> Dict[str, Dict[str, Any]]:
+        self._sort_history(force=True)
+        bounds = np.concatenate([[0], np.cumsum(self.hist_count)])
+        return {
+            name: self._user_dict(
+                i, self._sorted_order[bounds[i] : bounds[i + 1]]
+            )
+            for i, name in enumerate(self.names)
+        }
@@ -0,0 +1,86 @@
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, TypeVar
+
+from syaroho_rating.utils import TIMESTAMP_SHIFT, ms_to_tweetid
+
+RawT = TypeVar("RawT")
+# [since, until) の tweet id の範囲
+IdWindow = Tuple[int, int]
+# (since, until) のツイートを新しい順に 1 ページ取得し、
+# (生のレスポンス, 続きがある場合はそのページで最も古いツイートの id) を返す
+FetchWindow = Callable[[int, int], Tuple[RawT, Optional[int]]]
+
+# 0 時からの差 (ミリ秒) で表した最初の区切り。投稿が集まる 0 時の前後ほど狭くする
+WINDOW_EDGES_MS = (-60000, -10000, -3000, -1000, 0, 1000, 3000, 10000, 60000)
+
+
+def initial_windows(
+    center_ms: int, edges_ms: Sequence[int] = WINDOW_EDGES_MS
+) -> List[IdWindow]:
+    """center_ms (UNIX 時間のミリ秒) の前後を edges_ms で区切った id の範囲"""
+    ids = [ms_to_tweetid(center_ms + e) for e in edges_ms]
+    return list(zip(ids[:-1], ids[1:]))
+
+
+def split_window(window: IdWindow) -> List[IdWindow]:
+    """1 ミリ秒より広い範囲は半分に分ける"""
+    since, until = window
+    if until - since < 2 << TIMESTAMP_SHIFT:
+        return [window]
+    mid = (since + until) // 2
+    return [(since, mid), (mid, until)]
+
+
+def sliced_search(
+    fetch_window: FetchWindow[RawT],
+    windows: List[IdWindow],
+    max_workers: int = 4,
+    max_requests: int = 50,
+) -> List[RawT]:
+    """id の範囲ごとに並列に検索する
+
+    1 ページに収まらなかった範囲は、取得できなかった古い側を半分に分けて
+    取得し直す。リクエスト数が max_requests に達した場合は打ち切る。
+    レスポンスは新しい範囲のものから順に返す (同じツイートが複数の
+    レスポンスに含まれることはない)。
+    """
+    responses: List[Tuple[int, RawT]] = []
+    n_requests = 0
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending: Dict[Future, IdWindow] = {}
+
+        def submit(window: IdWindow) -> None:
+            nonlocal n_requests
+            n_requests += 1
+            pending[executor.submit(fetch_window, *window)] = window
+
+        for window in windows:
+            submit(window)
+        while len(pending):
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                since, until = pending.pop(future)
+                raw_response, oldest_id = future.result()
+                responses.append((until, raw_response))
+                if oldest_id is None or oldest_id <= since:
+                    continue
+
+                # oldest_id より古いツイートが残っている
+                rest = split_window((since, oldest_id))
+                if n_requests + len(rest) > max_requests:
+                    # 残り 1 回だけ取得できる場合は分けずに取得する
+                    rest = (
+                        [(since, oldest_id)]
+                        if n_requests < max_requests
+                        else []
+                    )
+                if len(rest) == 0:
+                    print(
+                        f"Reached {max_requests} search requests. "
+                        f"Tweets with ids in [{since}, {oldest_id}) are skipped."
+                    )
+                # 新しい側から取得する
+                for window in reversed(rest):
+                    submit(window)
+    responses.sort(key=lambda r: r[0], reverse=True)
+    return [raw_response for _, raw_response in responses]
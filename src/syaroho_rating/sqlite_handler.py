@@ -0,0 +1,428 @@
+import datetime as dt
+import sqlite3
+import threading
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import orjson
+
+from syaroho_rating.codec import load_with_codec, loads, save_with_codec
+from syaroho_rating.consts import STORAGE_COMPRESSION
+from syaroho_rating.io_handler import (
+    IOBaseHandler,
+    JsonObj,
+    RatingInfoStore,
+    count_entries_on,
+)
+from syaroho_rating.model import Tweet, User
+from syaroho_rating.rating import HISTORY_KEYS
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS objects (
+    path TEXT PRIMARY KEY,
+    dirname TEXT NOT NULL,
+    date TEXT,
+    data BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS objects_dirname_date ON objects (dirname, date);
+
+CREATE TABLE IF NOT EXISTS tweet (
+    path TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    date TEXT NOT NULL,
+    tweet_id INTEGER NOT NULL,
+    author_id INTEGER NOT NULL,
+    user_name TEXT NOT NULL,
+    created_at_ms INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    PRIMARY KEY (path, tweet_id)
+);
+CREATE INDEX IF NOT EXISTS tweet_kind_date ON tweet (kind, date);
+CREATE INDEX IF NOT EXISTS tweet_user_name ON tweet (user_name, created_at_ms);
+CREATE INDEX IF NOT EXISTS tweet_tweet_id ON tweet (tweet_id);
+
+CREATE TABLE IF NOT EXISTS member (
+    path TEXT NOT NULL,
+    user_id INTEGER NOT NULL,
+    user_name TEXT NOT NULL,
+    name TEXT NOT NULL,
+    protected INTEGER,
+    PRIMARY KEY (path, user_id)
+);
+CREATE INDEX IF NOT EXISTS member_user_name ON member (user_name);
+
+CREATE TABLE IF NOT EXISTS user_state (
+    user_name TEXT NOT NULL,
+    date TEXT NOT NULL,
+    scalars BLOB NOT NULL,
+    PRIMARY KEY (user_name, date)
+);
+CREATE INDEX IF NOT EXISTS user_state_date ON user_state (date);
+
+CREATE TABLE IF NOT EXISTS participation (
+    user_name TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    attend_date TEXT NOT NULL,
+    record TEXT NOT NULL,
+    standing INTEGER NOT NULL,
+    perf INTEGER NOT NULL,
+    rate_hist INTEGER NOT NULL,
+    PRIMARY KEY (user_name, seq)
+);
+CREATE INDEX IF NOT EXISTS participation_date ON participation (attend_date);
+"""
+
+
+# ツイートを保存するディレクトリ -> (tweet テーブルの kind, API のバージョン)
+TWEET_DIRS = {
+    "statuses": ("statuses", "1"),
+    "statuses_dq": ("statuses_dq", "1"),
+    "statuses_v2": ("statuses", "2"),
+    "statuses_dq_v2": ("statuses_dq", "2"),
+}
+# メンバーを保存するディレクトリ -> API のバージョン
+MEMBER_DIRS = {"member": "1", "member_v2": "2"}
+
+
+def _tweets_of(obj: Any, version: str) -> List[Tweet]:
+    """保存したツイートのファイルの中身から Tweet のリストを作る"""
+    if version == "1":
+        # statuses は "results" キーでラッピングしている
+        results = obj["results"] if isinstance(obj, dict) else obj
+        return Tweet.from_responses_v1(results)
+    return Tweet.from_dicts_v2(
+        obj.get("data", []), obj.get("includes", {}).get("users", [])
+    )
+
+
+def _members_of(obj: Any, version: str) -> List[User]:
+    if version == "1":
+        return User.from_responses_v1(obj["users"])
+    return User.from_dicts_v2(obj.get("data", []))
+
+
+def _date_of(relative_path: str) -> Optional[str]:
+    """statuses/20230101_1.json のようなパスから日付を取り出す"""
+    name = relative_path.rsplit("/", 1)[-1]
+    return name[:8] if name[:8].isdigit() else None
+
+
+class SQLiteIOBaseHandler(IOBaseHandler):
+    """1 つの SQLite ファイルに保存する
+
+    ファイルは objects テーブルにディレクトリ名と日付で索引を付けて保存する。
+    ツイートとメンバーのファイルは、保存する時に 1 件 1 行に分けて tweet と
+    member テーブルにも書き込み、日付やユーザー名で検索できるようにする
+    (読み込みは元のファイルと同じ形で返すため objects テーブルから行う)。
+    rating_info は SQLiteRatingInfoStore が user_state と participation
+    テーブルに保存する。
+    """
+
+    def __init__(
+        self,
+        db_path: Path = Path("data/syaroho.sqlite3"),
+        compression: str = STORAGE_COMPRESSION,
+    ) -> None:
+        super().__init__()
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(db_path), check_same_thread=False)
+        self.conn.executescript(SCHEMA)
+        self.lock = threading.Lock()
+        self.compression = compression
+
+    def save_dict(self, dict_obj: JsonObj, relative_path: str) -> None:
+        save_with_codec(
+            self.save_bytes, dict_obj, relative_path, self.compression
+        )
+        return
+
+    def load_dict(self, relative_path: str) -> Any:
+        return load_with_codec(self.load_bytes, relative_path, self.compression)
+
+    def save_bytes(self, data: bytes, relative_path: str) -> None:
+        dirname = (
+            relative_path.rsplit("/", 1)[0] if "/" in relative_path else ""
+        )
+        date = _date_of(relative_path)
+        tweet_rows: List[Tuple] = []
+        member_rows: List[Tuple] = []
+        try:
+            if dirname in TWEET_DIRS and date is not None:
+                kind, version = TWEET_DIRS[dirname]
+                tweet_rows = [
+                    (
+                        relative_path,
+                        kind,
+                        date,
+                        int(t.id),
+                        int(t.author.id),
+                        t.author.username,
+                        t.timestamp_ms,
+                        t.text,
+                    )
+                    for t in _tweets_of(loads(data, relative_path), version)
+                ]
+            elif dirname in MEMBER_DIRS:
+                members = _members_of(
+                    loads(data, relative_path), MEMBER_DIRS[dirname]
+                )
+                member_rows = [
+                    (relative_path, int(u.id), u.username, u.name, u.protected)
+                    for u in members
+                ]
+        except (KeyError, TypeError, ValueError) as e:
+            # 想定と異なる形式でもファイル自体は保存する
+            print(f"Could not index {relative_path}: {e!r}")
+
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO objects VALUES (?, ?, ?, ?)",
+                (relative_path, dirname, date, data),
+            )
+            self._delete_rows(relative_path)
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO tweet VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                tweet_rows,
+            )
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO member VALUES (?, ?, ?, ?, ?)",
+                member_rows,
+            )
+        return
+
+    def _delete_rows(self, relative_path: str) -> None:
+        self.conn.execute("DELETE FROM tweet WHERE path = ?", (relative_path,))
+        self.conn.execute("DELETE FROM member WHERE path = ?", (relative_path,))
+        return
+
+    def load_bytes(self, relative_path: str) -> bytes:
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT data FROM objects WHERE path = ?", (relative_path,)
+            ).fetchone()
+        if row is None:
+            raise FileNotFoundError(relative_path)
+        return row[0]
+
+    def save_dicts(self, dict_objs: Mapping[str, JsonObj]) -> None:
+        for relative_path, dict_obj in dict_objs.items():
+            self.save_dict(dict_obj, relative_path)
+        return
+
+    def load_dicts(self, relative_paths: List[str]) -> Dict[str, Any]:
+        return {p: self.load_dict(p) for p in relative_paths}
+
+    def list_path(self, relative_path: str) -> List[Any]:
+        """relative_path から始まるパスのリストを返す"""
+        # path の主キーの索引を使うため LIKE ではなく範囲で検索する
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT path FROM objects WHERE path >= ? AND path < ?"
+                " ORDER BY path",
+                (relative_path, relative_path + "\U0010ffff"),
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def delete(self, relative_path: str) -> None:
+        with self.lock, self.conn:
+            self.conn.execute(
+                "DELETE FROM objects WHERE path = ?", (relative_path,)
+            )
+            self._delete_rows(relative_path)
+        return
+
+    def flush(self) -> None:
+        return
+
+    def _query(self, query: str, params: Tuple) -> List[Dict[str, Any]]:
+        with self.lock:
+            cursor = self.conn.execute(query, params)
+            columns = [c[0] for c in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def tweets_of(
+        self, date: dt.date, kind: str = "statuses"
+    ) -> List[Dict[str, Any]]:
+        """ある日に保存したツイート (kind は statuses or statuses_dq) を投稿順に返す"""
+        return self._query(
+            "SELECT DISTINCT tweet_id, author_id, user_name, created_at_ms, text"
+            " FROM tweet WHERE kind = ? AND date = ?"
+            " ORDER BY created_at_ms, tweet_id",
+            (kind, date.strftime("%Y%m%d")),
+        )
+
+    def tweets_by_user(self, user_name: str) -> List[Dict[str, Any]]:
+        """あるユーザーの保存したツイートを投稿順に返す"""
+        return self._query(
+            "SELECT DISTINCT kind, date, tweet_id, created_at_ms, text"
+            " FROM tweet WHERE user_name = ?"
+            " ORDER BY created_at_ms, tweet_id",
+            (user_name,),
+        )
+
+    def members(self) -> List[Dict[str, Any]]:
+        """保存したメンバーの一覧を返す"""
+        return self._query(
+            "SELECT DISTINCT user_id, user_name, name, protected FROM member"
+            " ORDER BY user_name",
+            (),
+        )
+
+
+class SQLiteRatingInfoStore(RatingInfoStore):
+    """rating_info をユーザーごとの状態と参加履歴のテーブルに保存する
+
+    user_state には値が変わった日ごとのスカラー値を、participation には
+    1 回の参加を 1 行として保存する。ある日の rating_info は、その日までの
+    最新の状態と参加履歴から復元する。
+    """
+
+    def __init__(self, base_handler: SQLiteIOBaseHandler) -> None:
+        self.conn = base_handler.conn
+        self.lock = base_handler.lock
+
+    def _latest_states(
+        self, date_str: str, user_names: Optional[Set[str]] = None
+    ) -> Dict[str, bytes]:
+        if user_names is not None:
+            states = {}
+            for name in user_names:
+                row = self.conn.execute(
+                    "SELECT scalars FROM user_state"
+                    " WHERE user_name = ? AND date <= ?"
+                    " ORDER BY date DESC LIMIT 1",
+                    (name, date_str),
+                ).fetchone()
+                if row is not None:
+                    states[name] = row[0]
+            return states
+
+        rows = self.conn.execute(
+            "SELECT s.user_name, s.scalars FROM user_state AS s"
+            " JOIN (SELECT user_name, MAX(date) AS date FROM user_state"
+            " WHERE date <= ? GROUP BY user_name) AS latest"
+            " ON s.user_name = latest.user_name AND s.date = latest.date",
+            (date_str,),
+        ).fetchall()
+        return dict(rows)
+
+    def _participations(
+        self, date_str: str, user_names: Optional[Set[str]] = None
+    ) -> Dict[str, List[Tuple]]:
+        query = (
+            "SELECT user_name, attend_date, record, standing, perf, rate_hist"
+            " FROM participation WHERE attend_date <= ?"
+        )
+        if user_names is None:
+            rows = self.conn.execute(
+                query + " ORDER BY user_name, seq", (date_str,)
+            ).fetchall()
+        else:
+            rows = []
+            for name in user_names:
+                rows += self.conn.execute(
+                    query + " AND user_name = ? ORDER BY seq", (date_str, name)
+                ).fetchall()
+
+        history: Dict[str, List[Tuple]] = {}
+        for row in rows:
+            history.setdefault(row[0], []).append(row[1:])
+        return history
+
+    def _build(
+        self, date: dt.date, user_names: Optional[Set[str]] = None
+    ) -> Dict[str, Any]:
+        date_str = date.strftime("%Y/%m/%d")
+        with self.lock:
+            states = self._latest_states(date_str, user_names)
+            history = self._participations(date_str, user_names)
+
+        rating_info = {}
+        for name, scalars in states.items():
+            info = orjson.loads(scalars)
+            rows = history.get(name, [])
+            for i, key in enumerate(HISTORY_KEYS):
+                info[key] = [row[i] for row in rows]
+            rating_info[name] = info
+        return rating_info
+
+    def get(self, date: dt.date) -> Dict[str, Any]:
+        rating_info = self._build(date)
+        if len(rating_info) == 0:
+            raise FileNotFoundError(f"No rating info found for {date}")
+        return rating_info
+
+    def get_users(self, date: dt.date, user_names: List[str]) -> Dict[str, Any]:
+        return self._build(date, set(user_names))
+
+    def save(self, rating_info: Dict, date: dt.date) -> None:
+        date_str = date.strftime("%Y/%m/%d")
+        prev_date_str = (date - dt.timedelta(days=1)).strftime("%Y/%m/%d")
+
+        with self.lock, self.conn:
+            prev_states = self._latest_states(prev_date_str)
+            prev_counts = dict(
+                self.conn.execute(
+                    "SELECT user_name, COUNT(*) FROM participation"
+                    " WHERE attend_date < ? GROUP BY user_name",
+                    (date_str,),
+                ).fetchall()
+            )
+            self.conn.execute(
+                "DELETE FROM user_state WHERE date = ?", (date_str,)
+            )
+            self.conn.execute(
+                "DELETE FROM participation WHERE attend_date = ?", (date_str,)
+            )
+
+            for name, info in rating_info.items():
+                scalars = orjson.dumps(
+                    {k: v for k, v in info.items() if k not in HISTORY_KEYS}
+                )
+                if prev_states.get(name) != scalars:
+                    self.conn.execute(
+                        "INSERT INTO user_state VALUES (?, ?, ?)",
+                        (name, date_str, scalars),
+                    )
+
+                n_hist = len(info["attend_date"])
+                n_today = count_entries_on(info, date_str)
+                start = n_hist - n_today
+                if prev_counts.get(name, 0) != start:
+                    # 保存済みの履歴と一致しない場合は全て保存し直す
+                    self.conn.execute(
+                        "DELETE FROM participation"
+                        " WHERE user_name = ? AND attend_date <= ?",
+                        (name, date_str),
+                    )
+                    start = 0
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO participation VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [
+                        (name, i) + tuple(info[k][i] for k in HISTORY_KEYS)
+                        for i in range(start, n_hist)
+                    ],
+                )
+        return
+
+    def user_participations(self, user_name: str) -> List[Dict[str, Any]]:
+        """あるユーザーの全ての参加記録"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT attend_date, record, standing, perf, rate_hist"
+                " FROM participation WHERE user_name = ? ORDER BY seq",
+                (user_name,),
+            ).fetchall()
+        return [dict(zip(HISTORY_KEYS, row)) for row in rows]
+
+    def participants_of(self, date: dt.date) -> List[Dict[str, Any]]:
+        """ある日の参加者の記録 (順位順)"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT user_name, attend_date, record, standing, perf,"
+                " rate_hist FROM participation WHERE attend_date = ?"
+                " ORDER BY standing, user_name",
+                (date.strftime("%Y/%m/%d"),),
+            ).fetchall()
+        return [dict(zip(("user_name",) + HISTORY_KEYS, row)) for row in rows]
@@ -0,0 +1,68 @@
+from typing import Any, Dict, Iterable, Iterator, Set
+
+from syaroho_rating.model import Tweet, User
+from syaroho_rating.utils import clean_html_tag
+
+# 集計の対象になるツイートの本文
+SYAROHO_TEXT = "しゃろほー"
+
+
+def _id_of(obj: Dict[str, Any]) -> str:
+    return str(obj.get("id_str", obj["id"]))
+
+
+def iter_syaroho_tweets_v1(
+    statuses_dicts: Iterable[Dict[str, Any]]
+) -> Iterator[Tweet]:
+    """保存した v1 のツイートから、本文が "しゃろほー" のものだけを Tweet にする
+
+    複数のファイルに同じツイートがある場合は最初のものだけを返す
+    (merge_statuses_v1 と同じ順序になる)。
+    """
+    seen: Set[str] = set()
+    for statuses_dict in statuses_dicts:
+        for t in statuses_dict["results"]:
+            if t["text"] != SYAROHO_TEXT:
+                continue
+            tweet_id = _id_of(t)
+            if tweet_id in seen:
+                continue
+            seen.add(tweet_id)
+            yield Tweet(
+                text=t["text"],
+                source=clean_html_tag(t["source"]),
+                id=t["id"],
+                author=User(
+                    id=t["user"]["id"],
+                    name=t["user"]["name"],
+                    username=t["user"]["screen_name"],
+                    protected=t["user"]["protected"],
+                ),
+            )
+
+
+def iter_syaroho_tweets_v2(
+    statuses_dicts: Iterable[Dict[str, Any]]
+) -> Iterator[Tweet]:
+    """保存した v2 のツイートから、本文が "しゃろほー" のものだけを Tweet にする
+
+    tweepy.Tweet や tweepy.User は作らず、対象のツイートの投稿者だけを
+    includes から引く。複数のファイルに同じツイートがある場合は最初のものだけを
+    返す (merge_statuses_v2 と同じ順序になる)。
+    """
+    statuses_dicts = list(statuses_dicts)
+    tweets: Dict[str, Dict[str, Any]] = {}
+    for statuses_dict in statuses_dicts:
+        for t in statuses_dict.get("data", []):
+            if t["text"] == SYAROHO_TEXT:
+                tweets.setdefault(_id_of(t), t)
+
+    author_ids = {t["author_id"] for t in tweets.values()}
+    authors: Dict[str, User] = {}
+    for statuses_dict in statuses_dicts:
+        for u in statuses_dict.get("includes", {}).get("users", []):
+            if u["id"] in author_ids and u["id"] not in authors:
+                authors[u["id"]] = User.from_dict_v2(u)
+
+    for t in tweets.values():
+        yield Tweet.from_dict_v2(t, authors[t["author_id"]])
@@ -1,48 +1,30 @@
-from typing import Dict, List, Tuple
+import time
+from typing import Dict, List, Mapping, Optional, Tuple
 
 import pandas as pd
 import pendulum
 from tweepy.errors import Forbidden
 
+from syaroho_rating.consts import TZ
 from syaroho_rating.io_handler import IOHandler
+from syaroho_rating.leaderboard import build_leaderboard
 from syaroho_rating.model import Tweet, User
+from syaroho_rating.pre_result import PreResult
 from syaroho_rating.rating import calc_rating_for_date, summarize_rating_info
-from syaroho_rating.time import get_today
+from syaroho_rating.rating_state import RatingState
+from syaroho_rating.time import get_now
 from syaroho_rating.twitter import Twitter
-from syaroho_rating.utils import timedelta_to_ms, tweetid_to_datetime
 from syaroho_rating.visualize.graph import GraphMaker
 from syaroho_rating.visualize.table import TableMaker
 
 
 def filter_and_sort(
-    statuses: List[Tweet], date: pendulum.DateTime
+    statuses: List[Tweet], date: pendulum.DateTime, k: int = 5
 ) -> List[Dict]:
-    # 参加者リストの作成
-    participants = []
-    for s in statuses:
-        if not ((s.text == "しゃろほー")):
-            continue
-
-        rawtime = tweetid_to_datetime(s.id)
-        time = rawtime.strftime("%S.%f")[:-3]
-
-        record = timedelta_to_ms(rawtime - date)
-        bouns = 1000 if record >= 0 else 0
-        score = bouns - abs(record)
-        participants.append(
-            {
-                "screen_name": ("" + s.author.username),
-                "time": time,
-                "score": score,
-            }
-        )
-    df = (
-        pd.DataFrame(participants, columns=["screen_name", "time", "score"])
-        .sort_values("score", ascending=False)
-        .reset_index(drop=True)
-    )
-    sorted_posts = df.iloc[:5].to_dict(orient="records")
-    return sorted_posts
+    # スコアの高い上位 k 件
+    pre_result = PreResult(date, k)
+    pre_result.add(statuses)
+    return pre_result.top()
 
 
 class Syaroho(object):
@@ -56,18 +38,46 @@ class Syaroho(object):
         self.io.save_statuses(raw_response, date)
         return statuses
 
-    def _fetch_and_save_result_dq(self, date: pendulum.DateTime) -> List[Tweet]:
-        statuses, raw_response = self.twitter.fetch_result_dq()
-
-        self.io.save_statuses_dq(raw_response, date)
-        return statuses
-
     def _fetch_and_save_member(self) -> List[User]:
         users, raw_response = self.twitter.fetch_member()
 
         self.io.save_members(raw_response)
         return users
 
+    def _load_statuses(
+        self, date: pendulum.DateTime, fetch_tweet: bool
+    ) -> List[Tweet]:
+        if fetch_tweet:
+            print(f"Fetching tweets of date {date} ...")
+            statuses = self._fetch_and_save_result(date)
+            print(f"Loaded {len(statuses)} tweets.")
+        else:
+            print(f"Loading tweets of date {date} from storage ...")
+            # 集計に使う "しゃろほー" のツイートだけを読み込む
+            statuses = list(self.io.iter_syaroho_statuses(date))
+            print(f"Loaded {len(statuses)} tweets.")
+        return statuses
+
+    def _load_statuses_dq(self, date: pendulum.DateTime) -> List[Tweet]:
+        try:
+            dq_statuses = list(self.io.iter_syaroho_statuses_dq(date))
+        except FileNotFoundError:
+            print("no status_dq file found")
+            dq_statuses = []
+        return dq_statuses
+
+    def _load_prev_rating_info(self, date: pendulum.DateTime) -> Dict:
+        try:
+            print(f"Loading previous rating infos...")
+            prev_rating_infos = self.io.get_rating_info(date.subtract(days=1))
+            print(
+                f"Loaded previous rating containing {len(prev_rating_infos)} rows."
+            )
+        except FileNotFoundError:
+            print("No prev rating info found. Use empty list instead.")
+            prev_rating_infos = dict()
+        return prev_rating_infos
+
     def _add_new_member(self, statuses: List[Tweet], users: List[User]) -> None:
         existing_user_names = [u.username for u in users]
 
@@ -85,23 +95,120 @@ class Syaroho(object):
             print("no new members.")
         return
 
-    def run_dq(self, do_post: bool = False) -> List[Tweet]:
-        today = get_today()
-        statuses = self._fetch_and_save_result_dq(today)
-        posts = filter_and_sort(statuses, today)
-
+    @staticmethod
+    def _pre_result_message(today: pendulum.DateTime, posts: List[Dict]) -> str:
         messages = [f"SYAROHO PRE-RESULT ({today.strftime('%Y/%m/%d')})"]
         if len(posts) == 0:
             messages.append("速報データを取得できませんでした。")
         else:
-            for p in posts[:5]:
+            for p in posts:
                 messages.append(f"{p['time']} {p['screen_name']}")
+        return "\n".join(messages)
 
-        message = "\n".join(messages)
+    def run_dq(self, do_post: bool = False) -> List[Tweet]:
+        now = get_now()
+        started = time.monotonic()
+        today = pendulum.datetime(now.year, now.month, now.day, tz=TZ)
+
+        # リストのツイートを 1 ページ受け取るごとに上位 5 件を更新する
+        pre_result = PreResult(today, k=5)
+        statuses, raw_response = self.twitter.fetch_result_dq(
+            on_page=pre_result.add
+        )
+
+        message = self._pre_result_message(today, pre_result.top())
         if do_post:
             self.twitter.update_status(message)
+        elapsed = now - today.add(seconds=5)
+        latency = elapsed.total_seconds() + time.monotonic() - started
+        print(
+            f"Pre-result of {len(pre_result)} tweets ready "
+            f"{latency:.3f} s after 00:00:05."
+        )
+
+        # 速報を投稿してから保存する
+        self.io.save_statuses_dq(raw_response, today)
+        self.io.flush()
         return statuses
 
+    def run_dq_live(
+        self,
+        do_post: bool = False,
+        poll_interval: float = 5.0,
+        update_interval: float = 30.0,
+    ) -> List[Tweet]:
+        """00:02 まで since_id を使ってリストを繰り返し取得し、速報を更新する
+
+        最初の取得で速報を投稿し、その後は update_interval 秒以上経過して
+        上位が変わった場合に投稿し直す (0 の場合は最初の 1 回のみ)。
+        後で削除されたツイートも含め、取得したツイートをすべて返す。
+        """
+        now = get_now()
+        started = time.monotonic()
+        today = pendulum.datetime(now.year, now.month, now.day, tz=TZ)
+        # 00:02 までの残り秒数 (時刻は最初の 1 回だけ取得し、後は経過時間で測る)
+        remaining = (today.add(minutes=2) - now).total_seconds()
+
+        pre_result = PreResult(today, k=5)
+        statuses_by_id: Dict[int, Tweet] = {}
+        raw_responses = []
+        since_id = None
+        posted: Optional[List[Dict]] = None
+        posted_at = 0.0
+        n_polls = 0
+        while True:
+            statuses, raw_response = self.twitter.fetch_result_dq(
+                on_page=pre_result.add, since_id=since_id
+            )
+            n_polls += 1
+            raw_responses.append(raw_response)
+            for s in statuses:
+                statuses_by_id.setdefault(int(s.id), s)
+            if len(statuses_by_id):
+                since_id = max(statuses_by_id)
+
+            elapsed = time.monotonic() - started
+            posts = pre_result.top()
+            if posted is None:
+                if do_post:
+                    self.twitter.update_status(
+                        self._pre_result_message(today, posts)
+                    )
+                posted, posted_at = posts, elapsed
+                latency = (now - today.add(seconds=5)).total_seconds()
+                print(
+                    f"Pre-result of {len(pre_result)} tweets ready "
+                    f"{latency + elapsed:.3f} s after 00:00:05."
+                )
+            elif (
+                update_interval > 0
+                and elapsed - posted_at >= update_interval
+                and posts != posted
+            ):
+                if do_post:
+                    self.twitter.update_status(
+                        self._pre_result_message(today, posts)
+                    )
+                posted, posted_at = posts, elapsed
+                print(
+                    f"Pre-result updated with {len(pre_result)} tweets "
+                    f"from {len(pre_result.participants)} participants."
+                )
+
+            if elapsed + poll_interval >= remaining:
+                break
+            time.sleep(poll_interval)
+
+        print(
+            f"Polled the list {n_polls} times and got "
+            f"{len(statuses_by_id)} tweets."
+        )
+        self.io.save_statuses_dq(
+            self.twitter.merge_responses(raw_responses), today
+        )
+        self.io.flush()
+        return list(statuses_by_id.values())
+
     def run(
         self,
         date: pendulum.DateTime,
@@ -111,25 +218,10 @@ class Syaroho(object):
         do_retweet: bool = False,
         exag: float = 1.0,
     ) -> Tuple[pd.DataFrame, Dict]:
-        if fetch_tweet:
-            print(f"Fetching tweets of date {date} ...")
-            statuses = self._fetch_and_save_result(date)
-            print(f"Loaded {len(statuses)} tweets.")
-        else:
-            print(f"Loading tweets of date {date} from storage ...")
-            statuses = self.io.get_statuses(date)
-            print(f"Loaded {len(statuses)} tweets.")
+        statuses = self._load_statuses(date, fetch_tweet)
 
         # 前日のレーティング結果を読み込む
-        try:
-            print(f"Loading previous rating infos...")
-            prev_rating_infos = self.io.get_rating_info(date.subtract(days=1))
-            print(
-                f"Loaded previous rating containing {len(prev_rating_infos)} rows."
-            )
-        except FileNotFoundError:
-            print("No prev rating info found. Use empty list instead.")
-            prev_rating_infos = dict()
+        prev_rating_infos = self._load_prev_rating_info(date)
 
         # 当日のレーティングを計算
         print(f"Calculating rating for date {date}...")
@@ -138,6 +230,7 @@ class Syaroho(object):
         )
         print(f"Saving rating info...")
         self.io.save_rating_info(rating_infos, date)
+        self.io.save_leaderboard(build_leaderboard(rating_infos), date)
         print("Done.")
 
         # convert rating results to dataframe
@@ -203,6 +296,16 @@ class Syaroho(object):
         summary_df = summarize_rating_info(rating_infos)
         print("Done.")
 
+        # 返信用のインデックスは結果を投稿してから更新する
+        print("Saving user history index...")
+        self.io.save_user_history(rating_infos, date)
+        print("Done.")
+
+        # 後回しにした保存が全て完了したことを確認する
+        print("Waiting for pending saves...")
+        self.io.flush()
+        print("Done.")
+
         return summary_df, rating_infos
 
     def _retweet_winners(self, df_ratings: pd.DataFrame) -> None:
@@ -217,7 +320,7 @@ class Syaroho(object):
         return
 
     def reply_to_mentions(
-        self, summary_df: pd.DataFrame, rating_infos: Dict
+        self, summary_df: pd.DataFrame, rating_infos: Mapping
     ) -> None:
         self.twitter.listen_and_reply(rating_infos, summary_df)
         return
@@ -235,12 +338,7 @@ class Syaroho(object):
             pendulum.period(start_date, end_date).range("days")
         ):
             print(f"Executing backfill for {date}...")
-            try:
-                dq_statuses = self.io.get_statuses_dq(date)
-            except FileNotFoundError:
-                print("no status_dq file found")
-                dq_statuses = []
-                pass
+            dq_statuses = self._load_statuses_dq(date)
             if i == 0 and exag_start:
                 self.run(
                     date,
@@ -254,6 +352,52 @@ class Syaroho(object):
                 self.run(date, dq_statuses, fetch_tweet, do_post, do_retweet)
         print("done.")
 
+    def replay(
+        self,
+        start_date: pendulum.DateTime,
+        end_date: pendulum.DateTime,
+        fetch_tweet: bool = False,
+        exag_start: bool = False,
+        checkpoint_interval: int = 0,
+    ) -> Dict:
+        """レーティングをメモリ上に保持したまま期間内の集計をやり直す
+
+        backfill と違い、rating_info の読み込みは開始日の前日分の 1 回だけで、
+        保存は checkpoint_interval 日ごと (0 の場合は行わない) と最終日のみ行う。
+        ツイートの投稿やリツイートは行わない。
+        レーティングは RatingState で保持し、各日の計算にはその日にツイートした
+        ユーザーの分だけを dict にして渡す。
+        """
+        dates = list(pendulum.period(start_date, end_date).range("days"))
+        state = RatingState.from_dict(self._load_prev_rating_info(start_date))
+        rating_infos: Dict = {}
+        for i, date in enumerate(dates):
+            print(f"Replaying {date}...")
+            dq_statuses = self._load_statuses_dq(date)
+            statuses = self._load_statuses(date, fetch_tweet)
+            exag = 1.5 if i == 0 and exag_start else 1.0
+            daily_infos = state.subset(
+                {s.author.username for s in statuses + dq_statuses}
+            )
+            _, daily_infos = calc_rating_for_date(
+                date, statuses, dq_statuses, daily_infos, exag
+            )
+            state.merge(daily_infos)
+
+            is_checkpoint = (
+                checkpoint_interval > 0 and (i + 1) % checkpoint_interval == 0
+            )
+            if is_checkpoint or i == len(dates) - 1:
+                print(f"Saving rating info of {date}...")
+                rating_infos = state.to_dict()
+                self.io.save_rating_info(rating_infos, date)
+                self.io.save_leaderboard(build_leaderboard(rating_infos), date)
+            if i == len(dates) - 1:
+                self.io.save_user_history(rating_infos, date)
+        self.io.flush()
+        print("done.")
+        return rating_infos
+
     def fetch_and_save_tweet(
         self, date: pendulum.DateTime, save: bool = False
     ) -> None:
@@ -261,4 +405,5 @@ class Syaroho(object):
         print(raw_response)
         if save:
             self.io.save_statuses(raw_response, date)
+            self.io.flush()
         return
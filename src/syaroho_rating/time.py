@@ -1,24 +1,15 @@
-import datetime
-from time import ctime
-from zoneinfo import ZoneInfo
-
 import ntplib
 import pendulum
 
-from syaroho_rating.consts import (
-    NTP_SERVER_URI,
-    NTPLIB_FORMAT,
-    NTPLIB_VERSION,
-    TZ,
-)
+from syaroho_rating.consts import NTP_SERVER_URI, NTPLIB_VERSION, TZ
 
 client = ntplib.NTPClient()
 
 
 def get_now() -> pendulum.DateTime:
     response = client.request(NTP_SERVER_URI, NTPLIB_VERSION)
-    nowtime = datetime.datetime.strptime(ctime(response.tx_time), NTPLIB_FORMAT)
-    return pendulum.instance(nowtime.astimezone(ZoneInfo(TZ)))
+    # 速報の遅延を計測できるように秒未満も残す
+    return pendulum.from_timestamp(response.tx_time, tz=TZ)
 
 
 def get_today() -> pendulum.DateTime:
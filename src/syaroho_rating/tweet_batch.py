@@ -0,0 +1,94 @@
+import datetime as dt
+from typing import Dict, Iterable, List
+
+import numpy as np
+
+from syaroho_rating.model import Tweet
+from syaroho_rating.status_stream import SYAROHO_TEXT
+from syaroho_rating.utils import datetime_to_ms, tweetids_to_ms
+
+MS_PER_DAY = 24 * 60 * 60 * 1000
+
+
+class TweetBatch(object):
+    """1 日分のツイートを列ごとの NumPy 配列で持つ
+
+    ids: ツイートの id (int64)
+    posted_ms: 投稿時刻 (UNIX 時間のミリ秒、int64)
+    user_index: usernames の何番目のユーザーの投稿か (int32)
+    valid: 本文が "しゃろほー" かどうか
+    """
+
+    def __init__(
+        self,
+        ids: np.ndarray,
+        posted_ms: np.ndarray,
+        user_index: np.ndarray,
+        usernames: List[str],
+        valid: np.ndarray,
+    ) -> None:
+        self.ids = ids
+        self.posted_ms = posted_ms
+        self.user_index = user_index
+        self.usernames = usernames
+        self.valid = valid
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @staticmethod
+    def from_tweets(tweets: Iterable[Tweet]) -> "TweetBatch":
+        ids = []
+        user_index = []
+        valid = []
+        user_to_index: Dict[str, int] = {}
+        for t in tweets:
+            ids.append(int(t.id))
+            user_index.append(
+                user_to_index.setdefault(t.author.username, len(user_to_index))
+            )
+            valid.append(t.text == SYAROHO_TEXT)
+        id_array = np.array(ids, dtype=np.int64)
+        return TweetBatch(
+            ids=id_array,
+            posted_ms=tweetids_to_ms(id_array),
+            user_index=np.array(user_index, dtype=np.int32),
+            usernames=list(user_to_index),
+            valid=np.array(valid, dtype=bool),
+        )
+
+    def username_of(self, i: int) -> str:
+        return self.usernames[self.user_index[i]]
+
+    def offsets_ms(self, date: dt.datetime) -> np.ndarray:
+        """date (その日の 0 時) からの差 (ミリ秒)"""
+        return self.posted_ms - datetime_to_ms(date)
+
+    def format_times(self, rows: np.ndarray, date: dt.datetime) -> List[str]:
+        """rows 番目のツイートの投稿時刻を date のタイムゾーンで HH:MM:SS.fff にする"""
+        return format_times(self.posted_ms[rows], date)
+
+
+def format_times(posted_ms: np.ndarray, date: dt.datetime) -> List[str]:
+    """投稿時刻 (UNIX 時間のミリ秒) を date のタイムゾーンで HH:MM:SS.fff にする"""
+    utc_offset = date.utcoffset() or dt.timedelta(0)
+    offset_ms = int(utc_offset.total_seconds()) * 1000
+    ms_of_day = (np.asarray(posted_ms, dtype=np.int64) + offset_ms) % MS_PER_DAY
+    seconds, ms = np.divmod(ms_of_day, 1000)
+    minutes, seconds = np.divmod(seconds, 60)
+    hours, minutes = np.divmod(minutes, 60)
+    return [
+        f"{h:02d}:{m:02d}:{s:02d}.{f:03d}"
+        for h, m, s, f in zip(
+            hours.tolist(), minutes.tolist(), seconds.tolist(), ms.tolist()
+        )
+    ]
+
+
+def calc_scores(offsets_ms: np.ndarray) -> np.ndarray:
+    """0 時からの差 (ミリ秒) からスコアを計算する
+
+    0 時以降は 1000 - 差、0 時より前は -差 (float64、以前と同じ値)。
+    """
+    bonus = np.where(offsets_ms >= 0, 1000, 0)
+    return (bonus - np.abs(offsets_ms)).astype(np.float64)
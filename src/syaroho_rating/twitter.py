@@ -1,8 +1,20 @@
 import datetime as dt
+import functools
 import pickle
 import time
 from pathlib import Path
-from typing import Any, Dict, Iterable, List, Optional, Protocol, Tuple, Union
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Mapping,
+    Optional,
+    Protocol,
+    Tuple,
+    Union,
+)
 
 import pandas as pd
 import pendulum
@@ -20,15 +32,27 @@ from syaroho_rating.consts import (
     ENVIRONMENT_NAME,
     LIST_SLUG,
     REPLY_WAIT_TIME,
+    SEARCH_MAX_REQUESTS,
+    SEARCH_MAX_WORKERS,
     SYAROHO_LIST_ID,
     TWITTER_COOKIE_PATH,
     TWITTER_PASSWORD,
     reply_patience,
 )
+from syaroho_rating.io_handler import merge_statuses_v1, merge_statuses_v2
 from syaroho_rating.message import create_reply_message
 from syaroho_rating.model import Tweet, User
+from syaroho_rating.sliced_search import (
+    IdWindow,
+    initial_windows,
+    sliced_search,
+)
 from syaroho_rating.time import get_now
-from syaroho_rating.utils import datetime_to_tweetid, tweetid_to_datetime
+from syaroho_rating.utils import (
+    datetime_to_ms,
+    ms_to_tweetid,
+    tweetid_to_datetime,
+)
 from syaroho_rating.visualize.graph import GraphMaker
 
 
@@ -52,7 +76,20 @@ class Twitter(Protocol):
     ) -> Tuple[List[Tweet], RawInfo]:
         ...
 
-    def fetch_result_dq(self) -> Tuple[List[Tweet], RawInfo]:
+    def fetch_result_dq(
+        self,
+        on_page: Optional[Callable[[List[Tweet]], None]] = None,
+        since_id: Optional[int] = None,
+    ) -> Tuple[List[Tweet], RawInfo]:
+        """リストのツイートを取得する
+
+        on_page を指定した場合、1 ページ受け取るごとにそのページのツイートを渡す。
+        since_id を指定した場合、それより新しいツイートだけを取得する。
+        """
+        ...
+
+    def merge_responses(self, raw_responses: List[RawInfo]) -> RawInfo:
+        """fetch_result_dq を繰り返した結果を 1 つの保存形式にまとめる"""
         ...
 
     def fetch_member(self) -> Tuple[List[User], RawInfo]:
@@ -67,7 +104,7 @@ class Twitter(Protocol):
         ...
 
     def listen_and_reply(
-        self, rating_infos: Dict[str, Any], summary_df: pd.DataFrame
+        self, rating_infos: Mapping[str, Any], summary_df: pd.DataFrame
     ) -> None:
         ...
 
@@ -125,21 +162,37 @@ class TwitterV1(Twitter):
         wait=wait_exponential(multiplier=1, min=1, max=60),
         stop=stop_after_attempt(3),
     )
-    def fetch_result_dq(self) -> Tuple[List[Tweet], List[Dict[str, Any]]]:
+    def fetch_result_dq(
+        self,
+        on_page: Optional[Callable[[List[Tweet]], None]] = None,
+        since_id: Optional[int] = None,
+    ) -> Tuple[List[Tweet], List[Dict[str, Any]]]:
         # tweet されてから search API で拾えるようになるまでに時間がかかるため、速報はリストから取得
         # (リストからは瞬時に取得できる)
-        raw_response = [
-            x._json
-            for x in Cursor(
-                self.api.list_timeline,
-                owner_screen_name=ACCOUNT_NAME,
-                slug=self.list_slug,
-                include_rts=False,
-            ).items(1000)
-        ]
-        tweets = Tweet.from_responses_v1(raw_response)
+        max_items = 1000
+        tweets: List[Tweet] = []
+        raw_response: List[Dict[str, Any]] = []
+        kwargs = {} if since_id is None else {"since_id": since_id}
+        for page in Cursor(
+            self.api.list_timeline,
+            owner_screen_name=ACCOUNT_NAME,
+            slug=self.list_slug,
+            include_rts=False,
+            **kwargs,
+        ).pages():
+            raw_page = [x._json for x in page][: max_items - len(raw_response)]
+            page_tweets = Tweet.from_responses_v1(raw_page)
+            if on_page is not None:
+                on_page(page_tweets)
+            tweets += page_tweets
+            raw_response += raw_page
+            if len(raw_response) >= max_items:
+                break
         return tweets, raw_response
 
+    def merge_responses(self, raw_responses: List[Any]) -> List[Dict[str, Any]]:
+        return merge_statuses_v1([{"results": r} for r in raw_responses])
+
     @retry(
         wait=wait_exponential(multiplier=1, min=1, max=60),
         stop=stop_after_attempt(3),
@@ -185,7 +238,7 @@ class TwitterV1(Twitter):
         return
 
     def listen_and_reply(
-        self, rating_infos: Dict[str, Any], summary_df: pd.DataFrame
+        self, rating_infos: Mapping[str, Any], summary_df: pd.DataFrame
     ) -> None:
         # TODO: ストリーミングを使わない返信機能を実装
         print("Streaming for API v1.1 is deprecated")
@@ -211,7 +264,7 @@ class TwitterV1(Twitter):
 def handle_reply(
     tweet: Tweet,
     replied_list: List[str],
-    rating_info: Dict[str, Any],
+    rating_info: Mapping[str, Any],
     rating_summary: pd.DataFrame,
     twitter: Twitter,
 ) -> None:
@@ -299,21 +352,35 @@ class TwitterV1C(TwitterV1, Twitter):
         wait=wait_exponential(multiplier=1, min=1, max=60),
         stop=stop_after_attempt(3),
     )
+    def search_window(
+        self, since: int, until: int
+    ) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        """id が [since, until) のツイートを 1 ページ検索する"""
+        results = self.api.search_tweets(
+            q="しゃろほー",
+            count=100,  # system limit
+            result_type="recent",
+            since_id=since - 1,
+            max_id=until - 1,
+        )
+        raw_response = [x._json for x in results]
+        oldest_id = None
+        if results.next_results and len(results):
+            oldest_id = min(x.id for x in results)
+        return raw_response, oldest_id
+
     def fetch_result(
         self, date: pendulum.DateTime
     ) -> Tuple[List[Tweet], List[Dict[str, Any]]]:
+        # 前後 1 分を区切って並列に検索する
         target_date = pendulum.instance(date, "Asia/Tokyo")
-        from_date = target_date.subtract(minutes=1)
-        to_date = target_date.add(minutes=1)
-        raw_response = [
-            x._json
-            for x in Cursor(
-                self.api.search_tweets,
-                q="しゃろほー",
-                since_id=datetime_to_tweetid(from_date),
-                max_id=datetime_to_tweetid(to_date),
-            ).items(500)
-        ]
+        responses = sliced_search(
+            self.search_window,
+            initial_windows(datetime_to_ms(target_date)),
+            max_workers=SEARCH_MAX_WORKERS,
+            max_requests=SEARCH_MAX_REQUESTS,
+        )
+        raw_response = merge_statuses_v1([{"results": r} for r in responses])
         tweets = Tweet.from_responses_v1(raw_response)
         return tweets, raw_response
 
@@ -333,7 +400,7 @@ class TwitterV1C(TwitterV1, Twitter):
         return
 
     def listen_and_reply(
-        self, rating_infos: Dict[str, Any], summary_df: pd.DataFrame
+        self, rating_infos: Mapping[str, Any], summary_df: pd.DataFrame
     ) -> None:
         print("Streaming is not available")
         pass
@@ -462,49 +529,6 @@ class TwitterV2(Twitter):
         self.client.retweet(tweet_id)
         return
 
-    def fetch_tweets(
-        self,
-        query: str,
-        start_time: Optional[pendulum.DateTime] = None,
-        end_time: Optional[pendulum.DateTime] = None,
-    ) -> Tuple[List[Tweet], Dict[str, Any]]:
-        data: List[tweepy.Tweet] = []
-        medias: List[tweepy.Media] = []
-        places: List[tweepy.Place] = []
-        polls: List[tweepy.Poll] = []
-        tweets: List[tweepy.Tweet] = []
-        users: List[tweepy.User] = []
-
-        for response in tweepy.Paginator(
-            self.client.search_recent_tweets,
-            query=query,
-            user_auth=True,
-            max_results=100,  # system limit
-            expansions=EXPANSIONS,
-            media_fields=MEDIA_FIELDS,
-            place_fields=PLACE_FIELDS,
-            poll_fields=POLL_FIELDS,
-            tweet_fields=TWEET_FIELDS,
-            user_fields=USER_FIELDS,
-            start_time=start_time,
-            end_time=end_time,
-            limit=5,
-        ):
-            if response.data is None:
-                continue
-            data += response.data
-            medias += response.includes.get("medias", [])
-            places += response.includes.get("places", [])
-            polls += response.includes.get("polls", [])
-            tweets += response.includes.get("tweets", [])
-            users += response.includes.get("users", [])
-
-        tweet_objects = Tweet.from_responses_v2(tweets=data, users=users)
-        all_info_dict = self.resp_to_dict(
-            data, medias, places, polls, tweets, users
-        )
-        return tweet_objects, all_info_dict
-
     @staticmethod
     def resp_to_dict(
         data: Union[Iterable[tweepy.Tweet], Iterable[tweepy.User]],
@@ -532,28 +556,89 @@ class TwitterV2(Twitter):
         }
         return info_dict
 
+    @retry(
+        wait=wait_exponential(multiplier=1, min=1, max=60),
+        stop=stop_after_attempt(3),
+    )
+    def search_window(
+        self, query: str, since: int, until: int
+    ) -> Tuple[Dict[str, Any], Optional[int]]:
+        """id が [since, until) のツイートを 1 ページ検索する"""
+        response = self.client.search_recent_tweets(
+            query=query,
+            user_auth=True,
+            max_results=100,  # system limit
+            expansions=EXPANSIONS,
+            media_fields=MEDIA_FIELDS,
+            place_fields=PLACE_FIELDS,
+            poll_fields=POLL_FIELDS,
+            tweet_fields=TWEET_FIELDS,
+            user_fields=USER_FIELDS,
+            since_id=since - 1,
+            until_id=until,
+        )
+        data = response.data or []
+        includes = response.includes
+        info_dict = self.resp_to_dict(
+            data,
+            includes.get("medias", []),
+            includes.get("places", []),
+            includes.get("polls", []),
+            includes.get("tweets", []),
+            includes.get("users", []),
+        )
+        oldest_id = None
+        if "next_token" in response.meta and len(data):
+            oldest_id = min(t.id for t in data)
+        return info_dict, oldest_id
+
+    def search_tweets(
+        self,
+        query: str,
+        windows: List[IdWindow],
+        max_requests: int = SEARCH_MAX_REQUESTS,
+    ) -> Tuple[List[Tweet], Dict[str, Any]]:
+        """id の範囲ごとに search_window で並列に検索し、1 つにまとめる"""
+        responses = sliced_search(
+            functools.partial(self.search_window, query),
+            windows,
+            max_workers=SEARCH_MAX_WORKERS,
+            max_requests=max_requests,
+        )
+        all_info_dict = merge_statuses_v2(responses)
+        tweets = Tweet.from_dicts_v2(
+            all_info_dict["data"], all_info_dict["includes"]["users"]
+        )
+        return tweets, all_info_dict
+
     def fetch_result(
         self, date: pendulum.DateTime
     ) -> Tuple[List[Tweet], Dict[str, Any]]:
+        # 前後 1 分を区切って並列に検索する
         target_date = pendulum.instance(date, "Asia/Tokyo")
-        start_time = target_date.subtract(minutes=1)
-        end_time = target_date.add(minutes=1)
-        tweets, all_info_dict = self.fetch_tweets(
-            query="しゃろほー -is:retweet",
-            start_time=start_time,
-            end_time=end_time,
+        return self.search_tweets(
+            "しゃろほー -is:retweet",
+            initial_windows(datetime_to_ms(target_date)),
         )
-        return tweets, all_info_dict
 
     def fetch_list_tweets(
-        self, list_id: str
+        self,
+        list_id: str,
+        on_page: Optional[Callable[[List[Tweet]], None]] = None,
+        since_id: Optional[int] = None,
     ) -> Tuple[List[Tweet], Dict[str, Any]]:
+        """リストのツイートを新しい順に取得する
+
+        v2 の API には since_id が無いため、since_id 以前のツイートを含む
+        ページまで取得したら終了し、それ以前のツイートは取り除く。
+        """
         data: List[tweepy.Tweet] = []
         medias: List[tweepy.Media] = []
         places: List[tweepy.Place] = []
         polls: List[tweepy.Poll] = []
         tweets: List[tweepy.Tweet] = []
         users: List[tweepy.User] = []
+        tweet_objects: List[Tweet] = []
 
         for response in tweepy.Paginator(
             self.client.get_list_tweets,
@@ -570,27 +655,43 @@ class TwitterV2(Twitter):
         ):
             if response.data is None:
                 continue
-            data += response.data
+            page_data = response.data
+            if since_id is not None:
+                page_data = [t for t in response.data if t.id > since_id]
+            data += page_data
             medias += response.includes.get("medias", [])
             places += response.includes.get("places", [])
             polls += response.includes.get("polls", [])
             tweets += response.includes.get("tweets", [])
             users += response.includes.get("users", [])
 
-        tweet_objects = Tweet.from_responses_v2(tweets=data, users=users)
+            page_tweets = Tweet.from_responses_v2(tweets=page_data, users=users)
+            if on_page is not None:
+                on_page(page_tweets)
+            tweet_objects += page_tweets
+            if len(page_data) < len(response.data):
+                break
+
         all_info_dict = self.resp_to_dict(
             data, medias, places, polls, tweets, users
         )
         return tweet_objects, all_info_dict
 
-    def fetch_result_dq(self) -> Tuple[List[Tweet], Dict[str, Any]]:
+    def fetch_result_dq(
+        self,
+        on_page: Optional[Callable[[List[Tweet]], None]] = None,
+        since_id: Optional[int] = None,
+    ) -> Tuple[List[Tweet], Dict[str, Any]]:
         # tweet されてから search API で拾えるようになるまでに時間がかかるため、速報はリストから取得
         # (リストからは瞬時に取得できる)
         tweets, all_info_dict = self.fetch_list_tweets(
-            list_id=self.syaroho_list_id
+            list_id=self.syaroho_list_id, on_page=on_page, since_id=since_id
         )
         return tweets, all_info_dict
 
+    def merge_responses(self, raw_responses: List[Any]) -> Dict[str, Any]:
+        return merge_statuses_v2(raw_responses)
+
     def fetch_list_member(
         self, list_id: str
     ) -> Tuple[List[User], Dict[str, Any]]:
@@ -649,7 +750,7 @@ class TwitterV2(Twitter):
         client.disconnect()
 
     def listen_and_reply(
-        self, rating_infos: Dict[str, Any], summary_df: pd.DataFrame
+        self, rating_infos: Mapping[str, Any], summary_df: pd.DataFrame
     ) -> None:
         replied_list: List[str] = []
         now = get_now()
@@ -669,11 +770,12 @@ class TwitterV2(Twitter):
                 seconds=sec_elapse - lag - interval - 1
             )  # 1秒間重複してもれなく検索
             end_time = now.add(seconds=sec_elapse - lag)
-            tweets, all_info_dict = self.fetch_tweets(
-                query=query,
-                start_time=start_time,
-                end_time=end_time,
+            window = (
+                ms_to_tweetid(datetime_to_ms(start_time)),
+                ms_to_tweetid(datetime_to_ms(end_time)),
             )
+            # これまでと同じく 1 回あたり最大 5 リクエストまで
+            tweets, _ = self.search_tweets(query, [window], max_requests=5)
             for tweet in tweets:
                 handle_reply(
                     tweet=tweet,
@@ -48,19 +48,52 @@ def timedelta_to_ms(delta: dt.timedelta) -> float:
     return ms
 
 
-def tweetid_to_datetime(tweetid: str) -> pendulum.DateTime:
-    rawtime = pendulum.datetime(1970, 1, 1, tz="UTC") + dt.timedelta(
-        milliseconds=int(int(tweetid) / 2**22) + 1288834974657
+# ツイートの id (snowflake) の上位 41 bit は、この時刻からの経過ミリ秒
+TWEET_EPOCH_MS = 1288834974657
+TIMESTAMP_SHIFT = 22
+
+
+def tweetid_to_ms(tweetid: Union[int, str]) -> int:
+    """ツイートの id から投稿時刻 (UNIX 時間のミリ秒) を取り出す"""
+    return (int(tweetid) >> TIMESTAMP_SHIFT) + TWEET_EPOCH_MS
+
+
+def ms_to_tweetid(ms: int) -> int:
+    """その時刻 (UNIX 時間のミリ秒) に投稿されたツイートの id の最小値"""
+    return (ms - TWEET_EPOCH_MS) << TIMESTAMP_SHIFT
+
+
+def tweetids_to_ms(tweetids: np.ndarray) -> np.ndarray:
+    """tweetid_to_ms の NumPy 配列版 (int64)"""
+    return (tweetids.astype(np.int64) >> TIMESTAMP_SHIFT) + TWEET_EPOCH_MS
+
+
+def ms_to_tweetids(ms: np.ndarray) -> np.ndarray:
+    """ms_to_tweetid の NumPy 配列版 (int64)"""
+    return (ms.astype(np.int64) - TWEET_EPOCH_MS) << TIMESTAMP_SHIFT
+
+
+def ms_to_datetime(ms: int) -> pendulum.DateTime:
+    """UNIX 時間のミリ秒を Asia/Tokyo の日時にする"""
+    seconds, millis = divmod(ms, 1000)
+    rawtime = pendulum.from_timestamp(seconds, tz="Asia/Tokyo")
+    return rawtime.replace(microsecond=millis * 1000)
+
+
+def datetime_to_ms(datetime: dt.datetime) -> int:
+    """タイムゾーン付きの日時を UNIX 時間のミリ秒にする (ミリ秒未満は切り捨て)"""
+    delta = datetime - pendulum.datetime(1970, 1, 1, tz="UTC")
+    return (delta.days * 86400 + delta.seconds) * 1000 + (
+        delta.microseconds // 1000
     )
-    return rawtime.in_timezone("Asia/Tokyo")
+
+
+def tweetid_to_datetime(tweetid: Union[int, str]) -> pendulum.DateTime:
+    return ms_to_datetime(tweetid_to_ms(tweetid))
 
 
 def datetime_to_tweetid(datetime: pendulum.DateTime) -> str:
-    timedelta = datetime.in_timezone("UTC") - pendulum.datetime(
-        1970, 1, 1, tz="UTC"
-    )
-    tweet_id = (timedelta.total_seconds() * 1000 - 1288834974657) * (2**22)
-    return str(int(tweet_id))
+    return str(ms_to_tweetid(datetime_to_ms(datetime)))
 
 
 def clean_html_tag(text: str) -> str:
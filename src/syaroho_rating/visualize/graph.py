@@ -1,6 +1,6 @@
 import datetime as dt
 from pathlib import Path
-from typing import Dict, List
+from typing import List, Mapping
 
 import matplotlib.dates as mdates
 import matplotlib.pyplot as plt
@@ -20,7 +20,7 @@ fp = FontProperties(
 class GraphMaker(object):
     save_dir = Path("graph")
 
-    def __init__(self, rating_history: Dict):
+    def __init__(self, rating_history: Mapping):
         # self.history_data[usr_name]["rate_hist"] = [rate1, ...]
         # self.history_data[usr_name]["attend_date"] = [date1, ...]
         self.rating_history = rating_history
@@ -0,0 +1,102 @@
+import datetime as dt
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("pyarrow")
+
+from syaroho_rating.archive import (  # noqa: E402
+    HistoryArchive,
+    participation_table,
+    status_table,
+    write_dataset,
+)
+from syaroho_rating.model import Tweet, User  # noqa: E402
+from syaroho_rating.utils import datetime_to_tweetid  # noqa: E402
+
+
+@pytest.mark.parametrize("fmt", ["parquet", "arrow"])
+def test_participation_archive(tmp_path: Path, fmt: str) -> None:
+    rating_infos = {
+        "user_a": {
+            "attend_date": ["2022/12/31", "2023/01/01"],
+            "record": ["00:00:00.100", "00:00:00.200"],
+            "standing": [1, 2],
+            "perf": [2000, 1500],
+            "rate_hist": [1200, 1250],
+        },
+        "user_b": {
+            "attend_date": ["2023/01/01"],
+            "record": ["00:00:00.050"],
+            "standing": [1],
+            "perf": [1800],
+            "rate_hist": [900],
+        },
+    }
+    write_dataset(
+        participation_table(rating_infos), tmp_path / "participation", fmt
+    )
+    archive = HistoryArchive(tmp_path, fmt)
+
+    history = archive.rating_history()
+    for name, info in rating_infos.items():
+        assert history[name]["attend_date"] == info["attend_date"]
+        assert history[name]["rate_hist"] == info["rate_hist"]
+
+    table = archive.participations(
+        columns=["user_name"], start=dt.date(2023, 1, 1)
+    )
+    assert sorted(table["user_name"].to_pylist()) == ["user_a", "user_b"]
+    assert archive.participations(user_names=["user_b"]).num_rows == 1
+
+
+def tweets_on(date: dt.date, n: int) -> list:
+    user = User(id=1, name="name", username="user_a", protected=False)
+    midnight = dt.datetime(
+        date.year, date.month, date.day, tzinfo=dt.timezone.utc
+    )
+    return [
+        Tweet(
+            text="しゃろほー",
+            source="client",
+            id=int(datetime_to_tweetid(midnight)) + i,
+            author=user,
+        )
+        for i in range(n)
+    ]
+
+
+def test_partial_year_export_keeps_other_dates(tmp_path: Path) -> None:
+    path = tmp_path / "statuses"
+    jan = [dt.date(2023, 1, 1), dt.date(2023, 1, 2)]
+    jun = [dt.date(2023, 6, 1)]
+    write_dataset(
+        status_table((d, tweets_on(d, 2)) for d in jan),
+        path,
+        "parquet",
+        "date",
+        jan[0],
+        jan[-1],
+    )
+    # 同じ年の別の期間を書き出しても、1 月のデータは残る
+    write_dataset(
+        status_table((d, tweets_on(d, 3)) for d in jun),
+        path,
+        "parquet",
+        "date",
+        jun[0],
+        jun[-1],
+    )
+    # 1 月 2 日だけを書き出し直すと、その日の分だけが置き換わる
+    write_dataset(
+        status_table([(jan[1], tweets_on(jan[1], 1))]),
+        path,
+        "parquet",
+        "date",
+        jan[1],
+        jan[1],
+    )
+
+    dates = HistoryArchive(tmp_path).statuses(columns=["date"])["date"]
+    counts = {d: dates.to_pylist().count(d) for d in set(dates.to_pylist())}
+    assert counts == {jan[0]: 2, jan[1]: 1, jun[0]: 3}
@@ -0,0 +1,155 @@
+import datetime as dt
+import gzip
+import hashlib
+import io
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import pytest
+from botocore.exceptions import ClientError
+
+from syaroho_rating import io_handler
+from syaroho_rating.io_handler import (
+    CachedIOBaseHandler,
+    S3IOBaseHandler,
+    WriteBehindIOBaseHandler,
+    get_io_handler,
+)
+
+
+class FakeS3(object):
+    """get_object と put_object だけを持つ S3 の client の代わり"""
+
+    def __init__(self) -> None:
+        self.objects: Dict[str, Tuple[bytes, str]] = {}
+        # (Key, IfNoneMatch) のリスト
+        self.gets: List[Tuple[str, Optional[str]]] = []
+
+    def put_object(self, Bucket: str, Key: str, Body: bytes) -> None:
+        etag = '"' + hashlib.md5(Body).hexdigest() + '"'
+        self.objects[Key] = (Body, etag)
+
+    def get_object(
+        self, Bucket: str, Key: str, IfNoneMatch: Optional[str] = None
+    ) -> Dict[str, Any]:
+        self.gets.append((Key, IfNoneMatch))
+        if Key not in self.objects:
+            raise ClientError({"Error": {"Code": "NoSuchKey"}}, "GetObject")
+        body, etag = self.objects[Key]
+        if IfNoneMatch == etag:
+            raise ClientError({"Error": {"Code": "304"}}, "GetObject")
+        return {"Body": io.BytesIO(body), "ETag": etag}
+
+
+@pytest.fixture
+def fake_s3(monkeypatch: pytest.MonkeyPatch) -> FakeS3:
+    s3 = FakeS3()
+    monkeypatch.setattr(io_handler, "S3_BUCKET_NAME", "bucket")
+    monkeypatch.setattr(io_handler.boto3, "client", lambda name: s3)
+    return s3
+
+
+def make_handler(cache_dir: Path, max_bytes: int = 1024) -> CachedIOBaseHandler:
+    return CachedIOBaseHandler(
+        S3IOBaseHandler(compression="none"), cache_dir, max_bytes
+    )
+
+
+def test_cache_hit_and_revalidation(tmp_path: Path, fake_s3: FakeS3) -> None:
+    handler = make_handler(tmp_path)
+    fake_s3.put_object("bucket", "a.json", b"a1")
+
+    assert handler.load_bytes("a.json") == b"a1"
+    assert handler.load_bytes("a.json") == b"a1"
+    assert handler.stats()["hits"] == 1
+    assert handler.stats()["misses"] == 1
+    # 2 回目はキャッシュの ETag で確認する
+    etag = fake_s3.objects["a.json"][1]
+    assert fake_s3.gets == [("a.json", None), ("a.json", etag)]
+
+    # S3 上で変更された場合はダウンロードし直す
+    fake_s3.put_object("bucket", "a.json", b"a2")
+    assert handler.load_bytes("a.json") == b"a2"
+    assert handler.stats()["misses"] == 2
+
+    # 別のインスタンスでも保存したキャッシュを使う
+    reloaded = make_handler(tmp_path)
+    assert reloaded.load_bytes("a.json") == b"a2"
+    assert reloaded.stats()["hits"] == 1
+
+    with pytest.raises(FileNotFoundError):
+        handler.load_bytes("missing.json")
+
+
+def test_cache_lru_eviction(tmp_path: Path, fake_s3: FakeS3) -> None:
+    handler = make_handler(tmp_path, max_bytes=10)
+    for key in ["a", "b", "c"]:
+        fake_s3.put_object("bucket", key, key.encode() * 4)
+
+    handler.load_bytes("a")
+    handler.load_bytes("b")
+    handler.load_bytes("a")  # b が最も古くなる
+    handler.load_bytes("c")
+    assert handler.stats()["entries"] == 2
+    assert handler.stats()["bytes"] == 8
+    assert not handler._cache_path("b").exists()
+
+    handler.load_bytes("b")
+    assert handler.stats()["misses"] == 4
+    assert not handler._cache_path("a").exists()
+
+
+def test_cache_index_is_saved_on_change(
+    tmp_path: Path, fake_s3: FakeS3
+) -> None:
+    handler = make_handler(tmp_path)
+    fake_s3.put_object("bucket", "a", b"a")
+    fake_s3.put_object("bucket", "b", b"b")
+    handler.load_bytes("a")
+    handler.load_bytes("b")
+
+    # キャッシュを参照しただけでは index.json を書き直さない
+    index_path = tmp_path / "index.json"
+    saved = index_path.read_text()
+    handler.load_bytes("a")
+    assert index_path.read_text() == saved
+    handler.flush()
+    assert list(make_handler(tmp_path)._entries) == ["b", "a"]
+
+    # キャッシュのファイルが無くなっていた場合は index.json からも削除する
+    handler._cache_path("a").unlink()
+    assert handler._read_cache("a") is None
+    assert list(make_handler(tmp_path)._entries) == ["b"]
+    # 次に読み込んだ時はダウンロードし直す
+    assert handler.load_bytes("a") == b"a"
+    assert list(make_handler(tmp_path)._entries) == ["b", "a"]
+
+
+def test_io_handler_stack_keeps_compression(
+    tmp_path: Path, fake_s3: FakeS3, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(io_handler, "STORAGE", "s3")
+    monkeypatch.setattr(io_handler, "STORAGE_COMPRESSION", "gzip")
+    monkeypatch.setattr(io_handler, "S3_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr(io_handler, "WRITE_BEHIND", True)
+    monkeypatch.setattr(
+        io_handler, "WRITE_BEHIND_JOURNAL_DIR", str(tmp_path / "journal")
+    )
+    monkeypatch.setattr(io_handler, "RATING_INFO_STORAGE", "snapshot")
+    rating_info = {"user_a": {"rate": 1200}}
+    fake_s3.put_object(
+        "bucket",
+        "rating_info/20230101.json.gz",
+        gzip.compress(b'{"user_a": {"rate": 1200}}'),
+    )
+
+    handler = get_io_handler("2")
+    assert isinstance(handler.base_handler, WriteBehindIOBaseHandler)
+    assert handler.base_handler.compression == "gzip"
+    assert handler.get_rating_info(dt.date(2023, 1, 1)) == rating_info
+
+    # 新しいファイルも圧縮して保存する
+    handler.save_rating_info(rating_info, dt.date(2023, 1, 2))
+    handler.flush()
+    assert "rating_info/20230102.json.gz" in fake_s3.objects
+    assert "rating_info/20230102.json" not in fake_s3.objects
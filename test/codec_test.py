@@ -0,0 +1,52 @@
+import datetime as dt
+import json
+from pathlib import Path
+
+import pytest
+
+from syaroho_rating.codec import dumps, loads
+from syaroho_rating.io_handler import LocalIOBaseHandler
+
+OBJ = {
+    "user": {"rate": 1200, "best_score": -1000000.0, "record": ["しゃろほー"]},
+    "created_at": dt.datetime(2023, 1, 1, 0, 0, 0, 123000),
+}
+LOADED = dict(OBJ, created_at="2023-01-01T00:00:00.123000")
+
+
+@pytest.mark.parametrize("suffix", [".json", ".json.gz", ".json.zst"])
+def test_dumps_and_loads(suffix: str) -> None:
+    if suffix.endswith(".zst"):
+        pytest.importorskip("zstandard")
+    path = f"rating_info/20230101{suffix}"
+    assert loads(dumps(OBJ, path), path) == LOADED
+
+
+def test_read_uncompressed_file_with_compression(tmp_path: Path) -> None:
+    # 以前の形式(インデント付きの JSON)で保存されたファイルも読める
+    (tmp_path / "rating_info").mkdir()
+    with (tmp_path / "rating_info" / "20230101.json").open("w") as f:
+        json.dump(LOADED, f, indent=4, ensure_ascii=False)
+
+    handler = LocalIOBaseHandler(tmp_path, compression="gzip")
+    assert handler.load_dict("rating_info/20230101.json") == LOADED
+
+    handler.save_dict(OBJ, "rating_info/20230102.json")
+    assert (tmp_path / "rating_info" / "20230102.json.gz").exists()
+    assert handler.load_dict("rating_info/20230102.json") == LOADED
+    with pytest.raises(FileNotFoundError):
+        handler.load_dict("rating_info/20230103.json")
+
+
+@pytest.mark.parametrize("old, new", [("gzip", "none"), ("gzip", "zstd")])
+def test_read_file_saved_with_other_compression(
+    tmp_path: Path, old: str, new: str
+) -> None:
+    if "zstd" in (old, new):
+        pytest.importorskip("zstandard")
+    LocalIOBaseHandler(tmp_path, compression=old).save_dict(
+        OBJ, "rating_info/20230101.json"
+    )
+    # 圧縮方式の設定を変えても以前のファイルを読める
+    handler = LocalIOBaseHandler(tmp_path, compression=new)
+    assert handler.load_dict("rating_info/20230101.json") == LOADED
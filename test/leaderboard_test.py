@@ -0,0 +1,66 @@
+import datetime as dt
+from pathlib import Path
+
+import pytest
+
+from syaroho_rating.io_handler import IOHandlerV2, LocalIOBaseHandler
+from syaroho_rating.leaderboard import LeaderboardIndex, build_leaderboard
+from syaroho_rating.rating import summarize_rating_info
+
+DATE = dt.date(2023, 1, 1)
+
+
+def make_info(rate: int) -> dict:
+    return {
+        "rate": rate,
+        "attend": 3,
+        "win": 1,
+        "best_time": "00:00:00.100",
+        "highest": rate,
+        "attend_date": ["2023/01/01"],
+        "rate_hist": [rate],
+    }
+
+
+RATING_INFOS = {
+    "user_c": make_info(1500),
+    "user_a": make_info(1800),
+    "user_d": make_info(1500),
+    "user_b": make_info(1800),
+    "user_e": make_info(1200),
+}
+
+
+def test_build_leaderboard_ties() -> None:
+    rows = build_leaderboard(RATING_INFOS)
+    # 同じレーティングは同順位で、名前順に並ぶ
+    assert [(r["Rank"], r["User"]) for r in rows] == [
+        (1, "user_a"),
+        (1, "user_b"),
+        (3, "user_c"),
+        (3, "user_d"),
+        (5, "user_e"),
+    ]
+
+    summary = summarize_rating_info(RATING_INFOS)
+    assert sorted(zip(summary.index, summary["User"])) == [
+        (r["Rank"], r["User"]) for r in rows
+    ]
+
+
+def test_leaderboard_index(tmp_path: Path) -> None:
+    base_handler = LocalIOBaseHandler(tmp_path, compression="none")
+    io_handler = IOHandlerV2(base_handler)
+    io_handler.save_rating_info(RATING_INFOS, DATE)
+
+    index = LeaderboardIndex(io_handler)
+    assert index.rank_of(DATE, "user_d") == 3
+    assert index.rank_of(DATE, "unknown") is None
+    assert index.top_k(DATE, 2)["User"].tolist() == ["user_a", "user_b"]
+    assert index.as_of(DATE).index.tolist() == [1, 1, 3, 3, 5]
+    # 参照するだけではランキングを保存しない
+    with pytest.raises(FileNotFoundError):
+        io_handler.get_leaderboard(DATE)
+
+    LeaderboardIndex(io_handler, save_missing=True).as_of(DATE)
+    assert io_handler.get_leaderboard(DATE) == build_leaderboard(RATING_INFOS)
@@ -0,0 +1,54 @@
+from syaroho_rating.io_handler import merge_statuses_v1, merge_statuses_v2
+
+
+def test_merge_statuses_v1() -> None:
+    shards = [
+        {"results": [{"id": 1, "id_str": "1"}, {"id": 2, "id_str": "2"}]},
+        {"results": [{"id": 2, "id_str": "2"}, {"id": 3, "id_str": "3"}]},
+    ]
+    assert [t["id"] for t in merge_statuses_v1(shards)] == [1, 2, 3]
+
+
+def test_merge_statuses_v2() -> None:
+    shards = [
+        {
+            "data": [{"id": "10", "author_id": "1"}],
+            "includes": {"users": [{"id": "1"}]},
+        },
+        {
+            "data": [
+                {"id": "10", "author_id": "1"},
+                {"id": "11", "author_id": "2"},
+            ],
+            "includes": {"users": [{"id": "1"}, {"id": "2"}]},
+        },
+        # data や includes が無いファイル
+        {},
+    ]
+    merged = merge_statuses_v2(shards)
+    assert [t["id"] for t in merged["data"]] == ["10", "11"]
+    assert [u["id"] for u in merged["includes"]["users"]] == ["1", "2"]
+
+
+def test_merge_statuses_v2_keeps_other_includes() -> None:
+    shards = [
+        {
+            "data": [{"id": "10", "author_id": "1"}],
+            "includes": {
+                "users": [{"id": "1"}],
+                "medias": [{"media_key": "3_1"}],
+            },
+        },
+        {
+            "data": [{"id": "11", "author_id": "1"}],
+            "includes": {
+                "users": [{"id": "1"}],
+                "medias": [{"media_key": "3_1"}, {"media_key": "3_2"}],
+                "tweets": [{"id": "5"}],
+            },
+        },
+    ]
+    includes = merge_statuses_v2(shards)["includes"]
+    assert [u["id"] for u in includes["users"]] == ["1"]
+    assert [m["media_key"] for m in includes["medias"]] == ["3_1", "3_2"]
+    assert [t["id"] for t in includes["tweets"]] == ["5"]
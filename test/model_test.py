@@ -0,0 +1,70 @@
+import pytest
+import tweepy
+
+from syaroho_rating.model import Tweet, User
+from syaroho_rating.utils import tweetid_to_datetime
+
+TWEET_ID = "1609152000125829120"
+
+
+def _tweet(username: str) -> Tweet:
+    author = User(id=1, name="name", username=username, protected=False)
+    return Tweet(text="しゃろほー", source="client", id=TWEET_ID, author=author)
+
+
+def test_tweet_created_at() -> None:
+    tweet = _tweet("user1")
+    assert tweet.created_at_ms == tweetid_to_datetime(TWEET_ID)
+    assert tweet.created_at_ms is tweet.created_at_ms
+
+
+def test_username_is_interned() -> None:
+    # 実行時に作った同じ内容の文字列
+    name1 = "".join(["user", "1"])
+    name2 = "".join(["user", "1"])
+    assert name1 is not name2
+    assert _tweet(name1).author.username is _tweet(name2).author.username
+
+
+def test_tweet_is_immutable() -> None:
+    tweet = _tweet("user1")
+    assert tweet == _tweet("user1")
+    assert len({tweet, _tweet("user1")}) == 1
+    with pytest.raises(AttributeError):
+        tweet.text = "しゃろほー!"  # type: ignore
+    with pytest.raises(AttributeError):
+        tweet.extra = 1  # type: ignore
+    # created_at_ms を作っても比較や repr は変わらない
+    assert tweet.created_at_ms is not None
+    assert tweet == _tweet("user1")
+    assert "_created_at" not in repr(tweet)
+
+
+def test_tweet_fields_are_keyword_only() -> None:
+    author = User(1, "name", "user1", False)
+    with pytest.raises(TypeError):
+        Tweet("しゃろほー", "client", TWEET_ID, author)  # type: ignore
+
+
+def test_from_dicts_v2() -> None:
+    tweets = [
+        {
+            "id": TWEET_ID,
+            "text": "しゃろほー",
+            "author_id": "1",
+            "source": "client",
+            "created_at": "2022-12-31T15:00:00.000Z",
+            "edit_history_tweet_ids": [TWEET_ID],
+        },
+        # source の無いツイート
+        {"id": "1609152000230686720", "text": "しゃろ", "author_id": "2"},
+    ]
+    users = [
+        {"id": "1", "name": "name1", "username": "user1", "protected": True},
+        {"id": "2", "name": "name2", "username": "user2"},
+    ]
+    expected = Tweet.from_responses_v2(
+        [tweepy.Tweet(t) for t in tweets], [tweepy.User(u) for u in users]
+    )
+    assert Tweet.from_dicts_v2(tweets, users) == expected
+    assert User.from_dicts_v2(users) == [t.author for t in expected]
@@ -0,0 +1,62 @@
+import random
+from typing import List
+
+import pendulum
+
+from syaroho_rating.model import Tweet, User
+from syaroho_rating.pre_result import PreResult
+from syaroho_rating.utils import datetime_to_tweetid, timedelta_to_ms
+
+DATE = pendulum.datetime(2023, 1, 1, tz="Asia/Tokyo")
+
+
+def make_tweets(n: int, seed: int) -> List[Tweet]:
+    rng = random.Random(seed)
+    tweets = []
+    for i in range(n):
+        # 同じスコアのツイートも作る
+        posted_at = DATE.add(microseconds=rng.randint(-3000, 3000) * 1000)
+        tweet_id = int(datetime_to_tweetid(posted_at)) + rng.randrange(2**22)
+        user = User(id=i, name="name", username=f"user{i}", protected=False)
+        text = rng.choice(["しゃろほー"] * 4 + ["しゃろほー!"])
+        tweets.append(
+            Tweet(text=text, source="client", id=tweet_id, author=user)
+        )
+    return tweets
+
+
+def test_pre_result_matches_full_sort() -> None:
+    for seed in range(10):
+        tweets = make_tweets(300, seed)
+        pre_result = PreResult(DATE, k=5)
+        # ページごとに渡す (同じページを 2 回受け取っても 1 回だけ数える)
+        for start in range(0, len(tweets), 20):
+            pre_result.add(tweets[start : start + 20])
+        pre_result.add(tweets[:20])
+
+        valid = [t for t in tweets if t.text == "しゃろほー"]
+        scores = []
+        for t in valid:
+            record = timedelta_to_ms(t.created_at_ms - DATE)
+            scores.append((1000 if record >= 0 else 0) - abs(record))
+        # スコアが同じ場合は先に受け取ったものを上位にする
+        order = sorted(range(len(valid)), key=lambda i: -scores[i])[:5]
+
+        assert len(pre_result) == len(valid)
+        assert pre_result.participants == {t.author.username for t in valid}
+        assert pre_result.top() == [
+            {
+                "screen_name": valid[i].author.username,
+                "time": valid[i].created_at_ms.strftime("%S.%f")[:-3],
+                "score": scores[i],
+            }
+            for i in order
+        ]
+
+
+def test_empty_pre_result() -> None:
+    pre_result = PreResult(DATE)
+    pre_result.add([])
+    assert len(pre_result) == 0
+    assert pre_result.top() == []
+    assert pre_result.participants == set()
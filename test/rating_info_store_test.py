@@ -0,0 +1,195 @@
+import copy
+import datetime as dt
+import random
+from pathlib import Path
+from typing import Dict, List
+
+import pytest
+
+from syaroho_rating.io_handler import (
+    DeltaRatingInfoStore,
+    LocalIOBaseHandler,
+    ShardedRatingInfoStore,
+    SnapshotRatingInfoStore,
+    shard_of,
+)
+from syaroho_rating.rating import HISTORY_KEYS
+
+DAY1 = dt.date(2023, 1, 1)
+
+
+def test_sharded_rating_info_store(tmp_path: Path) -> None:
+    base_handler = LocalIOBaseHandler(tmp_path)
+    store = ShardedRatingInfoStore(base_handler, n_shards=4)
+    date = dt.date(2023, 1, 1)
+    rating_info = {f"user{i}": {"rate": i} for i in range(10)}
+
+    with pytest.raises(FileNotFoundError):
+        store.get(date)
+
+    store.save(rating_info, date)
+    assert store.get(date) == rating_info
+
+    # 分割数を変えても保存時の分割数で読み込める
+    assert ShardedRatingInfoStore(base_handler, n_shards=7).get(date) == (
+        rating_info
+    )
+
+
+class RecordingIOBaseHandler(LocalIOBaseHandler):
+    """読み込んだファイルのパスを記録する"""
+
+    def __init__(self, base_path: Path) -> None:
+        super().__init__(base_path)
+        self.loaded: List[str] = []
+
+    def load_bytes(self, relative_path: str) -> bytes:
+        self.loaded.append(relative_path)
+        return super().load_bytes(relative_path)
+
+
+def test_sharded_rating_info_store_get_users(tmp_path: Path) -> None:
+    base_handler = RecordingIOBaseHandler(tmp_path)
+    store = ShardedRatingInfoStore(base_handler, n_shards=8)
+    rating_info = {f"user{i}": {"rate": i} for i in range(40)}
+    store.save(rating_info, DAY1)
+
+    base_handler.loaded.clear()
+    users = store.get_users(DAY1, ["user3", "user17", "unknown"])
+    assert users == {"user3": {"rate": 3}, "user17": {"rate": 17}}
+    # 対象のユーザーを含む shard 以外は読み込まない
+    shards = {shard_of(n, 8) for n in ["user3", "user17", "unknown"]}
+    assert sorted(p for p in base_handler.loaded if "manifest" not in p) == [
+        store._shard_path(DAY1, shard) for shard in sorted(shards)
+    ]
+    assert len(shards) < 8
+
+    # 分割して保存する前の日付はスナップショットから読み込む
+    day0 = DAY1 - dt.timedelta(days=1)
+    SnapshotRatingInfoStore(base_handler).save(rating_info, day0)
+    assert store.get_users(day0, ["user3"]) == {"user3": {"rate": 3}}
+
+
+def test_switch_to_sharded_rating_info_store(tmp_path: Path) -> None:
+    base_handler = LocalIOBaseHandler(tmp_path)
+    day1 = dt.date(2023, 1, 1)
+    day2 = dt.date(2023, 1, 2)
+    info1 = {f"user{i}": {"rate": i} for i in range(10)}
+    info2 = {f"user{i}": {"rate": i + 1} for i in range(12)}
+    SnapshotRatingInfoStore(base_handler).save(info1, day1)
+
+    # 切り替える前の日付は rating_info/YYYYMMDD.json から読み込む
+    store = ShardedRatingInfoStore(base_handler, n_shards=4)
+    assert store.get(day1) == info1
+    store.save(info2, day2)
+    assert store.get(day2) == info2
+    assert store.get(day1) == info1
+    assert not (tmp_path / "rating_info" / "20230102.json").exists()
+
+
+def advance(rating_info: Dict, date: dt.date, rng: random.Random) -> Dict:
+    """date に何人かが参加した後の rating_info を作る"""
+    date_str = date.strftime("%Y/%m/%d")
+    rating_info = copy.deepcopy(rating_info)
+    # 既存のユーザーの半分と、新しいユーザー 2 人が参加する
+    names = rng.sample(list(rating_info), k=len(rating_info) // 2)
+    for name in names + [f"new{date_str}_{i}" for i in range(2)]:
+        info = rating_info.setdefault(
+            name, {"rate": 0, "attend": 0, **{k: [] for k in HISTORY_KEYS}}
+        )
+        info["rate"] = rng.randint(0, 3000)
+        info["attend"] += 1
+        info["attend_date"].append(date_str)
+        info["record"].append(f"00:00:0{rng.randint(0, 9)}.000")
+        info["standing"].append(rng.randint(1, 30))
+        info["perf"].append(rng.randint(-500, 3500))
+        info["rate_hist"].append(info["rate"])
+    return rating_info
+
+
+def make_history(n_days: int, seed: int) -> List[Dict]:
+    rng = random.Random(seed)
+    history = [advance({}, DAY1, rng)]
+    for i in range(1, n_days):
+        history.append(advance(history[-1], DAY1 + dt.timedelta(days=i), rng))
+    return history
+
+
+def saved_snapshots(tmp_path: Path) -> List[str]:
+    return sorted(p.name for p in (tmp_path / "rating_info").iterdir())
+
+
+def test_delta_rating_info_store_round_trip(tmp_path: Path) -> None:
+    base_handler = LocalIOBaseHandler(tmp_path)
+    history = make_history(10, 0)
+    store = DeltaRatingInfoStore(base_handler, snapshot_interval=30)
+    for i, rating_info in enumerate(history):
+        store.save(rating_info, DAY1 + dt.timedelta(days=i))
+
+    # 最初の日だけ全体を保存し、その後は変更分だけを保存する
+    assert saved_snapshots(tmp_path) == ["20230101.json"]
+    delta = base_handler.load_dict("rating_info_delta/20230103.json")
+    assert delta["snapshot"] is False
+    # 初参加のユーザーは全体が保存される
+    assert "new2023/01/03_0" not in history[1]
+    assert delta["users"]["new2023/01/03_0"] == {
+        "new": history[2]["new2023/01/03_0"]
+    }
+
+    reloaded = DeltaRatingInfoStore(base_handler, snapshot_interval=30)
+    for i, rating_info in enumerate(history):
+        assert reloaded.get(DAY1 + dt.timedelta(days=i)) == rating_info
+
+
+def test_delta_rating_info_store_snapshot_interval(tmp_path: Path) -> None:
+    base_handler = LocalIOBaseHandler(tmp_path)
+    history = make_history(7, 1)
+    store = DeltaRatingInfoStore(base_handler, snapshot_interval=3)
+    for i, rating_info in enumerate(history):
+        store.save(rating_info, DAY1 + dt.timedelta(days=i))
+
+    assert saved_snapshots(tmp_path) == [
+        "20230101.json",
+        "20230104.json",
+        "20230107.json",
+    ]
+    reloaded = DeltaRatingInfoStore(base_handler, snapshot_interval=3)
+    for i, rating_info in enumerate(history):
+        assert reloaded.get(DAY1 + dt.timedelta(days=i)) == rating_info
+
+
+def test_delta_rating_info_store_gap_forces_snapshot(tmp_path: Path) -> None:
+    base_handler = LocalIOBaseHandler(tmp_path)
+    history = make_history(5, 2)
+    store = DeltaRatingInfoStore(base_handler, snapshot_interval=30)
+    store.save(history[0], DAY1)
+    store.save(history[1], DAY1 + dt.timedelta(days=1))
+    # 前日の状態を扱っていない日付は変更分として保存できない
+    store.save(history[4], DAY1 + dt.timedelta(days=4))
+    assert saved_snapshots(tmp_path) == ["20230101.json", "20230105.json"]
+
+    # 別のインスタンスでも、前日を読み込んでから保存すれば変更分になる
+    store = DeltaRatingInfoStore(base_handler, snapshot_interval=30)
+    store.get(DAY1 + dt.timedelta(days=1))
+    store.save(history[2], DAY1 + dt.timedelta(days=2))
+    assert saved_snapshots(tmp_path) == ["20230101.json", "20230105.json"]
+
+    reloaded = DeltaRatingInfoStore(base_handler, snapshot_interval=30)
+    for i in [0, 1, 2, 4]:
+        assert reloaded.get(DAY1 + dt.timedelta(days=i)) == history[i]
+
+
+def test_delta_rating_info_store_reads_legacy_snapshot(tmp_path: Path) -> None:
+    base_handler = LocalIOBaseHandler(tmp_path)
+    history = make_history(3, 3)
+    # 保存方式を切り替える前の rating_info/YYYYMMDD.json
+    SnapshotRatingInfoStore(base_handler).save(history[0], DAY1)
+
+    store = DeltaRatingInfoStore(base_handler, snapshot_interval=30)
+    assert store.get(DAY1) == history[0]
+    store.save(history[1], DAY1 + dt.timedelta(days=1))
+    store.save(history[2], DAY1 + dt.timedelta(days=2))
+    assert saved_snapshots(tmp_path) == ["20230101.json"]
+
+    reloaded = DeltaRatingInfoStore(base_handler, snapshot_interval=30)
+    assert reloaded.get(DAY1 + dt.timedelta(days=2)) == history[2]
@@ -0,0 +1,135 @@
+import copy
+import json
+import random
+
+import numpy as np
+import pendulum
+
+from syaroho_rating.model import Tweet, User
+from syaroho_rating.rating import calc_rating_for_date
+from syaroho_rating.rating_state import RatingState
+from syaroho_rating.utils import datetime_to_tweetid
+
+
+def make_rating_infos():
+    return {
+        "user_a": {
+            "best_time": "00:00:00.123",
+            "best_score": 877.0,
+            "highest": 1800,
+            "rate": 1750,
+            "inner_rate": 2100,
+            "attend": 2,
+            "win": 1,
+            "attend_date": ["2023/04/17", "2023/04/18"],
+            "record": ["23:59:59.998", "00:00:00.123"],
+            "standing": [3, 1],
+            "perf": [1500, 2600],
+            "rate_hist": [900, 1750],
+            "inner_rate_numer": 7.1,
+            "aperf_numer": 3681.0,
+            "decay_denom": 1.71,
+        },
+        "user_b": {
+            "best_time": "None",
+            "best_score": -1000000,
+            "highest": 0,
+            "rate": 0,
+            "inner_rate": 1600,
+            "attend": 0,
+            "win": 0,
+            "attend_date": [],
+            "record": [],
+            "standing": [],
+            "perf": [],
+            "rate_hist": [],
+            "note": "extra key",
+        },
+    }
+
+
+def test_round_trip() -> None:
+    rating_infos = make_rating_infos()
+    state = RatingState.from_dict(rating_infos)
+    assert len(state) == 2
+    assert state.rate.tolist() == [1750, 0]
+    restored = state.to_dict()
+    assert restored == rating_infos
+    assert json.dumps(restored, sort_keys=True) == json.dumps(
+        rating_infos, sort_keys=True
+    )
+
+
+def test_append_results() -> None:
+    state = RatingState.from_dict(make_rating_infos())
+    users = state.add_users(["user_c", "user_a"])
+    state.append_results(
+        users,
+        "2023/04/19",
+        records=["00:00:01.000", "23:59:59.500"],
+        standings=[1, 2],
+        perfs=[2000, 1900],
+        rates=[800, 1760],
+    )
+    assert "user_c" in state
+    history = state.user_history("user_a")
+    assert history["attend_date"][-1] == "2023/04/19"
+    assert history["record"][-1] == "23:59:59.500"
+    assert state.to_dict()["user_c"]["rate_hist"] == [800]
+    assert np.array_equal(users, [2, 0])
+
+
+def test_subset_and_merge() -> None:
+    rating_infos = make_rating_infos()
+    state = RatingState.from_dict(rating_infos)
+    subset = state.subset(["user_a", "unknown"])
+    assert subset == {"user_a": rating_infos["user_a"]}
+
+    subset["user_a"]["attend_date"].append("2023/04/19")
+    subset["user_a"]["record"].append("00:00:00.050")
+    subset["user_a"]["standing"].append(1)
+    subset["user_a"]["perf"].append(2700)
+    subset["user_a"]["rate_hist"].append(1800)
+    subset["user_a"]["rate"] = 1800
+    subset["user_a"]["best_score"] = 950.0
+    subset["user_c"] = copy.deepcopy(rating_infos["user_b"])
+    state.merge(subset)
+
+    expected = {**rating_infos, **subset}
+    assert state.to_dict() == expected
+    assert state.user_history("user_a")["perf"] == [1500, 2600, 2700]
+
+
+def test_daily_updates_match_dict() -> None:
+    rng = random.Random(0)
+    users = [
+        User(id=i, name="name", username=f"user{i}", protected=False)
+        for i in range(30)
+    ]
+    start = pendulum.datetime(2023, 1, 1, tz="Asia/Tokyo")
+    rating_infos: dict = {}
+    state = RatingState()
+    for day in range(60):
+        date = start.add(days=day)
+        tweets = []
+        for user in users[: 10 + day // 3]:
+            if rng.random() < 0.4:
+                continue
+            posted_at = date.add(microseconds=rng.randint(-3000, 3000) * 1000)
+            tweet_id = int(datetime_to_tweetid(posted_at)) + rng.randrange(
+                2**22
+            )
+            tweets.append(
+                Tweet(text="しゃろほー", source="client", id=tweet_id, author=user)
+            )
+
+        _, rating_infos = calc_rating_for_date(
+            date, tweets, [], rating_infos, 1.0
+        )
+        # その日にツイートしたユーザーの分だけを更新して書き戻す
+        daily = state.subset({t.author.username for t in tweets})
+        _, daily = calc_rating_for_date(date, tweets, [], daily, 1.0)
+        state.merge(daily)
+
+    assert list(state.to_dict()) == list(rating_infos)
+    assert state.to_dict() == rating_infos
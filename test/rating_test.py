@@ -0,0 +1,182 @@
+import math
+import random
+from typing import List, Tuple
+
+import numpy as np
+import pendulum
+import pytest
+
+from syaroho_rating.model import Tweet, User
+from syaroho_rating.rating import (
+    calc_perf,
+    calc_perf_reference,
+    calc_ranks,
+    calc_rating_for_date,
+    derive_accumulators,
+    has_accumulators,
+    migrate_accumulators,
+)
+from syaroho_rating.utils import datetime_to_tweetid
+
+
+def make_daily(n: int, seed: int):
+    rng = random.Random(seed)
+    aperfs = [
+        rng.choice([1600.0, 1250.0, rng.uniform(-500.0, 3500.0)])
+        for _ in range(n)
+    ]
+    scores = [rng.choice([rng.randint(-5, 5), rng.random()]) for _ in range(n)]
+    ranks = [
+        0.5
+        + sum(1.0 for t in scores if t > s)
+        + 0.5 * sum(1.0 for t in scores if t == s)
+        for s in scores
+    ]
+    return aperfs, ranks
+
+
+def test_calc_perf_matches_reference() -> None:
+    for seed, n in enumerate([0, 1, 2, 3, 10, 57, 200]):
+        aperfs, ranks = make_daily(n, seed)
+        for exag in [1.0, 1.5]:
+            expected = calc_perf_reference(aperfs, ranks, exag)
+            actual = calc_perf(np.array(aperfs), np.array(ranks), exag)
+            assert actual.tolist() == expected
+
+
+def test_calc_perf_symmetric_aperf() -> None:
+    # 期待順位がちょうどしきい値に一致するケース
+    aperfs = [1250.0 - 300.0, 1250.0 + 300.0, 1600.0, 1600.0]
+    ranks = [1.5, 1.5, 3.5, 3.5]
+    expected = calc_perf_reference(aperfs, ranks, 1.0)
+    actual = calc_perf(np.array(aperfs), np.array(ranks), 1.0)
+    assert actual.tolist() == expected
+
+
+def test_calc_ranks() -> None:
+    scores = [300.0, 1000.0, -20.0, 300.0, 1000.0, 300.0, -500.5]
+    ranks_normal, ranks = calc_ranks(np.array(scores))
+    assert ranks_normal.tolist() == [3, 1, 6, 3, 1, 3, 7]
+    assert ranks.tolist() == [4.0, 1.5, 6.0, 4.0, 1.5, 4.0, 7.0]
+
+
+def calc_from_scratch(perf_hist: List[int]) -> Tuple[float, int]:
+    attend_time = len(perf_hist)
+    weight = np.ones(attend_time) * 0.9
+    weight = weight ** np.arange(attend_time, 0, -1)
+    aperf = np.array(perf_hist) @ weight / sum(weight)
+
+    numer = 0.0
+    denom = 0.0
+    for p, j in zip(perf_hist[::-1], range(1, len(perf_hist) + 1)):
+        numer += 2.0 ** (p / 800.0) * 0.9**j
+        denom += 0.9**j
+    inner_rate = int(800.0 * math.log2(numer / denom) + 0.5)
+    return aperf, inner_rate
+
+
+def baseline_rate(perf_hist: List[int]) -> Tuple[int, int]:
+    """履歴から計算し直す以前の方法で inner_rate と rate を求める"""
+    numer = 0.0
+    denom = 0.0
+    for p, j in zip(perf_hist[::-1], range(1, len(perf_hist) + 1)):
+        numer += 2.0 ** (p / 800.0) * 0.9**j
+        denom += 0.9**j
+    new_inner_rate = 800.0 * math.log2(numer / denom)
+    att = len(perf_hist)
+    penalty = (
+        1200.0
+        * (((1.0 - 0.81**att) ** 0.5) / (1.0 - 0.9**att) - 1.0)
+        / (19.0**0.5 - 1.0)
+    )
+    new_rate = new_inner_rate - penalty
+    if new_rate <= 400:
+        new_rate = 400.0 / math.exp((400.0 - new_rate) / 400.0)
+    return int(new_inner_rate + 0.5), int(new_rate + 0.5)
+
+
+def test_accumulators_match_full_history() -> None:
+    rng = random.Random(0)
+    for _ in range(200):
+        perf_hist = [
+            rng.randint(-500, 3500) for _ in range(rng.randint(1, 300))
+        ]
+        aperf, inner_rate = calc_from_scratch(perf_hist)
+
+        acc = derive_accumulators(perf_hist)
+        assert acc["aperf_numer"] / acc["decay_denom"] == pytest.approx(aperf)
+        assert (
+            int(
+                800.0 * math.log2(acc["inner_rate_numer"] / acc["decay_denom"])
+                + 0.5
+            )
+            == inner_rate
+        )
+
+
+def test_migrate_accumulators() -> None:
+    perf_hist = [1200, 1800, 900, 2400]
+    inner_rate, rate = baseline_rate(perf_hist)
+    rating_infos = {
+        "user_a": {"perf": perf_hist, "inner_rate": inner_rate, "rate": rate},
+        "user_b": {
+            "perf": perf_hist,
+            "inner_rate": inner_rate + 1,
+            "rate": rate,
+        },
+        "user_c": {
+            "perf": perf_hist,
+            "inner_rate": inner_rate,
+            "rate": rate + 1,
+        },
+    }
+    assert migrate_accumulators(rating_infos) == ["user_b", "user_c"]
+    assert has_accumulators(rating_infos["user_a"])
+
+
+def test_rating_matches_full_history_over_many_days() -> None:
+    rng = random.Random(0)
+    users = [
+        User(id=i, name="name", username=f"user{i}", protected=False)
+        for i in range(40)
+    ]
+    start = pendulum.datetime(2023, 1, 1, tz="Asia/Tokyo")
+    rating_infos: dict = {}
+    for day in range(250):
+        date = start.add(days=day)
+        tweets = []
+        for user in users:
+            if rng.random() < 0.3:
+                continue
+            posted_at = date.add(microseconds=rng.randint(-3000, 3000) * 1000)
+            tweet_id = int(datetime_to_tweetid(posted_at)) + rng.randrange(
+                2**22
+            )
+            tweets.append(
+                Tweet(text="しゃろほー", source="client", id=tweet_id, author=user)
+            )
+
+        perf_before = {
+            n: list(info["perf"]) for n, info in rating_infos.items()
+        }
+        exag = 1.5 if day == 0 else 1.0
+        daily_infos, rating_infos = calc_rating_for_date(
+            date, tweets, [], rating_infos, exag
+        )
+
+        # aperf を全履歴から計算した場合と整数の結果が一致する
+        aperfs = []
+        for d in daily_infos:
+            perf_hist = perf_before.get(d["screen_name"], [])
+            aperfs.append(
+                calc_from_scratch(perf_hist)[0] if len(perf_hist) else 1600
+            )
+        ranks = [d["rank"] for d in daily_infos]
+        assert [d["perf"] for d in daily_infos] == calc_perf_reference(
+            aperfs, ranks, exag
+        )
+        for d in daily_infos:
+            info = rating_infos[d["screen_name"]]
+            inner_rate, rate = baseline_rate(info["perf"])
+            assert info["inner_rate"] == d["new_inner_rate"] == inner_rate
+            assert info["rate"] == int(d["rating"]) == rate
@@ -0,0 +1,80 @@
+import bisect
+import random
+import threading
+from typing import List, Optional, Tuple
+
+from syaroho_rating.sliced_search import initial_windows, sliced_search
+from syaroho_rating.utils import ms_to_tweetid, tweetid_to_ms
+
+CENTER_MS = 1672498800000  # 2023-01-01 00:00:00 JST
+PAGE_SIZE = 100
+
+
+def make_ids(n: int, seed: int) -> List[int]:
+    rng = random.Random(seed)
+    ids = set()
+    while len(ids) < n:
+        # 0 時の前後 1 秒に集中させる
+        if rng.random() < 0.7:
+            offset_ms = int(rng.gauss(0, 300))
+        else:
+            offset_ms = rng.randint(-60000, 59999)
+        offset_ms = max(-60000, min(59999, offset_ms))
+        ids.add(ms_to_tweetid(CENTER_MS + offset_ms) + rng.randrange(2**22))
+    return sorted(ids)
+
+
+class FakeSearch(object):
+    """id の昇順のリストから新しい順に 1 ページずつ返す"""
+
+    def __init__(self, ids: List[int]) -> None:
+        self.ids = ids
+        self.n_requests = 0
+        self.lock = threading.Lock()
+
+    def __call__(
+        self, since: int, until: int
+    ) -> Tuple[List[int], Optional[int]]:
+        with self.lock:
+            self.n_requests += 1
+        lo = bisect.bisect_left(self.ids, since)
+        hi = bisect.bisect_left(self.ids, until)
+        page = self.ids[max(lo, hi - PAGE_SIZE) : hi][::-1]
+        oldest_id = page[-1] if hi - lo > PAGE_SIZE else None
+        return page, oldest_id
+
+
+def test_sliced_search_fetches_all_tweets() -> None:
+    ids = make_ids(3000, 0)
+    for max_workers in [1, 4]:
+        search = FakeSearch(ids)
+        responses = sliced_search(
+            search,
+            initial_windows(CENTER_MS),
+            max_workers=max_workers,
+            max_requests=1000,
+        )
+        fetched = [i for page in responses for i in page]
+        # 重複も欠けもなく、新しい順に並ぶ
+        assert fetched == ids[::-1]
+        assert search.n_requests == len(responses)
+
+
+def test_sliced_search_stops_at_max_requests() -> None:
+    ids = make_ids(3000, 1)
+    search = FakeSearch(ids)
+    responses = sliced_search(
+        search, initial_windows(CENTER_MS), max_workers=4, max_requests=20
+    )
+    fetched = [i for page in responses for i in page]
+    assert search.n_requests == 20
+    assert len(fetched) == len(set(fetched))
+    assert set(fetched) < set(ids)
+
+
+def test_initial_windows_cover_two_minutes() -> None:
+    windows = initial_windows(CENTER_MS)
+    assert tweetid_to_ms(windows[0][0]) == CENTER_MS - 60000
+    assert tweetid_to_ms(windows[-1][1]) == CENTER_MS + 60000
+    for (_, until), (since, _) in zip(windows[:-1], windows[1:]):
+        assert until == since
@@ -0,0 +1,132 @@
+import datetime as dt
+from pathlib import Path
+
+import pytest
+
+from syaroho_rating.sqlite_handler import (
+    SQLiteIOBaseHandler,
+    SQLiteRatingInfoStore,
+)
+
+
+def make_info(history):
+    return {
+        "best_time": "00:00:00.100",
+        "best_score": 900,
+        "rate": history[-1][4],
+        "attend": len(history),
+        "attend_date": [h[0] for h in history],
+        "record": [h[1] for h in history],
+        "standing": [h[2] for h in history],
+        "perf": [h[3] for h in history],
+        "rate_hist": [h[4] for h in history],
+    }
+
+
+def test_sqlite_base_handler(tmp_path: Path) -> None:
+    handler = SQLiteIOBaseHandler(tmp_path / "db.sqlite3", compression="none")
+    handler.save_dict({"data": []}, "statuses_v2/20230101_1.json")
+    handler.save_dict({"data": [1]}, "statuses_v2/20230102_1.json")
+    handler.save_dict({"data": [2]}, "statuses_dq_v2/20230101.json")
+
+    assert handler.load_dict("statuses_v2/20230102_1.json") == {"data": [1]}
+    assert handler.list_path("statuses_v2/20230101") == [
+        "statuses_v2/20230101_1.json"
+    ]
+    with pytest.raises(FileNotFoundError):
+        handler.load_dict("statuses_v2/20230103_1.json")
+
+
+def v1_tweet(tweet_id: int, user_id: int, screen_name: str) -> dict:
+    return {
+        "id": tweet_id,
+        "text": "しゃろほー",
+        "source": "<a href='https://example.com'>client</a>",
+        "user": {
+            "id": user_id,
+            "name": "name",
+            "screen_name": screen_name,
+            "protected": False,
+        },
+    }
+
+
+def test_sqlite_tweet_and_member_tables(tmp_path: Path) -> None:
+    handler = SQLiteIOBaseHandler(tmp_path / "db.sqlite3", compression="gzip")
+    day = dt.date(2023, 1, 1)
+    tweet_a = v1_tweet(1609426800000 << 22, 1, "user_a")
+    tweet_b = v1_tweet((1609426800000 - 5) << 22, 2, "user_b")
+    handler.save_dict({"results": [tweet_a]}, "statuses/20230101_1.json")
+    handler.save_dict(
+        {"results": [tweet_a, tweet_b]}, "statuses/20230101_2.json"
+    )
+    handler.save_dict([tweet_b], "statuses_dq/20230101.json")
+    handler.save_dict(
+        {
+            "data": [{"id": "5", "text": "しゃろほー", "author_id": "3"}],
+            "includes": {
+                "users": [
+                    {
+                        "id": "3",
+                        "name": "c",
+                        "username": "user_c",
+                        "protected": False,
+                    }
+                ]
+            },
+        },
+        "statuses_v2/20230102_1.json",
+    )
+    handler.save_dict(
+        {"users": [tweet_a["user"], tweet_b["user"]]}, "member/member.json"
+    )
+
+    # 同じツイートが複数のファイルにあっても 1 件として返す
+    assert [t["user_name"] for t in handler.tweets_of(day)] == [
+        "user_b",
+        "user_a",
+    ]
+    assert [t["tweet_id"] for t in handler.tweets_of(day, "statuses_dq")] == [
+        tweet_b["id"]
+    ]
+    assert [t["kind"] for t in handler.tweets_by_user("user_b")] == [
+        "statuses",
+        "statuses_dq",
+    ]
+    assert handler.tweets_of(dt.date(2023, 1, 2))[0]["user_name"] == "user_c"
+    assert [m["user_name"] for m in handler.members()] == ["user_a", "user_b"]
+    # 元のファイルもそのまま読める
+    assert handler.load_dict("statuses/20230101_1.json") == {
+        "results": [tweet_a]
+    }
+
+    # 保存し直した場合や削除した場合は行も入れ替わる
+    handler.save_dict({"users": [tweet_a["user"]]}, "member/member.json")
+    assert [m["user_name"] for m in handler.members()] == ["user_a"]
+    handler.delete("statuses/20230101_2.json.gz")
+    handler.delete("statuses_dq/20230101.json.gz")
+    assert handler.tweets_by_user("user_b") == []
+
+
+def test_sqlite_rating_info_store(tmp_path: Path) -> None:
+    store = SQLiteRatingInfoStore(SQLiteIOBaseHandler(tmp_path / "db.sqlite3"))
+    day1 = ("2023/01/01", "00:00:00.100", 1, 1800, 900)
+    day2 = ("2023/01/02", "00:00:00.200", 2, 1500, 1000)
+    info1 = {"user_a": make_info([day1]), "user_b": make_info([day1])}
+    info2 = {"user_a": make_info([day1, day2]), "user_b": make_info([day1])}
+
+    with pytest.raises(FileNotFoundError):
+        store.get(dt.date(2023, 1, 1))
+    store.save(info1, dt.date(2023, 1, 1))
+    store.save(info2, dt.date(2023, 1, 2))
+    # 保存し直しても結果は変わらない
+    store.save(info1, dt.date(2023, 1, 1))
+
+    assert store.get(dt.date(2023, 1, 1)) == info1
+    assert store.get(dt.date(2023, 1, 2)) == info2
+    assert store.get_users(dt.date(2023, 1, 2), ["user_a"]) == {
+        "user_a": info2["user_a"]
+    }
+    assert [
+        p["user_name"] for p in store.participants_of(dt.date(2023, 1, 2))
+    ] == ["user_a"]
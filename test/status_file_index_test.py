@@ -0,0 +1,54 @@
+import datetime as dt
+from pathlib import Path
+
+import pytest
+
+from syaroho_rating.io_handler import LocalIOBaseHandler, StatusFileIndex
+
+DATE = dt.date(2023, 1, 1)
+
+
+@pytest.mark.parametrize("use_manifest", [False, True])
+def test_status_files_with_compression(
+    tmp_path: Path, use_manifest: bool
+) -> None:
+    # 圧縮せずに保存したファイルがある状態で圧縮を有効にする
+    plain_handler = LocalIOBaseHandler(tmp_path, compression="none")
+    plain_handler.save_dict({"results": [1]}, "statuses/20230101_1.json")
+    plain_handler.save_dict({"results": [2]}, "statuses/20230101_2.json")
+    plain_handler.save_dict({"results": [3]}, "statuses/20230102_1.json")
+
+    base_handler = LocalIOBaseHandler(tmp_path, compression="gzip")
+    index = StatusFileIndex(base_handler, "statuses", use_manifest)
+    base_handler.save_dict({"results": [4]}, "statuses/20230101_1.json")
+    index.add(DATE, "statuses/20230101_1.json")
+
+    expected = ["statuses/20230101_1.json.gz", "statuses/20230101_2.json"]
+    assert index.files_of(DATE) == expected
+    # 同じファイルを保存し直しても重複しない
+    index.add(DATE, "statuses/20230101_1.json")
+    assert index.files_of(DATE) == expected
+
+    reloaded = StatusFileIndex(base_handler, "statuses", use_manifest)
+    files = reloaded.files_of(DATE)
+    assert files == expected
+    assert base_handler.load_dicts(files) == {
+        "statuses/20230101_1.json.gz": {"results": [4]},
+        "statuses/20230101_2.json": {"results": [2]},
+    }
+    if use_manifest:
+        assert base_handler.load_dict("statuses/manifest.json") == {
+            "20230101": expected
+        }
+
+
+def test_status_manifest_keeps_order(tmp_path: Path) -> None:
+    base_handler = LocalIOBaseHandler(tmp_path, compression="gzip")
+    index = StatusFileIndex(base_handler, "statuses", use_manifest=True)
+    for name in ["20230101_1.json", "20230101_2.json", "20230101_1.json"]:
+        base_handler.save_dict({}, f"statuses/{name}")
+        index.add(DATE, f"statuses/{name}")
+    assert index.files_of(DATE) == [
+        "statuses/20230101_1.json.gz",
+        "statuses/20230101_2.json.gz",
+    ]
@@ -0,0 +1,93 @@
+import tweepy
+
+from syaroho_rating.io_handler import merge_statuses_v1, merge_statuses_v2
+from syaroho_rating.model import Tweet
+from syaroho_rating.status_stream import (
+    iter_syaroho_tweets_v1,
+    iter_syaroho_tweets_v2,
+)
+
+SYAROHO_ID = "1609152000125829120"
+OTHER_ID = "1609152000230686720"
+
+
+def test_iter_syaroho_tweets_v1() -> None:
+    syaroho = {
+        "id": int(SYAROHO_ID),
+        "id_str": SYAROHO_ID,
+        "text": "しゃろほー",
+        "source": '<a href="https://example.com">client</a>',
+        "user": {
+            "id": 1,
+            "name": "name1",
+            "screen_name": "user1",
+            "protected": False,
+        },
+    }
+    other = {
+        "id": int(OTHER_ID),
+        "id_str": OTHER_ID,
+        "text": "しゃろほー!",
+        "source": "client",
+        "user": {
+            "id": 2,
+            "name": "name2",
+            "screen_name": "user2",
+            "protected": False,
+        },
+    }
+    # 2 つ目のファイルには同じツイートが保存されている
+    shards = [{"results": [syaroho, other]}, {"results": [syaroho]}]
+
+    expected = [
+        t
+        for t in Tweet.from_responses_v1(merge_statuses_v1(shards))
+        if t.text == "しゃろほー"
+    ]
+    assert len(expected) == 1
+    assert list(iter_syaroho_tweets_v1(shards)) == expected
+
+
+def test_iter_syaroho_tweets_v2() -> None:
+    shards = [
+        {
+            "data": [
+                {
+                    "id": SYAROHO_ID,
+                    "text": "しゃろほー",
+                    "author_id": "1",
+                    "source": "client",
+                },
+                {"id": OTHER_ID, "text": "しゃろ", "author_id": "2"},
+            ],
+            "includes": {
+                "users": [{"id": "2", "name": "name2", "username": "user2"}]
+            },
+        },
+        # 投稿者の情報が別のファイルにある
+        {
+            "data": [],
+            "includes": {
+                "users": [
+                    {
+                        "id": "1",
+                        "name": "name1",
+                        "username": "user1",
+                        "protected": False,
+                    }
+                ]
+            },
+        },
+    ]
+
+    merged = merge_statuses_v2(shards)
+    expected = [
+        t
+        for t in Tweet.from_responses_v2(
+            [tweepy.Tweet(t) for t in merged["data"]],
+            [tweepy.User(u) for u in merged["includes"]["users"]],
+        )
+        if t.text == "しゃろほー"
+    ]
+    assert len(expected) == 1
+    assert list(iter_syaroho_tweets_v2(shards)) == expected
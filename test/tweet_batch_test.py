@@ -0,0 +1,48 @@
+import random
+
+import numpy as np
+import pendulum
+
+from syaroho_rating.model import Tweet, User
+from syaroho_rating.tweet_batch import TweetBatch, calc_scores
+from syaroho_rating.utils import datetime_to_tweetid, timedelta_to_ms
+
+
+def test_tweet_batch_matches_datetime() -> None:
+    rng = random.Random(0)
+    date = pendulum.datetime(2023, 1, 1, tz="Asia/Tokyo")
+    tweets = []
+    for i in range(200):
+        posted_at = date.add(microseconds=rng.randint(-90000, 90000) * 1000)
+        tweet_id = int(datetime_to_tweetid(posted_at)) + rng.randrange(2**22)
+        user = User(
+            id=i % 50, name="name", username=f"user{i % 50}", protected=False
+        )
+        text = rng.choice(["しゃろほー", "しゃろほー!"])
+        tweets.append(
+            Tweet(text=text, source="client", id=tweet_id, author=user)
+        )
+
+    batch = TweetBatch.from_tweets(tweets)
+    assert len(batch) == len(tweets)
+    assert batch.valid.tolist() == [t.text == "しゃろほー" for t in tweets]
+    assert [batch.username_of(i) for i in range(len(batch))] == [
+        t.author.username for t in tweets
+    ]
+
+    records = [timedelta_to_ms(t.created_at_ms - date) for t in tweets]
+    expected_scores = [(1000 if r >= 0 else 0) - abs(r) for r in records]
+    assert calc_scores(batch.offsets_ms(date)).tolist() == expected_scores
+
+    rows = np.arange(len(batch))
+    assert batch.format_times(rows, date) == [
+        t.created_at_ms.strftime("%H:%M:%S.%f")[:-3] for t in tweets
+    ]
+
+
+def test_empty_tweet_batch() -> None:
+    batch = TweetBatch.from_tweets([])
+    date = pendulum.datetime(2023, 1, 1, tz="Asia/Tokyo")
+    assert len(batch) == 0
+    assert calc_scores(batch.offsets_ms(date)).tolist() == []
+    assert batch.format_times(np.flatnonzero(batch.valid), date) == []
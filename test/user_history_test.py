@@ -0,0 +1,80 @@
+import datetime as dt
+from pathlib import Path
+
+import pytest
+
+from syaroho_rating.io_handler import (
+    IOHandlerV2,
+    LocalIOBaseHandler,
+    ShardedRatingInfoStore,
+    UserHistoryIndex,
+    UserHistoryMapping,
+)
+
+
+def make_info(dates):
+    return {
+        "best_time": "00:00:00.100",
+        "highest": 1000,
+        "rate": 900,
+        "attend": len(dates),
+        "win": 0,
+        "attend_date": list(dates),
+        "rate_hist": [900] * len(dates),
+    }
+
+
+def test_user_history_index(tmp_path: Path) -> None:
+    base_handler = LocalIOBaseHandler(tmp_path)
+    index = UserHistoryIndex(base_handler, n_shards=4)
+
+    rating_info = {f"user{i}": make_info(["2023/01/01"]) for i in range(10)}
+    index.save(rating_info, dt.date(2023, 1, 1))
+    assert len(base_handler.list_path("user_history")) == 5
+
+    # 翌日は参加者を含む shard だけが書き直される
+    rating_info["user3"] = make_info(["2023/01/01", "2023/01/02"])
+    index.save(rating_info, dt.date(2023, 1, 2))
+
+    reloaded = UserHistoryIndex(base_handler, n_shards=4)
+    for name, info in rating_info.items():
+        assert reloaded.get(name) == info
+    with pytest.raises(KeyError):
+        reloaded.get("unknown")
+
+
+def test_user_history_index_keeps_latest_date(tmp_path: Path) -> None:
+    base_handler = LocalIOBaseHandler(tmp_path)
+    index = UserHistoryIndex(base_handler, n_shards=4)
+    latest = {"user0": make_info(["2023/01/01", "2023/01/02"])}
+    index.save(latest, dt.date(2023, 1, 2))
+
+    # 前の日付をやり直しても最新の情報は上書きしない
+    index.save({"user0": make_info(["2023/01/01"])}, dt.date(2023, 1, 1))
+    reloaded = UserHistoryIndex(base_handler, n_shards=4)
+    assert reloaded.get("user0") == latest["user0"]
+
+    # 同じ日付は保存し直す
+    latest["user0"]["rate"] = 1000
+    reloaded.save(latest, dt.date(2023, 1, 2))
+    assert UserHistoryIndex(base_handler, n_shards=4).get("user0") == (
+        latest["user0"]
+    )
+
+
+def test_user_history_mapping_falls_back_to_rating_info(tmp_path: Path) -> None:
+    base_handler = LocalIOBaseHandler(tmp_path)
+    io_handler = IOHandlerV2(
+        base_handler, ShardedRatingInfoStore(base_handler, n_shards=4)
+    )
+    date = dt.date(2023, 1, 1)
+    rating_info = {f"user{i}": make_info(["2023/01/01"]) for i in range(3)}
+    io_handler.save_rating_info(rating_info, date)
+
+    # ユーザーごとの履歴をまだ保存していない
+    with pytest.raises(KeyError):
+        UserHistoryMapping(io_handler)["user1"]
+    mapping = UserHistoryMapping(io_handler, date=date)
+    assert mapping["user1"] == rating_info["user1"]
+    with pytest.raises(KeyError):
+        mapping["unknown"]
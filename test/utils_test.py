@@ -0,0 +1,71 @@
+import datetime as dt
+import random
+
+import numpy as np
+import pendulum
+
+from syaroho_rating.utils import (
+    datetime_to_ms,
+    datetime_to_tweetid,
+    ms_to_datetime,
+    ms_to_tweetid,
+    ms_to_tweetids,
+    tweetid_to_datetime,
+    tweetid_to_ms,
+    tweetids_to_ms,
+)
+
+# 2020 年から 2030 年までのミリ秒
+MS_RANGE = (1577804400000, 1893423600000)
+
+
+def random_ms(n: int, seed: int):
+    rng = random.Random(seed)
+    return [rng.randint(*MS_RANGE) for _ in range(n)]
+
+
+def test_tweetid_round_trip_at_ms_boundaries() -> None:
+    for ms in random_ms(2000, 0):
+        first_id = ms_to_tweetid(ms)
+        # 同じミリ秒の最初と最後の id
+        for tweet_id in [first_id, first_id + 1, first_id + 2**22 - 1]:
+            assert tweetid_to_ms(tweet_id) == ms
+            assert tweetid_to_ms(str(tweet_id)) == ms
+        # 次のミリ秒の最初の id
+        assert ms_to_tweetid(ms + 1) == first_id + 2**22
+        assert tweetid_to_ms(first_id - 1) == ms - 1
+
+
+def test_tweetid_to_ms_is_exact() -> None:
+    # 浮動小数点で 2**22 で割ると次のミリ秒に丸められてしまう id
+    tweet_id = 1664369221280202751
+    assert int(tweet_id / 2**22) == (tweet_id >> 22) + 1
+    assert tweetid_to_ms(tweet_id) == (tweet_id >> 22) + 1288834974657
+
+
+def test_datetime_round_trip() -> None:
+    for ms in random_ms(2000, 1):
+        date = ms_to_datetime(ms)
+        assert date.timezone_name == "Asia/Tokyo"
+        assert date == pendulum.datetime(1970, 1, 1, tz="UTC") + dt.timedelta(
+            milliseconds=ms
+        )
+        assert datetime_to_ms(date) == ms
+        assert datetime_to_tweetid(date) == str(ms_to_tweetid(ms))
+        assert tweetid_to_datetime(ms_to_tweetid(ms) + 12345) == date
+        # ミリ秒未満は切り捨てる
+        assert datetime_to_ms(date.add(microseconds=999)) == ms
+
+
+def test_array_versions_match_scalar() -> None:
+    ms = np.array(random_ms(1000, 2), dtype=np.int64)
+    rng = np.random.default_rng(0)
+    tweet_ids = ms_to_tweetids(ms) + rng.integers(0, 2**22, size=len(ms))
+    assert tweet_ids.dtype == np.int64
+    assert ms_to_tweetids(ms).tolist() == [
+        ms_to_tweetid(m) for m in ms.tolist()
+    ]
+    assert tweetids_to_ms(tweet_ids).tolist() == ms.tolist()
+    assert tweetids_to_ms(tweet_ids).tolist() == [
+        tweetid_to_ms(i) for i in tweet_ids.tolist()
+    ]
@@ -0,0 +1,126 @@
+from pathlib import Path
+from typing import List
+
+import pytest
+
+from syaroho_rating.io_handler import (
+    LocalIOBaseHandler,
+    WriteBehindIOBaseHandler,
+)
+
+
+class FailingIOBaseHandler(LocalIOBaseHandler):
+    def save_bytes(self, data: bytes, relative_path: str) -> None:
+        raise OSError("upload failed")
+
+
+def test_write_behind(tmp_path: Path) -> None:
+    base_handler = LocalIOBaseHandler(tmp_path / "data", compression="none")
+    handler = WriteBehindIOBaseHandler(base_handler, tmp_path / "journal")
+    handler.save_dict({"a": 1}, "rating_info/20230101.json")
+    # 保存が終わる前でも読み込める
+    assert handler.load_dict("rating_info/20230101.json") == {"a": 1}
+    handler.flush()
+
+    assert base_handler.load_dict("rating_info/20230101.json") == {"a": 1}
+    assert list((tmp_path / "journal").iterdir()) == []
+
+
+def test_write_behind_recovers_from_journal(tmp_path: Path) -> None:
+    failing = FailingIOBaseHandler(tmp_path / "data", compression="none")
+    handler = WriteBehindIOBaseHandler(failing, tmp_path / "journal")
+    handler.save_dict({"a": 1}, "rating_info/20230101.json")
+    handler.save_dict({"a": 2}, "rating_info/20230101.json")
+    with pytest.raises(RuntimeError):
+        handler.flush()
+
+    # 次に作成した時に journal に残ったデータを順に保存し直す
+    base_handler = LocalIOBaseHandler(tmp_path / "data", compression="none")
+    WriteBehindIOBaseHandler(base_handler, tmp_path / "journal")
+    assert base_handler.load_dict("rating_info/20230101.json") == {"a": 2}
+    assert list((tmp_path / "journal").iterdir()) == []
+
+
+class FlakyIOBaseHandler(LocalIOBaseHandler):
+    """最初の n_failures 回の保存だけ失敗する"""
+
+    def __init__(self, base_path: Path, n_failures: int) -> None:
+        super().__init__(base_path, compression="none")
+        self.n_failures = n_failures
+        self.saved: List[str] = []
+
+    def save_bytes(self, data: bytes, relative_path: str) -> None:
+        if self.n_failures > 0:
+            self.n_failures -= 1
+            raise OSError("upload failed")
+        self.saved.append(relative_path)
+        super().save_bytes(data, relative_path)
+
+
+def test_write_behind_drops_superseded_journal(tmp_path: Path) -> None:
+    flaky = FlakyIOBaseHandler(tmp_path / "data", n_failures=1)
+    handler = WriteBehindIOBaseHandler(flaky, tmp_path / "journal")
+    handler.save_dict({"a": 1}, "rating_info/20230101.json")
+    handler.save_dict({"a": 2}, "rating_info/20230101.json")
+    # 後の保存が成功したので、古いデータの失敗は flush で例外にならない
+    handler.flush()
+
+    # 失敗した古いデータの journal も残らない
+    assert list((tmp_path / "journal").iterdir()) == []
+    base_handler = LocalIOBaseHandler(tmp_path / "data", compression="none")
+    WriteBehindIOBaseHandler(base_handler, tmp_path / "journal")
+    assert base_handler.load_dict("rating_info/20230101.json") == {"a": 2}
+
+
+def test_write_behind_replays_newest_journal(tmp_path: Path) -> None:
+    failing = FailingIOBaseHandler(tmp_path / "data", compression="none")
+    handler = WriteBehindIOBaseHandler(failing, tmp_path / "journal")
+    handler.save_dict({"a": 1}, "rating_info/20230101.json")
+    handler.save_dict({"b": 1}, "rating_info/20230102.json")
+    handler.save_dict({"a": 2}, "rating_info/20230101.json")
+    with pytest.raises(RuntimeError):
+        handler.flush()
+
+    # パスごとに最新のデータだけを保存し直す
+    flaky = FlakyIOBaseHandler(tmp_path / "data", n_failures=0)
+    WriteBehindIOBaseHandler(flaky, tmp_path / "journal")
+    assert sorted(flaky.saved) == [
+        "rating_info/20230101.json",
+        "rating_info/20230102.json",
+    ]
+    assert flaky.load_dict("rating_info/20230101.json") == {"a": 2}
+    assert list((tmp_path / "journal").iterdir()) == []
+
+
+def test_write_behind_retries_failed_replay_on_flush(tmp_path: Path) -> None:
+    failing = FailingIOBaseHandler(tmp_path / "data", compression="none")
+    handler = WriteBehindIOBaseHandler(failing, tmp_path / "journal")
+    handler.save_dict({"a": 1}, "rating_info/20230101.json")
+    with pytest.raises(RuntimeError):
+        handler.flush()
+
+    # 保存し直しに失敗しても作成はでき、journal も残る
+    flaky = FlakyIOBaseHandler(tmp_path / "data", n_failures=1)
+    handler = WriteBehindIOBaseHandler(flaky, tmp_path / "journal")
+    assert len(list((tmp_path / "journal").iterdir())) == 1
+    assert handler.load_dict("rating_info/20230101.json") == {"a": 1}
+
+    # flush で保存し直す
+    handler.flush()
+    assert flaky.load_dict("rating_info/20230101.json") == {"a": 1}
+    assert list((tmp_path / "journal").iterdir()) == []
+
+
+def test_write_behind_keeps_broken_journal(tmp_path: Path) -> None:
+    journal_dir = tmp_path / "journal"
+    journal_dir.mkdir()
+    broken = journal_dir / "0_00000001.entry"
+    broken.write_bytes(b"rating_info/20230101.json")
+
+    # 読めない journal があっても作成でき、journal は消さない
+    base_handler = LocalIOBaseHandler(tmp_path / "data", compression="none")
+    handler = WriteBehindIOBaseHandler(base_handler, journal_dir)
+    handler.save_dict({"b": 1}, "rating_info/20230102.json")
+    handler.flush()
+    assert base_handler.load_dict("rating_info/20230102.json") == {"b": 1}
+    assert list(journal_dir.iterdir()) == [broken]